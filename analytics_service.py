@@ -0,0 +1,185 @@
+"""
+Admin analytics for AIezzy from pre-aggregated rollups.
+Signups and message/image/video usage are added to UsageRollup rows per hour
+and per day (UTC) and per tier as they happen - usage in the same transaction
+as its UsageLog rows, signups from a User insert hook - so a report reads at
+most one row per bucket and tier however long the history is.
+
+rebuild() recomputes the rollups from users and usage_logs (after enabling
+this on an existing database, or to repair drift). Historical usage is then
+attributed to each user's current tier. Guest usage has no usage_logs rows, so
+the 'guest' rollups are left as the live path counted them.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Tuple
+from sqlalchemy import delete, event, select
+from models_v2 import db, User, UsageLog, UsageRollup, increment_counters
+from config import get_config
+
+config = get_config()
+
+GRANULARITIES = {'hour': timedelta(hours=1), 'day': timedelta(days=1)}
+METRICS = ('signups', 'messages', 'images', 'videos')
+
+# resource_type -> rollup metric
+RESOURCE_METRICS = {'image': 'images', 'video': 'videos', 'message': 'messages'}
+
+# Largest series a single report may return
+MAX_BUCKETS = 2000
+
+# Rows per multi-row UPSERT (keeps SQLite under its bound-parameter limit)
+WRITE_CHUNK = 500
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    """Start of the hour/day bucket containing moment"""
+    if granularity == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+class AnalyticsService:
+    """Maintains usage rollups and answers range queries over them"""
+
+    def add(self, executor, entries: Iterable[Tuple[datetime, str, str, int]]) -> None:
+        """
+        Count entries into every granularity's bucket
+
+        Args:
+            executor: db.session, or a Connection inside a flush
+            entries: (UTC time, tier, metric, count) tuples
+        """
+        deltas = {}
+        for moment, tier, metric, count in entries:
+            for granularity in GRANULARITIES:
+                row = deltas.setdefault((granularity, bucket_start(moment, granularity), tier), dict.fromkeys(METRICS, 0))
+                row[metric] += count
+
+        rows = [{'granularity': granularity, 'bucket_start': start, 'tier': tier, **counts}
+                for (granularity, start, tier), counts in deltas.items()]
+        for i in range(0, len(rows), WRITE_CHUNK):
+            increment_counters(executor, UsageRollup, rows[i:i + WRITE_CHUNK],
+                               keys=['granularity', 'bucket_start', 'tier'], counters=list(METRICS))
+
+    def record_usage(self, events: List[Tuple[int, str, int, datetime]]) -> None:
+        """
+        Add usage to the rollups in the caller's transaction
+
+        Args:
+            events: (user_id or 0 for guests, resource_type, count, UTC time) tuples
+        """
+        user_ids = {user_id for user_id, _, _, _ in events if user_id}
+        tiers = dict(db.session.execute(select(User.id, User.tier).where(User.id.in_(user_ids))).all()) if user_ids else {}
+        self.add(db.session, [
+            (moment, (tiers.get(user_id) or 'free') if user_id else 'guest', RESOURCE_METRICS[resource_type], count)
+            for user_id, resource_type, count, moment in events if resource_type in RESOURCE_METRICS
+        ])
+
+    def get_series(self, start: datetime, end: datetime, granularity: str = None, tier: str = None) -> Dict:
+        """
+        Rollup totals for a time range
+
+        Args:
+            start: Range start (UTC, rounded down to the bucket)
+            end: Range end (UTC, exclusive)
+            granularity: 'hour' or 'day' (default: hourly up to two days, daily beyond)
+            tier: Only this tier
+
+        Returns:
+            dict: Totals, totals per tier and one zero-filled entry per bucket
+
+        Raises:
+            ValueError: Unknown granularity, empty range or more than MAX_BUCKETS buckets
+        """
+        granularity = granularity or ('hour' if end - start <= timedelta(days=2) else 'day')
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of: {', '.join(GRANULARITIES)}")
+        step = GRANULARITIES[granularity]
+        start = bucket_start(start, granularity)
+        if end <= start:
+            raise ValueError('end must be after start')
+        if (end - start) / step > MAX_BUCKETS:
+            raise ValueError(f'Range covers more than {MAX_BUCKETS} {granularity} buckets; use a coarser granularity')
+
+        query = select(UsageRollup.bucket_start, UsageRollup.tier, *(getattr(UsageRollup, metric) for metric in METRICS)).where(
+            UsageRollup.granularity == granularity,
+            UsageRollup.bucket_start >= start,
+            UsageRollup.bucket_start < end
+        )
+        if tier:
+            query = query.where(UsageRollup.tier == tier)
+
+        buckets = {}
+        moment = start
+        while moment < end:
+            buckets[moment] = dict.fromkeys(METRICS, 0)
+            moment += step
+        totals = dict.fromkeys(METRICS, 0)
+        by_tier = {}
+
+        for row in db.session.execute(query):
+            counts = dict(zip(METRICS, row[2:]))
+            tier_totals = by_tier.setdefault(row.tier, dict.fromkeys(METRICS, 0))
+            for metric, count in counts.items():
+                buckets[row.bucket_start][metric] += count
+                tier_totals[metric] += count
+                totals[metric] += count
+
+        return {
+            'granularity': granularity,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'totals': totals,
+            'by_tier': by_tier,
+            'series': [{'bucket': moment.isoformat(), **counts} for moment, counts in buckets.items()]
+        }
+
+    def rebuild(self) -> Dict:
+        """
+        Recompute the signed-in users' rollups from users and usage_logs in one transaction
+
+        Guest rows are kept: guests' usage is only ever counted live.
+
+        Returns:
+            dict: Signups and usage events counted, rows written
+        """
+        try:
+            # Delete first: a usage flush committing meanwhile then waits and adds on top
+            db.session.execute(delete(UsageRollup).where(UsageRollup.tier != 'guest'))
+
+            signups = db.session.execute(select(User.created_at, User.tier)).all()
+            usage = db.session.execute(
+                select(UsageLog.created_at, UsageLog.resource_type, UsageLog.resource_count, UsageLog.user_id, User.tier)
+                .outerjoin(User, User.id == UsageLog.user_id)
+                .execution_options(yield_per=5000)
+            )
+            counted = {'signups': len(signups), 'usage_events': 0}
+
+            def entries():
+                for created_at, tier in signups:
+                    yield created_at or datetime.utcnow(), tier or 'free', 'signups', 1
+                for created_at, resource_type, count, user_id, tier in usage:
+                    # Guest rows from before guests stopped being logged are already in the kept guest rollups
+                    if user_id and resource_type in RESOURCE_METRICS and created_at:
+                        counted['usage_events'] += 1
+                        yield created_at, tier or 'free', RESOURCE_METRICS[resource_type], count or 0
+
+            self.add(db.session, entries())
+            db.session.commit()
+            counted['rows'] = db.session.query(UsageRollup).count()
+            print(f"ANALYTICS: Rebuilt rollups - {counted['signups']} signups, {counted['usage_events']} usage events, {counted['rows']} rows")
+            return counted
+
+        except Exception:
+            db.session.rollback()
+            raise
+
+# Global analytics service instance
+analytics_service = AnalyticsService()
+
+@event.listens_for(User, 'after_insert')
+def _count_signup(mapper, connection, user: User) -> None:
+    """Count a new account in the signup rollups, in the same transaction"""
+    try:
+        analytics_service.add(connection, [(user.created_at or datetime.utcnow(), user.tier or 'free', 'signups', 1)])
+    except Exception as e:
+        print(f"ANALYTICS: Could not count signup: {e}")
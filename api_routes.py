@@ -10,7 +10,8 @@ from models_v2 import db, User, UserSession, EmailVerification, PasswordReset, O
 from email_service import email_service
 from oauth_service import oauth_service
 from quota_service import quota_service
-from auth import get_current_user, admin_required, optional_auth, get_client_ip, get_user_agent
+from analytics_service import analytics_service
+from auth import get_current_user, admin_required, optional_auth, get_client_ip, get_user_agent, invalidate_user
 from config import get_config
 from sqlalchemy import func, desc
 from datetime import date
@@ -492,7 +493,10 @@ def log_usage():
     if not resource_type:
         return jsonify({'error': 'resource_type is required'}), 400
 
-    success = quota_service.log_usage(user_id, resource_type, count)
+    try:
+        success = quota_service.log_usage(user_id, resource_type, count)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
     return jsonify({'success': success}), 200 if success else 500
 
@@ -509,25 +513,18 @@ def admin_dashboard():
         # Total users
         total_users = User.query.count()
 
-        # New users today
-        new_users_today = User.query.filter(
-            func.date(User.created_at) == today
-        ).count()
-
         # Active sessions
         active_sessions = UserSession.query.filter(
             UserSession.is_active == True,
             UserSession.expires_at > datetime.utcnow()
         ).count()
 
-        # Usage stats
-        images_today = db.session.query(func.sum(DailyUsage.images_generated)).filter(
-            DailyUsage.date == today
-        ).scalar() or 0
-
-        videos_today = db.session.query(func.sum(DailyUsage.videos_created)).filter(
-            DailyUsage.date == today
-        ).scalar() or 0
+        # New users and usage today (the UTC day's rollup - one row per tier)
+        today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        usage_today = analytics_service.get_series(today_start, today_start + timedelta(days=1), 'day')['totals']
+        new_users_today = usage_today['signups']
+        images_today = usage_today['images']
+        videos_today = usage_today['videos']
 
         # Recent users
         recent_users = User.query.order_by(desc(User.created_at)).limit(50).all()
@@ -566,6 +563,47 @@ def admin_dashboard():
         print(f"Admin dashboard error: {e}")
         return jsonify({'error': 'Failed to load dashboard'}), 500
 
+@api.route('/api/admin/analytics')
+@admin_required
+def admin_analytics():
+    """
+    Signups and usage per hour/day and tier from the rollups
+
+    Query params: start, end (ISO date or datetime, UTC; a date-only end includes that day;
+    default the last 30 days), granularity (hour/day), tier
+    """
+    try:
+        now = datetime.utcnow()
+        start_arg = request.args.get('start')
+        end_arg = request.args.get('end')
+        start = datetime.fromisoformat(start_arg) if start_arg else (now - timedelta(days=29)).replace(hour=0, minute=0, second=0, microsecond=0)
+        end = datetime.fromisoformat(end_arg) if end_arg else now
+        if end_arg and len(end_arg) == 10:
+            end += timedelta(days=1)
+    except ValueError:
+        return jsonify({'error': 'start and end must be ISO dates (YYYY-MM-DD) or datetimes'}), 400
+
+    try:
+        series = analytics_service.get_series(start, end, request.args.get('granularity'), request.args.get('tier'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Admin analytics error: {e}")
+        return jsonify({'error': 'Failed to load analytics'}), 500
+
+    return jsonify(series), 200
+
+@api.route('/api/admin/analytics/rebuild', methods=['POST'])
+@admin_required
+def rebuild_analytics():
+    """Recompute the analytics rollups from users and usage logs"""
+    try:
+        return jsonify({'success': True, **analytics_service.rebuild()}), 200
+
+    except Exception as e:
+        print(f"Rebuild analytics error: {e}")
+        return jsonify({'error': 'Rebuild failed'}), 500
+
 @api.route('/api/admin/users/<int:user_id>/tier', methods=['POST'])
 @admin_required
 def update_user_tier(user_id):
@@ -596,6 +634,7 @@ def deactivate_user(user_id):
 
         user.is_active = False
         db.session.commit()
+        invalidate_user(user_id)
 
         return jsonify({'success': True}), 200
 
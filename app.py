@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-import os, base64, time, pathlib, sys
+import os, base64, html, re, time, pathlib, sys
 from typing import Annotated, List
 
 from dotenv import load_dotenv
@@ -19,22 +19,37 @@ from langchain_core.runnables import RunnableConfig
 # Note: Migrated from OpenAI to Google Gemini API for all LLM and image operations
 # All image generation, editing, and combination now use Gemini 2.5 Flash Image
 
+# Heavy tool modules are registered here and imported on first use (see tool_registry.py)
+from tool_registry import tool_registry
+
 # FAL AI client (only used for video generation now)
-import fal_client
-fal_client.api_key = os.getenv("FAL_KEY")
+fal_client = tool_registry.register('fal_client', on_load=lambda m: setattr(m, 'api_key', os.getenv("FAL_KEY")))
 
-# PDF Converter for document processing
-import pdf_converter
+# PDF Converter for document processing (PyMuPDF, pypdf, docx, openpyxl, pptx)
+pdf_converter = tool_registry.register('pdf_converter')
 
 # Image Converter for image format conversions
-import image_converter
+image_converter = tool_registry.register('image_converter')
 
 # Database models for persistent file storage (solves multi-worker issue)
 from models_v2 import db, UploadedFile
+from blob_store import blob_store
+from config import get_config
+from retention import retention_sweeper
+
+# TTL cache for web search results (shared across threads in this worker)
+from search_cache import search_cache
+from generation_dedup import generation_dedup, GenerationInProgress
+
+# Background FAL queue jobs - video tools submit and return immediately
+from video_jobs import video_jobs, FAILED, COMPLETED
+
+# Token budget for history and the file banner sent to the coordinator
+from history_budget import history_budget
 
 # Phase 1 & 2 Tools (Oct 2025)
-import text_tools
-import qr_barcode_tools
+text_tools = tool_registry.register('text_tools')
+qr_barcode_tools = tool_registry.register('qr_barcode_tools')
 # TEMPORARILY DISABLED - causing deployment issues
 # import audio_tools
 # import video_tools
@@ -57,16 +72,97 @@ VIDEOS_DIR.mkdir(exist_ok=True)
 
 # --- Helpers ---------------------------------------------------------------
 
+# Video downloads stream to disk in chunks so memory stays flat regardless of size
+VIDEO_DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+VIDEO_DOWNLOAD_CONNECT_TIMEOUT = get_config().VIDEO_DOWNLOAD_CONNECT_TIMEOUT
+VIDEO_DOWNLOAD_READ_TIMEOUT = get_config().VIDEO_DOWNLOAD_READ_TIMEOUT
+VIDEO_DOWNLOAD_MAX_RETRIES = get_config().VIDEO_DOWNLOAD_MAX_RETRIES
+VIDEO_DOWNLOAD_MAX_BYTES = get_config().VIDEO_DOWNLOAD_MAX_MB * 1024 * 1024
+
 def save_video_from_url(video_url: str) -> str:
-    """Download and save video from URL"""
+    """
+    Download and save video from URL.
+
+    Streams into a hidden .part file in VIDEOS_DIR, resumes with a Range request
+    after connection drops/timeouts, enforces VIDEO_DOWNLOAD_MAX_BYTES and only
+    renames into place once the download is complete.
+    """
     import requests
-    response = requests.get(video_url)
-    if response.status_code == 200:
-        video_path = VIDEOS_DIR / f"video_{int(time.time())}.mp4"
-        video_path.write_bytes(response.content)
+
+    video_path = VIDEOS_DIR / f"video_{int(time.time() * 1000000)}.mp4"
+    part_path = VIDEOS_DIR / f".{video_path.name}.part"
+    received = 0
+    total_size = None
+    attempt = 0
+
+    try:
+        while True:
+            headers = {'Range': f'bytes={received}-'} if received else {}
+            try:
+                with requests.get(video_url, stream=True, headers=headers,
+                                  timeout=(VIDEO_DOWNLOAD_CONNECT_TIMEOUT, VIDEO_DOWNLOAD_READ_TIMEOUT)) as response:
+                    if response.status_code == 200:
+                        # Fresh download (or the server ignored our Range header)
+                        received = 0
+                        content_length = response.headers.get('Content-Length')
+                        total_size = int(content_length) if content_length else None
+                    elif response.status_code == 206:
+                        # Content-Range: bytes start-end/total
+                        content_range = response.headers.get('Content-Range', '')
+                        match = re.match(r'bytes (\d+)-\d+/(\d+|\*)$', content_range.strip())
+                        if not match or int(match.group(1)) != received:
+                            # Not the bytes we asked for - appending would corrupt the file; start over
+                            received = 0
+                            total_size = None
+                            raise requests.ConnectionError(f"Unexpected Content-Range '{content_range}'")
+                        if match.group(2) != '*':
+                            total_size = int(match.group(2))
+                    elif response.status_code >= 500:
+                        raise requests.ConnectionError(f"Server error {response.status_code}")
+                    else:
+                        raise Exception(f"Failed to download video: {response.status_code}")
+
+                    if total_size and total_size > VIDEO_DOWNLOAD_MAX_BYTES:
+                        raise Exception(f"Video too large: {total_size} bytes (limit {VIDEO_DOWNLOAD_MAX_BYTES})")
+
+                    with open(part_path, 'ab' if received else 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=VIDEO_DOWNLOAD_CHUNK_SIZE):
+                            if not chunk:
+                                continue
+                            received += len(chunk)
+                            if received > VIDEO_DOWNLOAD_MAX_BYTES:
+                                raise Exception(f"Video exceeded download limit of {VIDEO_DOWNLOAD_MAX_BYTES} bytes")
+                            f.write(chunk)
+                        f.flush()
+                        os.fsync(f.fileno())
+
+                if total_size is not None and received < total_size:
+                    raise requests.ConnectionError(f"Connection closed at {received}/{total_size} bytes")
+                break
+
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                attempt += 1
+                if attempt > VIDEO_DOWNLOAD_MAX_RETRIES:
+                    raise Exception(f"Failed to download video after {attempt} attempts: {e}")
+                print(f"VIDEO_DOWNLOAD: Attempt {attempt} failed at {received} bytes ({e}), retrying...")
+                time.sleep(min(2 ** (attempt - 1), 10))
+
+        # Atomic rename - /videos never serves a half-written file
+        os.replace(part_path, video_path)
+        print(f"VIDEO_DOWNLOAD: Saved {video_path.name} ({received} bytes)")
         return str(video_path)
-    else:
-        raise Exception(f"Failed to download video: {response.status_code}")
+    finally:
+        if part_path.exists():
+            part_path.unlink()
+
+video_jobs.set_downloader(save_video_from_url)
+
+def render_video_job(job: dict) -> str:
+    """HTML for a video job - the player once finished, else a placeholder the chat UI polls"""
+    if job['status'] == COMPLETED:
+        src = f"/videos/{pathlib.Path(job['local_path']).name}" if job['local_path'] else job['video_url']
+        return f'<video controls class="message-video" style="max-width: 500px; border-radius: 12px; margin: 12px 0;"><source src="{html.escape(src)}" type="video/mp4">Your browser does not support the video tag.</video>Video generated: {html.escape(job["prompt"] or "")}'
+    return f'<div class="video-job" data-job-id="{job["id"]}" style="padding: 12px 16px; border-radius: 12px; margin: 12px 0; background: #f3f4f6; max-width: 500px;">🎬 Generating video... it will appear here when ready (usually 1-3 minutes).</div>Video generation started for: {html.escape(job["prompt"] or "")}'
 
 # --- Permanent Link Helpers ------------------------------------------------
 def create_permanent_link_for_file(file_path: str) -> dict:
@@ -74,7 +170,6 @@ def create_permanent_link_for_file(file_path: str) -> dict:
     import json
     import string
     import random
-    import shutil
     from pathlib import Path
 
     # Configure paths
@@ -114,9 +209,9 @@ def create_permanent_link_for_file(file_path: str) -> dict:
     # Create stored filename
     stored_filename = f"{short_id}.{file_extension}" if file_extension else short_id
 
-    # Copy file to permanent storage
+    # Link file into permanent storage (shares the bytes via the blob store)
     dest_path = permanent_dir / stored_filename
-    shutil.copy2(file_path, dest_path)
+    blob_store.link_file(str(file_path), str(dest_path))
 
     # Save to database
     db[short_id] = {
@@ -161,37 +256,47 @@ def search_web(query: str) -> str:
         if not tavily_api_key:
             return "Web search unavailable: Tavily API key not configured. Please add TAVILY_API_KEY to your .env file."
         
-        # Initialize Tavily client
-        tavily = TavilyClient(api_key=tavily_api_key)
-        
         # Add current date context to improve relevance
         from datetime import datetime
         current_date = datetime.now().strftime("%B %d, %Y")  # August 13, 2025
         
-        # Enhance query with date context for current information
-        enhanced_query = f"{query} {current_date} current latest today"
+        # Check the cache first - keyed on the user's query WITHOUT the injected date,
+        # so the same question asked minutes apart shares one upstream call
+        search_params = {'search_depth': 'advanced', 'max_results': 5, 'include_answer': True, 'days': 7}
+        search_result = search_cache.get(query, search_params)
         
-        # Perform search with Tavily - optimized for AI agents
-        try:
-            search_result = tavily.search(
-                query=enhanced_query,
-                search_depth="advanced",  # Use advanced for more recent results
-                max_results=5,            # Number of search results
-                include_answer=True,      # Include AI-generated answer
-                include_raw_content=False,  # Don't include raw HTML
-                include_images=False,     # Don't include images for now
-                days=7                    # Try to get results from last 7 days
-            )
-        except Exception:
-            # Fallback without days parameter if not supported
-            search_result = tavily.search(
-                query=enhanced_query,
-                search_depth="advanced",
-                max_results=5,
-                include_answer=True,
-                include_raw_content=False,
-                include_images=False
-            )
+        if search_result is not None:
+            print(f"SEARCH_CACHE: Serving cached results for '{query}'")
+        else:
+            # Initialize Tavily client
+            tavily = TavilyClient(api_key=tavily_api_key)
+            
+            # Enhance query with date context for current information
+            enhanced_query = f"{query} {current_date} current latest today"
+            
+            # Perform search with Tavily - optimized for AI agents
+            try:
+                search_result = tavily.search(
+                    query=enhanced_query,
+                    search_depth="advanced",  # Use advanced for more recent results
+                    max_results=5,            # Number of search results
+                    include_answer=True,      # Include AI-generated answer
+                    include_raw_content=False,  # Don't include raw HTML
+                    include_images=False,     # Don't include images for now
+                    days=7                    # Try to get results from last 7 days
+                )
+            except Exception:
+                # Fallback without days parameter if not supported
+                search_result = tavily.search(
+                    query=enhanced_query,
+                    search_depth="advanced",
+                    max_results=5,
+                    include_answer=True,
+                    include_raw_content=False,
+                    include_images=False
+                )
+            
+            search_cache.set(query, search_params, search_result)
         
         # Format the results
         formatted_results = f"**Web Search Results for: '{query}'** *(as of {current_date})*\n\n"
@@ -228,7 +333,9 @@ def search_web(query: str) -> str:
 @tool
 def generate_image(prompt: str,
                   num_images: int = 1,
-                  state: Annotated[dict, InjectedState] = None) -> str:
+                  state: Annotated[dict, InjectedState] = None,
+                  *,
+                  config: RunnableConfig = None) -> str:
     """
     Generate NEW image(s) from a text description/prompt using Google Gemini 2.5 Flash Image.
 
@@ -248,66 +355,83 @@ def generate_image(prompt: str,
     # Limit to max 4 images to avoid excessive API calls
     num_images = min(num_images, 4)
 
-    # Initialize Google Gemini client
-    client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
-    model = "gemini-2.5-flash-image"
+    # Resolve thread early - the dedup scope falls back to it for guests
+    thread_id = state.get("configurable", {}).get("thread_id", "default") if state else "default"
+    if thread_id == "default":
+        global _current_thread_id
+        thread_id = _current_thread_id
 
-    generated_paths = []
-    generated_filenames = []
+    def produce_images():
+        # Initialize Google Gemini client
+        client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+        model = "gemini-2.5-flash-image"
 
-    # Generate each image separately (Google Gemini doesn't support batch generation)
-    for i in range(num_images):
-        print(f"GENERATE_IMAGE: Generating image {i+1}/{num_images}...")
+        generated_paths = []
+        generated_filenames = []
 
-        contents = [
-            types.Content(
-                role="user",
-                parts=[types.Part.from_text(text=prompt)]
-            )
-        ]
-        generate_content_config = types.GenerateContentConfig(
-            response_modalities=["IMAGE", "TEXT"]
-        )
+        # Generate each image separately (Google Gemini doesn't support batch generation)
+        for i in range(num_images):
+            print(f"GENERATE_IMAGE: Generating image {i+1}/{num_images}...")
 
-        # Generate image using streaming
-        image_data = None
-        mime_type = None
+            contents = [
+                types.Content(
+                    role="user",
+                    parts=[types.Part.from_text(text=prompt)]
+                )
+            ]
+            generate_content_config = types.GenerateContentConfig(
+                response_modalities=["IMAGE", "TEXT"]
+            )
 
-        for chunk in client.models.generate_content_stream(
-            model=model,
-            contents=contents,
-            config=generate_content_config
-        ):
-            if (chunk.candidates and
-                chunk.candidates[0].content and
-                chunk.candidates[0].content.parts):
+            # Generate image using streaming
+            image_data = None
+            mime_type = None
 
-                part = chunk.candidates[0].content.parts[0]
-                if part.inline_data and part.inline_data.data:
-                    image_data = part.inline_data.data
-                    mime_type = part.inline_data.mime_type
-                    break
+            for chunk in client.models.generate_content_stream(
+                model=model,
+                contents=contents,
+                config=generate_content_config
+            ):
+                if (chunk.candidates and
+                    chunk.candidates[0].content and
+                    chunk.candidates[0].content.parts):
 
-        if image_data:
-            # Save the generated image locally
-            timestamp = int(time.time() * 1000000)  # Microsecond timestamp
-            filename = f"img_{timestamp}.png"
-            path = ASSETS_DIR / filename
+                    part = chunk.candidates[0].content.parts[0]
+                    if part.inline_data and part.inline_data.data:
+                        image_data = part.inline_data.data
+                        mime_type = part.inline_data.mime_type
+                        break
 
-            # Ensure unique filename in case of collisions
-            counter = 1
-            while path.exists():
-                filename = f"img_{timestamp}_{counter}.png"
+            if image_data:
+                # Save the generated image locally
+                timestamp = int(time.time() * 1000000)  # Microsecond timestamp
+                filename = f"img_{timestamp}.png"
                 path = ASSETS_DIR / filename
-                counter += 1
 
-            path.write_bytes(image_data)
-            print(f"GENERATE_IMAGE: Saved image {i+1}/{num_images} with Gemini: {filename}")
+                # Ensure unique filename in case of collisions
+                counter = 1
+                while path.exists():
+                    filename = f"img_{timestamp}_{counter}.png"
+                    path = ASSETS_DIR / filename
+                    counter += 1
 
-            generated_paths.append(str(path))
-            generated_filenames.append(filename)
-        else:
-            print(f"GENERATE_IMAGE: Failed to generate image {i+1}/{num_images}")
+                path.write_bytes(image_data)
+                print(f"GENERATE_IMAGE: Saved image {i+1}/{num_images} with Gemini: {filename}")
+
+                generated_paths.append(str(path))
+                generated_filenames.append(filename)
+            else:
+                print(f"GENERATE_IMAGE: Failed to generate image {i+1}/{num_images}")
+        return (generated_paths, generated_filenames) if generated_paths else None
+
+    # Same user + same prompt within the window returns the already-generated images,
+    # and a concurrent duplicate (double submit, page refresh) waits for the first call
+    generated = generation_dedup.run(
+        get_generation_scope(config, thread_id), 'image', prompt, {'num_images': num_images},
+        produce_images,
+        is_valid=lambda result: all(os.path.exists(p) for p in result[0])
+    )
+    generated_paths, generated_filenames = generated if generated else ([], [])
 
     if not generated_paths:
         raise Exception("Failed to generate any images with Gemini 2.5 Flash Image")
@@ -317,10 +441,6 @@ def generate_image(prompt: str,
     filename = generated_filenames[-1]
     
     # CRITICAL: Set generated images in thread-specific context
-    thread_id = state.get("configurable", {}).get("thread_id", "default") if state else "default"
-    if thread_id == "default":
-        global _current_thread_id
-        thread_id = _current_thread_id
     context = get_thread_context(thread_id)
     context['recent_path'] = str(path)  # Last image as "most recent"
 
@@ -379,6 +499,11 @@ def get_thread_context(thread_id):
         }
     return _thread_image_context[thread_id]
 
+def get_generation_scope(config, thread_id):
+    """Dedup scope for generation tools - the signed-in user, else the thread (guests)"""
+    user_id = (config or {}).get("configurable", {}).get("user_id")
+    return f"user:{user_id}" if user_id else f"thread:{thread_id}"
+
 def get_thread_document_context(thread_id):
     """Get or create thread-specific document context"""
     if thread_id not in _thread_document_context:
@@ -519,7 +644,8 @@ def add_uploaded_file(thread_id, file_path, filename, mime_type=None, extension=
         mime_type=mime_type,
         file_size=file_size,
         upload_order=upload_order,
-        file_metadata=extension  # Store extension in file_metadata
+        file_metadata=extension,  # Store extension in file_metadata
+        expires_at=retention_sweeper.expiry_for(file_path)  # By category and the uploader's tier
     )
 
     # Save to database
@@ -836,83 +962,52 @@ def generate_video_from_text(prompt: str,
                             resolution: str = "720p",
                             aspect_ratio: str = "16:9",
                             num_frames: int = 121,
-                            frame_rate: int = 30) -> str:
+                            frame_rate: int = 30,
+                            *,
+                            config: RunnableConfig = None) -> str:
     """
     Generate a video from a text prompt using FAL AI's LTX-Video-13B model.
     Creates high-quality videos from detailed text descriptions.
-    Returns HTML video tag for web display.
+    Returns a placeholder that the web UI replaces with the video when it is ready.
     """
-    global _active_requests
-    
     print(f"DEBUG: generate_video_from_text called with prompt: {prompt}")
-    
-    try:
-        # Create request key to prevent duplicates
-        request_key = f"video_text_{hash(prompt)}_{resolution}"
-        
-        # Check if this exact request is already in progress
-        if request_key in _active_requests:
-            return f"Video generation already in progress for this prompt. Please wait..."
-        
-        # Clean up old requests and mark as active
-        current_time = time.time()
-        _active_requests = {k: v for k, v in _active_requests.items() if current_time - v < 300}
-        _active_requests[request_key] = current_time
-        result = fal_client.subscribe(
+
+    thread_id = (config or {}).get("configurable", {}).get("thread_id") or _current_thread_id
+
+    def submit_video():
+        return video_jobs.submit(
             "fal-ai/ltx-video",
-            arguments={
+            {
                 "prompt": prompt,
                 "num_inference_steps": 30,
                 "guidance_scale": 7.5,
                 "negative_prompt": "worst quality, inconsistent motion, blurry, jittery, distorted"
             },
-            with_logs=True
+            kind='video_text', prompt=prompt, thread_id=thread_id
         )
-        
-        # Check for video URL in result (FAL AI may return different structures)
-        video_url = None
-        if result:
-            if isinstance(result, dict):
-                # Try different possible response structures
-                if 'video' in result and result['video']:
-                    if isinstance(result['video'], dict) and 'url' in result['video']:
-                        video_url = result['video']['url']
-                    elif isinstance(result['video'], str):
-                        video_url = result['video']
-                elif 'url' in result:
-                    video_url = result['url']
-                elif 'output' in result:
-                    video_url = result['output']
-
-        if video_url:
-            
-            # Download and save the video locally
-            try:
-                local_video_path = save_video_from_url(video_url)
-                filename = pathlib.Path(local_video_path).name
-                
-                # Clean up active request
-                if request_key in _active_requests:
-                    del _active_requests[request_key]
-                
-                # Return HTML video element for web display
-                return f'<video controls class="message-video" style="max-width: 500px; border-radius: 12px; margin: 12px 0;"><source src="/videos/{filename}" type="video/mp4">Your browser does not support the video tag.</video>Successfully generated video: {prompt}\nVideo saved to {local_video_path}'
-            except Exception as download_error:
-                # Clean up active request
-                if request_key in _active_requests:
-                    del _active_requests[request_key]
-                # Fallback: use the direct URL if download fails
-                return f'<video controls class="message-video" style="max-width: 500px; border-radius: 12px; margin: 12px 0;"><source src="{video_url}" type="video/mp4">Your browser does not support the video tag.</video>Video generated: {video_url}'
-        else:
-            # Clean up active request on failure
-            if request_key in _active_requests:
-                del _active_requests[request_key]
-            return "Failed to generate video from text prompt"
-            
+
+    def job_reusable(job):
+        job = video_jobs.get_job(job['id'])
+        if not job or job['status'] == FAILED:
+            return False
+        return not job['local_path'] or os.path.exists(job['local_path'])
+
+    try:
+        # Submit to the FAL queue and return right away - the video is delivered
+        # to the chat when the job completes. Identical prompt + settings from the
+        # same user reuses the existing job instead of paying for a second render.
+        job = generation_dedup.run(
+            get_generation_scope(config, thread_id), 'video_text', prompt,
+            {'resolution': resolution, 'aspect_ratio': aspect_ratio,
+             'num_frames': num_frames, 'frame_rate': frame_rate},
+            submit_video,
+            is_valid=job_reusable
+        )
+        return render_video_job(video_jobs.get_job(job['id']))
+
+    except GenerationInProgress:
+        return "Video generation already in progress for this prompt. Please wait..."
     except Exception as e:
-        # Clean up active request on error
-        if 'request_key' in locals() and request_key in _active_requests:
-            del _active_requests[request_key]
         print(f"ERROR in generate_video_from_text: {str(e)}")
         print(f"Full error details: {type(e).__name__}: {e}")
         import traceback
@@ -932,7 +1027,7 @@ def generate_video_from_image(prompt: str,
     """
     Generate a video from an existing image and text prompt using FAL AI's LTX-Video-13B model.
     Intelligently selects the appropriate image based on the prompt content.
-    Returns HTML video tag for web display.
+    Returns a placeholder that the web UI replaces with the video when it is ready.
     """
     # PROPER APPROACH: Read thread_id from RunnableConfig (not from state or globals)
     thread_id = config.get("configurable", {}).get("thread_id") if config else None
@@ -1021,9 +1116,9 @@ def generate_video_from_image(prompt: str,
             # Upload local file to FAL
             fal_image_url = fal_client.upload_file(image_path)
         
-        result = fal_client.subscribe(
+        job = video_jobs.submit(
             "fal-ai/ltx-video-13b-distilled/image-to-video",
-            arguments={
+            {
                 "prompt": prompt,
                 "image_url": fal_image_url,
                 "negative_prompt": "worst quality, inconsistent motion, blurry, jittery, distorted",
@@ -1035,38 +1130,11 @@ def generate_video_from_image(prompt: str,
                 "expand_prompt": True,
                 "constant_rate_factor": 35
             },
-            with_logs=True
+            kind='video_image', prompt=prompt, thread_id=thread_id
         )
-        
-        # Check for video URL in result (FAL AI may return different structures)
-        video_url = None
-        if result:
-            if isinstance(result, dict):
-                # Try different possible response structures
-                if 'video' in result and result['video']:
-                    if isinstance(result['video'], dict) and 'url' in result['video']:
-                        video_url = result['video']['url']
-                    elif isinstance(result['video'], str):
-                        video_url = result['video']
-                elif 'url' in result:
-                    video_url = result['url']
-                elif 'output' in result:
-                    video_url = result['output']
-
-        if video_url:
-            
-            # Download and save the video locally
-            try:
-                local_video_path = save_video_from_url(video_url)
-                filename = pathlib.Path(local_video_path).name
-                
-                # Return HTML video element for web display
-                return f'<video controls class="message-video" style="max-width: 500px; border-radius: 12px; margin: 12px 0;"><source src="/videos/{filename}" type="video/mp4">Your browser does not support the video tag.</video>Video saved to {local_video_path}'
-            except Exception as download_error:
-                # Fallback: use the direct URL if download fails
-                return f'<video controls class="message-video" style="max-width: 500px; border-radius: 12px; margin: 12px 0;"><source src="{video_url}" type="video/mp4">Your browser does not support the video tag.</video>Video generated: {video_url}'
-        else:
-            return "Failed to generate video from image"
+
+        # Returns immediately - the chat UI swaps in the video when the job completes
+        return render_video_job(job)
             
     except Exception as e:
         return f"Error generating video from image: {str(e)}"
@@ -4391,10 +4459,8 @@ def build_app():
                     # Auto-inject file context for agent
                     from langchain_core.messages import HumanMessage
 
-                    files_list = []
-                    for f in files:
-                        age_seconds = int(time.time() - f['timestamp'])
-                        files_list.append(f"- {f['filename']} ({f['category']}, {f['size']} bytes, uploaded {age_seconds}s ago)\n  PATH: {f['path']}")
+                    # Most recent files only - the banner is re-sent on every turn
+                    files_list = history_budget.file_banner_entries(files, time.time())
 
                     file_context = "\n\n🚨 CRITICAL SYSTEM NOTIFICATION 🚨\n" + \
                                   "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n" + \
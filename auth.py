@@ -1,48 +1,63 @@
 """
 Authentication utilities and decorators for AIezzy web application.
 Provides session management, authentication decorators, and utility functions.
+
+Session lookups are memoized per request in g and cached per process for
+SESSION_CACHE_TTL seconds, so a request that checks the user several times
+(decorator, get_user_id, templates) costs one dict lookup. Logout, profile
+changes and deactivation invalidate the cache; other workers catch up within the TTL.
 """
 
+from datetime import datetime
 from functools import wraps
-from flask import request, jsonify, session, g
+from flask import request, jsonify, session, g, has_request_context
 from models import UserManager
+from bounded_cache import BoundedCache
+from rate_limit import rate_limiter
+from config import get_config
 import time
 
+config = get_config()
+
 # Initialize user manager
 user_manager = UserManager()
 
+# session token -> (user, session expires_at in UTC)
+session_cache = BoundedCache('sessions', max_entries=config.SESSION_CACHE_MAX_ENTRIES,
+                             max_bytes=config.SESSION_CACHE_MAX_ENTRIES * 512, ttl=config.SESSION_CACHE_TTL)
+
 def get_client_ip():
-    """Get client IP address considering proxy headers"""
-    if request.environ.get('HTTP_X_FORWARDED_FOR'):
-        return request.environ['HTTP_X_FORWARDED_FOR'].split(',')[0].strip()
-    elif request.environ.get('HTTP_X_REAL_IP'):
-        return request.environ['HTTP_X_REAL_IP']
-    else:
-        return request.environ.get('REMOTE_ADDR')
+    """
+    Get client IP address considering proxy headers
+
+    Only the X-Forwarded-For entries appended by our own proxies (the rightmost
+    TRUSTED_PROXY_COUNT) are trusted - anything left of them is whatever the
+    client sent, so it can't be used to dodge per-IP rate limits.
+    """
+    forwarded = [ip.strip() for ip in request.environ.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+    if config.TRUSTED_PROXY_COUNT and forwarded:
+        return forwarded[-min(config.TRUSTED_PROXY_COUNT, len(forwarded))]
+    return request.environ.get('REMOTE_ADDR')
 
 def get_user_agent():
     """Get client user agent"""
     return request.headers.get('User-Agent', '')
 
-def get_current_user():
-    """Get current authenticated user from session or token"""
-    # Check session token in multiple places
-    session_token = None
-    
+def get_session_token():
+    """Session token from the Authorization header, session cookie, form/JSON body or query string"""
     # 1. Check Authorization header
     auth_header = request.headers.get('Authorization')
-    if auth_header and auth_header.startswith('Bearer '):
-        session_token = auth_header[7:]  # Remove 'Bearer ' prefix
+    if auth_header and auth_header.startswith('Bearer ') and auth_header[7:]:
+        return auth_header[7:]  # Remove 'Bearer ' prefix
     
     # 2. Check session cookie
-    if not session_token:
-        session_token = session.get('session_token')
+    session_token = session.get('session_token')
     
     # 3. Check form data or JSON for token
     if not session_token:
         if request.is_json:
             data = request.get_json(silent=True)
-            session_token = data.get('session_token') if data else None
+            session_token = data.get('session_token') if isinstance(data, dict) else None
         else:
             session_token = request.form.get('session_token')
     
@@ -50,15 +65,52 @@ def get_current_user():
     if not session_token:
         session_token = request.args.get('session_token')
     
-    if session_token:
-        user = user_manager.get_user_by_session(session_token)
-        if user:
-            # Store in g for easy access during request
-            g.current_user = user
-            g.session_token = session_token
-            return user
+    return session_token
+
+def lookup_session(session_token):
+    """User for a session token, from the process cache or the database"""
+    cached = session_cache.get(session_token)
+    if cached is not None:
+        user, expires_at = cached
+        if expires_at >= datetime.utcnow():
+            return dict(user)
+        # Expired since it was cached - the database lookup deactivates it
+        session_cache.invalidate(session_token)
+    
+    found = user_manager.get_session(session_token)
+    if not found:
+        return None
+    session_cache.set(session_token, found, size=512)
+    return dict(found[0])
+
+def get_current_user():
+    """Get current authenticated user from session or token"""
+    # Resolved once per request
+    if 'auth_resolved' in g:
+        return g.current_user
+    
+    session_token = get_session_token()
+    user = lookup_session(session_token) if session_token else None
     
-    return None
+    # Store in g for easy access during request
+    g.auth_resolved = True
+    g.current_user = user
+    if user:
+        g.session_token = session_token
+    return user
+
+def invalidate_session(session_token):
+    """Forget a cached session (logout)"""
+    session_cache.invalidate(session_token)
+    if has_request_context() and g.get('session_token') == session_token:
+        g.pop('auth_resolved', None)
+
+def invalidate_user(user_id):
+    """Forget every cached session of a user (profile change, deactivation)"""
+    user_id = int(user_id)
+    session_cache.invalidate_where(lambda token, cached: cached[0]['id'] == user_id)
+    if has_request_context():
+        g.pop('auth_resolved', None)
 
 def login_required(f):
     """Decorator that requires user authentication"""
@@ -131,34 +183,9 @@ def clear_session():
     session.pop('logged_in', None)
 
 def rate_limit_check(key, limit=5, window=300):
-    """Simple rate limiting - returns True if allowed, False if rate limited"""
-    # This is a simple in-memory rate limiter
-    # In production, you'd want to use Redis or similar
-    import time
-    
-    if not hasattr(rate_limit_check, 'attempts'):
-        rate_limit_check.attempts = {}
-    
-    now = time.time()
-    
-    # Clean old entries
-    rate_limit_check.attempts = {
-        k: v for k, v in rate_limit_check.attempts.items() 
-        if now - v[0] < window
-    }
-    
-    if key in rate_limit_check.attempts:
-        first_attempt, count = rate_limit_check.attempts[key]
-        if now - first_attempt < window:
-            if count >= limit:
-                return False
-            rate_limit_check.attempts[key] = (first_attempt, count + 1)
-        else:
-            rate_limit_check.attempts[key] = (now, 1)
-    else:
-        rate_limit_check.attempts[key] = (now, 1)
-    
-    return True
+    """Sliding-window rate limit - returns True if allowed, False if rate limited"""
+    allowed, _ = rate_limiter.hit(f'check:{key}', limit, window)
+    return allowed
 
 def validate_password_strength(password):
     """Validate password strength requirements - simplified"""
@@ -0,0 +1,177 @@
+"""
+Session lookup latency benchmark for AIezzy.
+Creates users and sessions in a temporary database and times
+UserManager.get_user_by_session() - the query behind every @optional_auth
+request, on a reused per-thread sqlite3 connection in WAL mode - from N concurrent
+threads, against the previous implementation (a new sqlite3 connection per
+call, rollback journal), and through auth's per-process session cache. A
+background writer logging activity can be added to show readers and the
+writer blocking each other.
+
+Usage (from the repository root):
+    python benchmarks/auth_lookup.py
+    python benchmarks/auth_lookup.py --threads 1 4 16 --writer --output benchmarks/results/auth_lookup.txt
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from flask import Flask
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from auth import lookup_session
+from models import UserManager
+from models_v2 import db, init_db
+
+def legacy_lookup(db_path: str, session_token: str):
+    """Previous implementation: connect, join, close on every request"""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        result = conn.execute('''
+            SELECT u.id, u.username, u.email, u.full_name, u.is_admin, s.expires_at
+            FROM users u
+            JOIN user_sessions s ON u.id = s.user_id
+            WHERE s.session_token = ? AND s.is_active = TRUE AND u.is_active = TRUE
+        ''', (session_token,)).fetchone()
+        if result and datetime.fromisoformat(result['expires_at']) < datetime.now():
+            return None
+        return dict(result) if result else None
+    finally:
+        conn.close()
+
+def legacy_write(db_path: str, user_id: int):
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute('INSERT INTO user_activity (user_id, activity_type) VALUES (?, ?)', (user_id, 'benchmark'))
+        conn.commit()
+    finally:
+        conn.close()
+
+def make_app(path: str) -> Flask:
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_size': 16}
+    init_db(app)
+    return app
+
+def make_database(app: Flask, users: int, wal: bool) -> list:
+    """Users with one session each; returns the session tokens"""
+    manager = UserManager()
+    with app.app_context():
+        tokens = [manager.authenticate_user(manager.create_user(f'user{i}@example.com', 'secret')['username'], 'secret')['session_token']
+                  for i in range(users)]
+        if not wal:
+            db.session.remove()
+            db.engine.dispose()
+            conn = sqlite3.connect(app.config['SQLALCHEMY_DATABASE_URI'][len('sqlite:///'):])
+            conn.execute('PRAGMA journal_mode=DELETE')
+            conn.close()
+    return tokens
+
+def in_app_context(app: Flask, fn):
+    """Run fn in an app context, as a request would (one session, returned to the pool afterwards)"""
+    def wrapped(*args):
+        with app.app_context():
+            return fn(*args)
+    return wrapped
+
+def run(lookup, write, tokens: list, threads: int, lookups: int, writer: bool) -> tuple:
+    """Per-lookup latencies (ms) and lookups per second"""
+    timings = []
+    timings_lock = threading.Lock()
+    done = threading.Event()
+    errors = []
+
+    def reader(seed: int):
+        rng = random.Random(seed)
+        local = []
+        for _ in range(lookups):
+            start = time.perf_counter()
+            try:
+                lookup(rng.choice(tokens))
+            except sqlite3.Error as e:
+                errors.append(e)
+            local.append((time.perf_counter() - start) * 1000)
+        with timings_lock:
+            timings.extend(local)
+
+    def background_writer():
+        while not done.is_set():
+            try:
+                write(1)
+            except sqlite3.Error as e:
+                errors.append(e)
+            time.sleep(0.001)
+
+    workers = [threading.Thread(target=reader, args=(n,)) for n in range(threads)]
+    writer_thread = threading.Thread(target=background_writer) if writer else None
+    if writer_thread:
+        writer_thread.start()
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    if writer_thread:
+        writer_thread.join()
+
+    timings.sort()
+    return timings, len(timings) / elapsed, len(errors)
+
+def main():
+    parser = argparse.ArgumentParser(description='Time session lookups: per-call connections vs the pooled WAL engine vs the session cache')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 16], help='Concurrent request threads')
+    parser.add_argument('--lookups', type=int, default=2000, help='Lookups per thread')
+    parser.add_argument('--users', type=int, default=500, help='Users (one session each)')
+    parser.add_argument('--writer', action='store_true', help='Log activity from a background writer meanwhile')
+    parser.add_argument('--output', help='Also write the report to this file')
+    args = parser.parse_args()
+
+    lines = [f"Session lookup latency ({args.users} sessions, {args.lookups} lookups per thread"
+             f"{', background writer' if args.writer else ''})", "",
+             f"{'implementation':<16}{'threads':>8}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}{'lookups/s':>11}{'errors':>8}"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, 'legacy.db')
+        legacy_tokens = make_database(make_app(legacy_path), args.users, wal=False)
+        app = make_app(os.path.join(tmp, 'pooled.db'))
+        pooled_tokens = make_database(app, args.users, wal=True)
+        pooled = UserManager()
+
+        implementations = [
+            ('per-call', lambda token: legacy_lookup(legacy_path, token),
+             lambda user_id: legacy_write(legacy_path, user_id), legacy_tokens),
+            ('pooled WAL', in_app_context(app, pooled.get_user_by_session),
+             in_app_context(app, lambda user_id: pooled.log_activity(user_id, 'benchmark')), pooled_tokens),
+            ('session cache', in_app_context(app, lookup_session),
+             in_app_context(app, lambda user_id: pooled.log_activity(user_id, 'benchmark')), pooled_tokens)
+        ]
+        for threads in args.threads:
+            for label, lookup, write, tokens in implementations:
+                timings, throughput, errors = run(lookup, write, tokens, threads, args.lookups, args.writer)
+                p95 = timings[int(len(timings) * 0.95) - 1]
+                lines.append(f"{label:<16}{threads:>8}{statistics.median(timings):>9.3f}{p95:>9.3f}"
+                             f"{timings[-1]:>9.1f}{throughput:>11.0f}{errors:>8}")
+
+    report = "\n".join(lines)
+    print(report)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            f.write(report + "\n")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Response compression benchmark for AIezzy.
+Serves representative payloads (conversation JSON with embedded message HTML,
+a large admin file listing, the chat page HTML) through a Flask app with
+init_compression() and reports bytes on the wire, server-side time per request
+and estimated end-to-end time at a given bandwidth, per encoding.
+
+Usage (from the repository root):
+    python benchmarks/compression.py
+    python benchmarks/compression.py --requests 200 --mbps 5 --output benchmarks/results/compression.txt
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from flask import Flask, Response, jsonify
+from compression import available_encodings, init_compression
+
+def conversation_payload(messages: int = 60) -> dict:
+    """Shape of /api/get-conversation/<id>: messages with rendered HTML"""
+    return {
+        'id': 'conv_1729300000_ab12cd',
+        'title': 'PDF conversions and image edits',
+        'messages': [{
+            'content': (f'<p>Here is the converted file for step {i}:</p>'
+                        f'<a href="/documents/1729300{i:03d}_report_part{i}.pdf" target="_blank">report_part{i}.pdf</a>'
+                        f'<img src="/assets/img_1729300{i:06d}.png" class="message-image" alt="Generated image" '
+                        f'onclick="openImageModal(\'/assets/img_1729300{i:06d}.png\')">'
+                        + ' The document has been converted successfully with all tables preserved.' * 5),
+            'isUser': i % 2 == 0,
+            'timestamp': f'{10 + i // 60:02d}:{i % 60:02d}'
+        } for i in range(messages)]
+    }
+
+def file_listing_payload(rows: int = 3000) -> dict:
+    """Shape of /admin/api/files: one row per stored file"""
+    return {'files': [{
+        'name': f'{1729300000 + i}_upload_{i}.pdf',
+        'path': f'/app/data/uploads/{1729300000 + i}_upload_{i}.pdf',
+        'size': 1024 * (i % 500 + 1),
+        'category': ['uploads', 'documents', 'assets', 'videos'][i % 4],
+        'modified': 1729300000 + i,
+        'url': f'/uploads/{1729300000 + i}_upload_{i}.pdf'
+    } for i in range(rows)], 'total': rows}
+
+def build_app() -> Flask:
+    app = Flask(__name__)
+    conversation = conversation_payload()
+    listing = file_listing_payload()
+    with open(os.path.join(REPO_ROOT, 'templates', 'modern_chat.html'), 'rb') as f:
+        chat_page = f.read()
+
+    app.add_url_rule('/conversation', 'conversation', lambda: jsonify(conversation))
+    app.add_url_rule('/files', 'files', lambda: jsonify(listing))
+    app.add_url_rule('/page', 'page', lambda: Response(chat_page, mimetype='text/html'))
+    app.add_url_rule('/streamed', 'streamed', lambda: Response(
+        (json.dumps(row) + '\n' for row in listing['files']), mimetype='text/plain'))
+    init_compression(app)
+    return app
+
+def measure(client, path: str, encoding: str, requests: int) -> tuple:
+    """(bytes on the wire, mean server ms) for one path/encoding"""
+    headers = {'Accept-Encoding': encoding} if encoding != 'identity' else {}
+    size = len(client.get(path, headers=headers).data)
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.get(path, headers=headers).data
+    return size, (time.perf_counter() - start) / requests * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure bytes and latency saved by response compression')
+    parser.add_argument('--requests', type=int, default=100, help='Requests per path/encoding')
+    parser.add_argument('--mbps', type=float, default=10.0, help='Client bandwidth for transfer estimates')
+    parser.add_argument('--output', help='Also write the report to this file')
+    args = parser.parse_args()
+
+    client = build_app().test_client()
+    encodings = ['identity'] + [e for e in ('gzip', 'br') if e in available_encodings()]
+    bytes_per_ms = args.mbps * 1_000_000 / 8 / 1000
+
+    lines = [f"Compression benchmark ({args.requests} requests each, transfer estimated at {args.mbps:g} Mbps)", "",
+             f"{'path':<14}{'encoding':<10}{'bytes':>10}{'ratio':>8}{'server ms':>11}{'total ms':>10}"]
+    for path in ('/conversation', '/files', '/page', '/streamed'):
+        baseline = None
+        for encoding in encodings:
+            size, server_ms = measure(client, path, encoding, args.requests)
+            baseline = baseline or size
+            total_ms = server_ms + size / bytes_per_ms
+            lines.append(f"{path:<14}{encoding:<10}{size:>10}{size / baseline:>8.2f}{server_ms:>11.2f}{total_ms:>10.1f}")
+        lines.append("")
+
+    report = "\n".join(lines).rstrip()
+    print(report)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            f.write(report + "\n")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Conversation search latency benchmark for AIezzy.
+Fills a temporary ConversationStore with N synthetic conversations for one
+user (plus a second user sharing the same index) and times
+ConversationStore.search() for common, rare, multi-word and prefix queries.
+
+Usage (from the repository root):
+    python benchmarks/conversation_search.py
+    python benchmarks/conversation_search.py --conversations 10000 --output benchmarks/results/conversation_search.txt
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from conversation_store import ConversationStore
+
+TOPICS = ['pdf', 'invoice', 'resume', 'video', 'sunset', 'python', 'excel', 'qr', 'logo', 'recipe',
+          'translate', 'weather', 'contract', 'poster', 'portrait', 'budget', 'slides', 'essay']
+
+def make_vocabulary(size: int, rng: random.Random) -> list:
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    return [''.join(rng.choice(letters) for _ in range(rng.randint(3, 9))) for _ in range(size)]
+
+def make_conversation(i: int, messages: int, vocabulary: list, rng: random.Random) -> dict:
+    topic = TOPICS[i % len(TOPICS)]
+    return {
+        'title': f'{topic.title()} help {i}',
+        'lastUpdated': f'2026-01-01T00:00:{i % 60:02d}.000Z',
+        'messages': [{
+            'content': f'<p>{topic} ' + ' '.join(rng.choice(vocabulary) for _ in range(40)) + '</p>',
+            'isUser': n % 2 == 0
+        } for n in range(messages)]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Time full-text conversation search')
+    parser.add_argument('--conversations', type=int, default=10000, help='Conversations for the searched user')
+    parser.add_argument('--messages', type=int, default=10, help='Messages per conversation')
+    parser.add_argument('--runs', type=int, default=50, help='Timed runs per query')
+    parser.add_argument('--output', help='Also write the report to this file')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    vocabulary = make_vocabulary(5000, rng)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ConversationStore(conversations_dir=os.path.join(tmp, 'conversations'),
+                                  index_path=os.path.join(tmp, 'index.db'))
+        start = time.perf_counter()
+        for user_id in ('bench', 'other'):
+            for i in range(args.conversations):
+                store.save(user_id, f'conv_{i}', make_conversation(i, args.messages, vocabulary, rng))
+        build_seconds = time.perf_counter() - start
+
+        queries = {
+            'common word': 'pdf',
+            'rare word': vocabulary[1234],
+            'two words': f'invoice {vocabulary[77]}',
+            'prefix': vocabulary[500][:3],
+            'title word': 'help'
+        }
+
+        lines = [f"Conversation search ({args.conversations} conversations x {args.messages} messages per user, "
+                 f"2 users, index built in {build_seconds:.0f}s)", "",
+                 f"{'query':<14}{'results':>8}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}"]
+        for label, query in queries.items():
+            results, _ = store.search('bench', query, limit=20)
+            timings = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                store.search('bench', query, limit=20)
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            lines.append(f"{label:<14}{len(results):>8}{statistics.median(timings):>9.1f}{p95:>9.1f}{timings[-1]:>9.1f}")
+
+    report = "\n".join(lines)
+    print(report)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            f.write(report + "\n")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Bulk conversation export memory benchmark for AIezzy.
+Writes N synthetic conversations into a temporary ConversationStore and
+compares peak Python heap (tracemalloc) of the old in-memory ZIP build
+(BytesIO, then copied into a second BytesIO) against stream_zip().
+
+Usage (from the repository root):
+    python benchmarks/export_memory.py
+    python benchmarks/export_memory.py --counts 50 200 800 --output benchmarks/results/export_memory.txt
+"""
+
+import argparse
+import os
+import secrets
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from io import BytesIO
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from conversation_export import render_conversation, export_filename, stream_zip
+from conversation_store import ConversationStore
+
+def make_conversation(i: int, messages: int) -> dict:
+    return {
+        'id': f'conv_{i}',
+        'title': f'Benchmark conversation {i}',
+        'lastUpdated': f'2026-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}.000Z',
+        'messages': [{
+            # Random hex keeps the archive from compressing to nothing
+            'content': f'<p>Step {n} of conversation {i}</p><img src="/assets/img_{i}_{n}.png">' + secrets.token_hex(600),
+            'isUser': n % 2 == 0,
+            'timestamp': '10:00'
+        } for n in range(messages)]
+    }
+
+def buffered_export(store: ConversationStore, user_id: str, export_format: str) -> int:
+    """Previous implementation: whole archive in memory, then copied again"""
+    zip_buffer = BytesIO()
+    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        for conversation_id, conversation in store.iter_conversations(user_id):
+            zip_file.writestr(export_filename(conversation, conversation_id, export_format),
+                              render_conversation(conversation, export_format))
+    zip_buffer.seek(0)
+    return len(BytesIO(zip_buffer.read()).getvalue())
+
+def streamed_export(store: ConversationStore, user_id: str, export_format: str) -> int:
+    """stream_zip(): chunks are consumed (sent) as they are produced"""
+    return sum(len(chunk) for chunk in stream_zip(store.iter_conversations(user_id), export_format))
+
+def measure(fn, *args) -> tuple:
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = fn(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, peak / 1024 / 1024, elapsed * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare peak memory of buffered vs streamed conversation export')
+    parser.add_argument('--counts', type=int, nargs='+', default=[50, 200, 800], help='Conversations per run')
+    parser.add_argument('--messages', type=int, default=40, help='Messages per conversation')
+    parser.add_argument('--format', default='html', choices=['json', 'markdown', 'html'])
+    parser.add_argument('--output', help='Also write the report to this file')
+    args = parser.parse_args()
+
+    lines = [f"Bulk export peak heap ({args.format}, {args.messages} messages per conversation)", "",
+             f"{'conversations':>13}{'zip MB':>9}{'buffered MB':>13}{'streamed MB':>13}{'buffered ms':>13}{'streamed ms':>13}"]
+
+    for count in args.counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = ConversationStore(conversations_dir=os.path.join(tmp, 'conversations'),
+                                      index_path=os.path.join(tmp, 'index.db'))
+            for i in range(count):
+                store.save('bench', f'conv_{i}', make_conversation(i, args.messages))
+
+            size, buffered_peak, buffered_ms = measure(buffered_export, store, 'bench', args.format)
+            _, streamed_peak, streamed_ms = measure(streamed_export, store, 'bench', args.format)
+            lines.append(f"{count:>13}{size / 1024 / 1024:>9.1f}{buffered_peak:>13.1f}{streamed_peak:>13.1f}"
+                         f"{buffered_ms:>13.0f}{streamed_ms:>13.0f}")
+
+    report = "\n".join(lines)
+    print(report)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            f.write(report + "\n")
+
+if __name__ == '__main__':
+    main()
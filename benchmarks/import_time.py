@@ -0,0 +1,95 @@
+"""
+Import-time benchmark for AIezzy worker startup.
+Runs `python -X importtime -c "import <module>"` in fresh interpreters, with tool
+modules imported lazily (default) and eagerly (TOOL_IMPORTS_EAGER=true), and
+reports wall time plus the heaviest top-level imports.
+
+Usage (from the repository root):
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --module web_app --runs 5 --output benchmarks/results/import_time.txt
+
+GOOGLE_API_KEY only needs to be non-empty - no API calls are made at import.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run_import(module: str, eager: bool, extra_code: str = '') -> tuple:
+    """Import module in a fresh interpreter; returns (wall seconds, importtime stderr, stdout)"""
+    env = dict(os.environ)
+    env.setdefault('GOOGLE_API_KEY', 'benchmark-placeholder')
+    env['TOOL_IMPORTS_EAGER'] = 'true' if eager else 'false'
+
+    code = f"import {module}\n{extra_code}"
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    return elapsed, result.stderr, result.stdout
+
+def top_imports(importtime_output: str, limit: int) -> list:
+    """Heaviest direct imports (one level below the target) by cumulative microseconds"""
+    rows = []
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        name = name.rstrip('\n')[1:]  # drop the separator space; the rest is 2 spaces per level
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 1:  # direct children of the target module
+            rows.append((int(cumulative_us), name.strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure worker import time with lazy vs eager tool imports')
+    parser.add_argument('--module', default='app', help='Module to import (app or web_app)')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--top', type=int, default=15, help='Heaviest imports to list')
+    parser.add_argument('--output', help='Also write the report to this file')
+    args = parser.parse_args()
+
+    lines = [f"Import-time benchmark: import {args.module} ({args.runs} runs each, median)",
+             f"Python {sys.version.split()[0]} on {sys.platform}", ""]
+
+    profiles = {}
+    for mode, eager in (('eager', True), ('lazy', False)):
+        timings = []
+        for _ in range(args.runs):
+            elapsed, profile, _ = run_import(args.module, eager)
+            timings.append(elapsed)
+        profiles[mode] = profile
+        lines.append(f"{mode:>5}: {statistics.median(timings) * 1000:8.0f} ms  "
+                     f"(min {min(timings) * 1000:.0f}, max {max(timings) * 1000:.0f})")
+
+    # Cost moved to the first tool call in lazy mode
+    _, _, stdout = run_import(args.module, eager=False, extra_code=(
+        "import time\n"
+        "from tool_registry import tool_registry\n"
+        "start = time.perf_counter()\n"
+        "tool_registry.preload()\n"
+        "print(f'PRELOAD_MS {(time.perf_counter() - start) * 1000:.0f}')\n"))
+    preload_ms = next((l.split()[1] for l in stdout.splitlines() if l.startswith('PRELOAD_MS')), '?')
+    lines.append(f"lazy: loading all registered tool modules later costs {preload_ms} ms (paid on first use)")
+
+    for mode in ('eager', 'lazy'):
+        lines += ["", f"Heaviest direct imports ({mode}), cumulative ms:"]
+        for cumulative_us, name in top_imports(profiles[mode], args.top):
+            lines.append(f"  {cumulative_us / 1000:8.1f}  {name}")
+
+    report = "\n".join(lines)
+    print(report)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            f.write(report + "\n")
+
+if __name__ == '__main__':
+    main()
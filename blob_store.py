@@ -0,0 +1,285 @@
+"""
+Content-addressed blob store for AIezzy's uploads and permanent links.
+Bytes are stored once under BLOB_DIR/sha256/<ab>/<cd>/<digest>. Every place
+a file must appear (uploads/, documents/, permanent_files/ ...) gets a hardlink
+to its blob, so existing URL paths and directory-based routes keep working
+while a repeat upload or a permanent link costs a link instead of a copy.
+Where hardlinks aren't possible (another filesystem, no support) the file is
+copied instead and the blob is not shared.
+
+A small SQLite index maps each linked path to its digest; media_files uses it
+for ETags without re-hashing. A blob nobody links to any more (link count 1,
+e.g. after the retention sweeper deleted its paths) is removed by
+collect_garbage().
+
+Hardlinks share one inode, so linking touches its mtime: a fresh upload of old
+bytes must not look old to the retention sweeper.
+"""
+
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from typing import BinaryIO, Dict, Optional
+from config import get_config
+
+config = get_config()
+
+CHUNK_SIZE = 1024 * 1024
+
+class BlobStore:
+    """sha256-keyed blobs with hardlinked paths and a path -> digest index"""
+
+    def __init__(self, root: str = None, index_path: str = None, enabled: bool = None):
+        self.root = root or config.BLOB_DIR
+        self.index_path = index_path or config.BLOB_INDEX_DB
+        self.enabled = config.BLOB_STORE_ENABLED if enabled is None else enabled
+        self._local = threading.local()
+        self._initialized = False
+        self._init_lock = threading.Lock()
+        self.stats = {'stored': 0, 'deduplicated': 0, 'bytes_saved': 0, 'linked': 0, 'copied': 0,
+                      'gc_removed': 0, 'gc_bytes': 0}
+
+    def _connection(self) -> sqlite3.Connection:
+        """One autocommit connection per thread (reopened after a fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            if not self._initialized:
+                with self._init_lock:
+                    if not self._initialized:
+                        os.makedirs(os.path.join(self.root, 'tmp'), exist_ok=True)
+                        os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+                        self._initialized = True
+            conn = sqlite3.connect(self.index_path, timeout=config.USER_DB_BUSY_TIMEOUT, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS blob_paths (
+                    path TEXT PRIMARY KEY,
+                    digest TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_blob_paths_digest ON blob_paths (digest)')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, 'sha256', digest[:2], digest[2:4], digest)
+
+    def _ingest(self, stream: BinaryIO) -> tuple:
+        """Write a stream into the store, hashing as it goes; returns (digest, size, was new)"""
+        self._connection()
+        if stream.seekable():
+            # Already buffered (werkzeug spools uploads) - hash first so a repeat writes nothing
+            start = stream.tell()
+            sha = hashlib.sha256()
+            size = 0
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                sha.update(chunk)
+                size += len(chunk)
+            digest = sha.hexdigest()
+            blob = self.blob_path(digest)
+            if os.path.exists(blob):
+                os.utime(blob)
+                return digest, size, False
+            stream.seek(start)
+
+        temp_path = os.path.join(self.root, 'tmp', uuid.uuid4().hex)
+        sha = hashlib.sha256()
+        size = 0
+        try:
+            with open(temp_path, 'wb') as f:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                    sha.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            digest = sha.hexdigest()
+            blob = self.blob_path(digest)
+            if os.path.exists(blob):
+                # Fresh mtime keeps collect_garbage() off it until it is linked
+                os.utime(blob)
+                return digest, size, False
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            os.replace(temp_path, blob)
+            return digest, size, True
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _link(self, digest: str, size: int, dest_path: str) -> None:
+        """Make dest_path a hardlink to the blob (a copy where links aren't possible) and index it"""
+        blob = self.blob_path(digest)
+        temp_path = f"{dest_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.link(blob, temp_path)
+            self.stats['linked'] += 1
+        except OSError:
+            shutil.copyfile(blob, temp_path)
+            self.stats['copied'] += 1
+        os.replace(temp_path, dest_path)
+        os.utime(dest_path)
+
+        self._connection().execute(
+            'INSERT OR REPLACE INTO blob_paths (path, digest, size, created_at) VALUES (?, ?, ?, ?)',
+            (os.path.abspath(dest_path), digest, size, time.time()))
+
+    def save(self, stream: BinaryIO, dest_path: str) -> Dict:
+        """
+        Store a stream's bytes and make them appear at dest_path
+
+        Args:
+            stream: Readable binary stream (e.g. a werkzeug FileStorage's .stream)
+            dest_path: Where the file must be visible
+
+        Returns:
+            dict: digest, size and whether the bytes were already stored
+        """
+        digest, size, new = self._ingest(stream)
+        self._link(digest, size, dest_path)
+        if new:
+            self.stats['stored'] += 1
+        else:
+            self.stats['deduplicated'] += 1
+            self.stats['bytes_saved'] += size
+        return {'digest': digest, 'size': size, 'deduplicated': not new}
+
+    def save_upload(self, file, dest_path: str) -> Dict:
+        """FileStorage.save() replacement that deduplicates; plain save when the store is disabled"""
+        if not self.enabled:
+            file.save(dest_path)
+            return {'digest': None, 'size': os.path.getsize(dest_path), 'deduplicated': False}
+        return self.save(file.stream, dest_path)
+
+    def link_file(self, src_path: str, dest_path: str) -> Dict:
+        """
+        Make an existing file also appear at dest_path (shutil.copy2 replacement)
+
+        A file that is already a linked blob is not read again.
+        """
+        if not self.enabled:
+            shutil.copy2(src_path, dest_path)
+            return {'digest': None, 'size': os.path.getsize(dest_path), 'deduplicated': False}
+
+        digest = self.known_digest(src_path)
+        if digest:
+            size = os.path.getsize(src_path)
+            self._link(digest, size, dest_path)
+            self.stats['deduplicated'] += 1
+            self.stats['bytes_saved'] += size
+            return {'digest': digest, 'size': size, 'deduplicated': True}
+
+        with open(src_path, 'rb') as f:
+            return self.save(f, dest_path)
+
+    def move_file(self, src_path: str, dest_path: str, digest: str = None) -> Dict:
+        """
+        Move a finished file (e.g. an assembled chunked upload) to dest_path
+
+        The file becomes the blob by rename - it is never copied - and src_path
+        is gone afterwards.
+
+        Args:
+            src_path: File to adopt; must be on the same volume as the store
+            dest_path: Where the file must be visible
+            digest: sha256 of the file if the caller already computed it
+        """
+        if not self.enabled:
+            os.replace(src_path, dest_path)
+            return {'digest': digest, 'size': os.path.getsize(dest_path), 'deduplicated': False}
+
+        self._connection()
+        size = os.path.getsize(src_path)
+        if digest is None:
+            sha = hashlib.sha256()
+            with open(src_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    sha.update(chunk)
+            digest = sha.hexdigest()
+
+        blob = self.blob_path(digest)
+        new = not os.path.exists(blob)
+        if new:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            os.replace(src_path, blob)
+        else:
+            os.utime(blob)
+            os.remove(src_path)
+        self._link(digest, size, dest_path)
+        if new:
+            self.stats['stored'] += 1
+        else:
+            self.stats['deduplicated'] += 1
+            self.stats['bytes_saved'] += size
+        return {'digest': digest, 'size': size, 'deduplicated': not new}
+
+    def known_digest(self, path: str, stat: os.stat_result = None) -> Optional[str]:
+        """sha256 of a file from the index, if path is still a link to that blob"""
+        if not self.enabled:
+            return None
+        try:
+            row = self._connection().execute('SELECT digest, size FROM blob_paths WHERE path = ?',
+                                             (os.path.abspath(path),)).fetchone()
+            if row is None:
+                return None
+            stat = stat or os.stat(path)
+            blob_stat = os.stat(self.blob_path(row[0]))
+        except (OSError, sqlite3.Error):
+            return None
+        # Replaced or rewritten since it was linked - the digest no longer describes it
+        if (blob_stat.st_ino, blob_stat.st_dev, row[1]) != (stat.st_ino, stat.st_dev, stat.st_size):
+            return None
+        return row[0]
+
+    def collect_garbage(self, dry_run: bool = False, grace: int = None) -> Dict:
+        """
+        Remove blobs no path links to any more, and index rows for vanished paths
+
+        Args:
+            dry_run: Only count what would be removed
+            grace: Skip blobs modified within this many seconds (a save may be about to link them)
+
+        Returns:
+            dict: blobs scanned, removed and bytes freed; index rows pruned
+        """
+        grace = config.BLOB_GC_GRACE if grace is None else grace
+        report = {'blobs': 0, 'removed': 0, 'bytes': 0, 'index_rows_pruned': 0}
+        if not self.enabled or not os.path.isdir(os.path.join(self.root, 'sha256')):
+            return report
+
+        now = time.time()
+        for directory, _, files in os.walk(os.path.join(self.root, 'sha256')):
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                report['blobs'] += 1
+                if stat.st_nlink > 1 or now - stat.st_mtime < grace:
+                    continue
+                report['removed'] += 1
+                report['bytes'] += stat.st_size
+                if not dry_run:
+                    os.remove(path)
+
+        conn = self._connection()
+        stale = [path for (path,) in conn.execute('SELECT path FROM blob_paths') if not os.path.exists(path)]
+        report['index_rows_pruned'] = len(stale)
+        if not dry_run:
+            conn.executemany('DELETE FROM blob_paths WHERE path = ?', [(path,) for path in stale])
+            self.stats['gc_removed'] += report['removed']
+            self.stats['gc_bytes'] += report['bytes']
+        return report
+
+    def get_stats(self) -> Dict:
+        """Dedup counters for this worker"""
+        return {**self.stats, 'enabled': self.enabled}
+
+# Global blob store instance
+blob_store = BlobStore()
@@ -0,0 +1,216 @@
+"""
+Bounded in-memory caches for AIezzy's per-process state.
+BoundedCache is a dict-compatible LRU with entry and byte limits, optional
+TTL (counted from the last write, or from the last read with sliding=True) and hit-rate metrics, used in place of the module-level dicts in
+web_app.py. Entries may carry a version (e.g. a file's mtime/size) so a copy
+written by another gunicorn worker is detected and reloaded instead of served stale.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Optional
+from config import get_config
+
+config = get_config()
+
+_MISSING = object()
+
+def estimate_size(value: Any) -> int:
+    """Approximate memory cost of a cached value in bytes"""
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return sys.getsizeof(value)
+
+def file_version(path: str) -> Optional[tuple]:
+    """(mtime_ns, size) of a file, None if missing - changes whenever any worker rewrites it"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+class BoundedCache(MutableMapping):
+    """Thread-safe LRU cache with entry/byte limits and optional TTL"""
+
+    # Every cache created, by name, for get_all_stats()
+    registry: Dict[str, 'BoundedCache'] = {}
+
+    def __init__(self, name: str, max_entries: int = None, max_bytes: int = None,
+                 ttl: Optional[int] = None, sizeof: Callable[[Any], int] = estimate_size,
+                 sliding: bool = False):
+        self.name = name
+        self.max_entries = max_entries or config.MEMORY_CACHE_MAX_ENTRIES
+        self.max_bytes = max_bytes or config.MEMORY_CACHE_MAX_BYTES
+        self.ttl = ttl
+        self.sizeof = sizeof
+        # Every hit pushes the expiry out again, so only idle entries expire
+        self.sliding = sliding
+
+        # key -> [value, size, expires_at, version, ttl]
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+        BoundedCache.registry[name] = self
+
+    def _drop(self, key) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry[1]
+
+    def _live_entry(self, key, now: float):
+        """Entry for key, removing it if expired"""
+        entry = self._entries.get(key)
+        if entry is not None and entry[2] is not None and entry[2] <= now:
+            self._drop(key)
+            self.stats['expirations'] += 1
+            return None
+        return entry
+
+    def get(self, key, default=None, version=_MISSING):
+        """
+        Cached value for key
+
+        Args:
+            key: Cache key
+            default: Returned on miss
+            version: If given, only an entry stored with this same version is a hit
+        """
+        with self._lock:
+            entry = self._live_entry(key, time.time())
+            if entry is not None and version is not _MISSING and entry[3] != version:
+                # Changed underneath us (another worker rewrote the file)
+                self._drop(key)
+                self.stats['invalidations'] += 1
+                entry = None
+            if entry is None:
+                self.stats['misses'] += 1
+                return default
+            if self.sliding and entry[4]:
+                entry[2] = time.time() + entry[4]
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[0]
+
+    def set(self, key, value, version=None, ttl: Optional[int] = None, size: int = None) -> None:
+        """Store a value, evicting least recently used entries to stay within limits"""
+        size = size if size is not None else self.sizeof(value)
+        ttl = ttl if ttl is not None else self.ttl
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if size > self.max_bytes:
+                # Larger than the whole budget - don't evict everything else for it
+                return
+            self._entries[key] = [value, size, time.time() + ttl if ttl else None, version, ttl]
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.stats['evictions'] += 1
+
+    def get_or_load(self, key, loader: Callable[[], Any], version=None):
+        """
+        Cached value, or loader() stored under version on a miss
+
+        None results are not cached.
+        """
+        value = self.get(key, _MISSING, version=version)
+        if value is not _MISSING:
+            return value
+        value = loader()
+        if value is not None:
+            self.set(key, value, version=version)
+        return value
+
+    def invalidate(self, key) -> bool:
+        """Drop an entry because its source changed; True if it was cached"""
+        with self._lock:
+            if key not in self._entries:
+                return False
+            self._drop(key)
+            self.stats['invalidations'] += 1
+            return True
+
+    def invalidate_where(self, predicate: Callable[[Any, Any], bool]) -> int:
+        """Drop every entry for which predicate(key, value) is true; returns how many"""
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if predicate(key, entry[0])]
+            for key in keys:
+                self._drop(key)
+            self.stats['invalidations'] += len(keys)
+            return len(keys)
+
+    def resize(self, key) -> None:
+        """Re-measure an entry after its value was mutated in place"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._bytes -= entry[1]
+                entry[1] = self.sizeof(entry[0])
+                self._bytes += entry[1]
+
+    # MutableMapping interface - lets the cache stand in for a plain dict
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __delitem__(self, key):
+        with self._lock:
+            self._drop(key)
+
+    def pop(self, key, default=_MISSING):
+        """Remove and return a live entry's value in one step (default if absent or expired)"""
+        with self._lock:
+            entry = self._live_entry(key, time.time())
+            if entry is None:
+                if default is _MISSING:
+                    raise KeyError(key)
+                return default
+            self._drop(key)
+            return entry[0]
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._live_entry(key, time.time()) is not None
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._entries.keys()))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> Dict:
+        """Hit rate, evictions and current size"""
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'hit_rate': round(self.stats['hits'] / lookups, 3) if lookups else None,
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes
+        }
+
+def get_all_stats() -> Dict:
+    """Stats for every BoundedCache in this process"""
+    return {name: cache.get_stats() for name, cache in BoundedCache.registry.items()}
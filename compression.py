@@ -0,0 +1,147 @@
+"""
+HTTP compression for AIezzy.
+Accept-Encoding negotiation, gzip/brotli encoders and an after_request hook
+that compresses text responses (buffered or streamed). Brotli is optional -
+without the `brotli` package only gzip is offered.
+"""
+
+import gzip
+import zlib
+from typing import Iterable, List, Optional
+from flask import request
+from config import get_config
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+config = get_config()
+
+# Preference order when the client accepts several encodings equally
+PREFERRED_ENCODINGS = ['br', 'gzip']
+
+def available_encodings() -> List[str]:
+    """Encodings this process can produce"""
+    return [e for e in PREFERRED_ENCODINGS if e != 'br' or brotli is not None]
+
+def negotiate(accept_encoding: str, available: Iterable[str] = None) -> Optional[str]:
+    """
+    Pick the best content encoding for a request
+
+    Args:
+        accept_encoding: Raw Accept-Encoding header
+        available: Encodings on offer (defaults to available_encodings())
+
+    Returns:
+        str: 'br' or 'gzip', or None for identity
+    """
+    available = list(available) if available is not None else available_encodings()
+    if not accept_encoding or not available:
+        return None
+
+    accepted = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in available:
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def compress(data: bytes, encoding: str, best: bool = False) -> bytes:
+    """
+    Encode bytes with gzip or brotli
+
+    Args:
+        data: Uncompressed body
+        encoding: 'gzip' or 'br'
+        best: Maximum compression (for bodies compressed once and cached)
+    """
+    if encoding == 'gzip':
+        # mtime=0 keeps output byte-identical across runs
+        return gzip.compress(data, compresslevel=9 if best else 6, mtime=0)
+    if encoding == 'br':
+        if brotli is None:
+            raise ValueError("brotli package not installed. Run: pip install brotli")
+        return brotli.compress(data, quality=11 if best else 5)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+# Mimetypes worth compressing - media formats are already compressed
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/plain', 'text/css', 'text/csv', 'text/xml', 'text/markdown',
+    'application/json', 'application/javascript', 'application/xml', 'image/svg+xml'
+}
+
+def _streaming_encoder(chunks: Iterable[bytes], encoding: str):
+    """Compress a streamed body chunk by chunk"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=5)
+        for chunk in chunks:
+            data = compressor.process(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+def compress_response(response, accept_encoding: str, min_size: int):
+    """
+    Compress a Flask response in place if it is text and large enough
+
+    Buffered bodies smaller than min_size are left alone; streamed bodies are
+    always compressed chunk by chunk (their size isn't known up front).
+    """
+    if (response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    encoding = negotiate(accept_encoding)
+    response.vary.add('Accept-Encoding')
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _streaming_encoder(response.iter_encoded(), encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < min_size:
+            return response
+        compressed = compress(body, encoding)
+        if len(compressed) >= len(body):
+            return response
+        response.set_data(compressed)
+
+    response.headers['Content-Encoding'] = encoding
+
+    # A compressed body is a different representation - keep its ETag distinct
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
+
+def init_compression(flask_app) -> None:
+    """Register response compression for JSON/HTML/text responses"""
+    if not config.COMPRESSION_ENABLED:
+        return
+
+    @flask_app.after_request
+    def compress_text_response(response):
+        return compress_response(response, request.headers.get('Accept-Encoding', ''), config.COMPRESSION_MIN_SIZE)
@@ -31,6 +31,15 @@ class Config:
         DB_TYPE = 'sqlite'
 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # SQLite tuning applied to every pooled connection (ignored on PostgreSQL)
+    USER_DB_BUSY_TIMEOUT = float(os.environ.get('USER_DB_BUSY_TIMEOUT', '5'))  # Seconds to wait on a locked database
+    USER_DB_CACHE_KB = int(os.environ.get('USER_DB_CACHE_KB', '8192'))  # Page cache per connection
+    USER_DB_SYNCHRONOUS = os.environ.get('USER_DB_SYNCHRONOUS', 'NORMAL')  # NORMAL is safe in WAL mode
+
+    # Per-process cache of validated session tokens (logout/deactivation reach other workers within the TTL)
+    SESSION_CACHE_TTL = int(os.environ.get('SESSION_CACHE_TTL', '60'))  # Seconds
+    SESSION_CACHE_MAX_ENTRIES = int(os.environ.get('SESSION_CACHE_MAX_ENTRIES', '10000'))
     SQLALCHEMY_ENGINE_OPTIONS = {
         'pool_size': 10,
         'pool_recycle': 3600,
@@ -67,10 +76,103 @@ class Config:
     QUOTA_PRO_VIDEOS = int(os.environ.get('QUOTA_PRO_VIDEOS', '50'))
     QUOTA_PRO_MESSAGES = int(os.environ.get('QUOTA_PRO_MESSAGES', '1000'))
 
-    # Rate limiting
-    RATE_LIMIT_ENABLED = True
-    RATE_LIMIT_PER_MINUTE = 20
-    RATE_LIMIT_PER_HOUR = 200
+    # Per-user quota state (tier + today's counters) cached in each worker
+    QUOTA_CACHE_TTL = int(os.environ.get('QUOTA_CACHE_TTL', '30'))  # Seconds; bounds staleness from other workers
+    QUOTA_CACHE_MAX_ENTRIES = int(os.environ.get('QUOTA_CACHE_MAX_ENTRIES', '10000'))
+
+    # Rate limiting (sliding window, per user - or per IP for guests and auth endpoints)
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_LIMIT_PER_MINUTE = int(os.environ.get('RATE_LIMIT_PER_MINUTE', '20'))  # Chat requests
+    RATE_LIMIT_PER_HOUR = int(os.environ.get('RATE_LIMIT_PER_HOUR', '200'))  # Chat requests
+    RATE_LIMIT_UPLOAD_PER_MINUTE = int(os.environ.get('RATE_LIMIT_UPLOAD_PER_MINUTE', '30'))
+    RATE_LIMIT_AUTH_PER_MINUTE = int(os.environ.get('RATE_LIMIT_AUTH_PER_MINUTE', '10'))  # Login/register/password attempts per IP
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'sqlite')  # memory (per worker), sqlite (all workers on the host), redis
+    RATE_LIMIT_REDIS_URL = os.environ.get('RATE_LIMIT_REDIS_URL', 'redis://localhost:6379/0')  # fake:// for the in-process fake
+    TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', '1'))  # Proxies in front of the app that append to X-Forwarded-For (Railway: 1)
+
+    # Usage Logging (write-behind)
+    USAGE_BUFFER_ENABLED = os.environ.get('USAGE_BUFFER_ENABLED', 'true').lower() == 'true'
+    USAGE_FLUSH_INTERVAL = float(os.environ.get('USAGE_FLUSH_INTERVAL', '5'))  # Seconds between batched writes
+    USAGE_FLUSH_MAX_EVENTS = int(os.environ.get('USAGE_FLUSH_MAX_EVENTS', '200'))  # Flush early once this many are waiting
+    USAGE_LOG_FSYNC = os.environ.get('USAGE_LOG_FSYNC', 'false').lower() == 'true'  # fsync each event (survives power loss, not just crashes)
+    USAGE_FLUSH_MAX_ATTEMPTS = int(os.environ.get('USAGE_FLUSH_MAX_ATTEMPTS', '5'))  # Rejections before an event goes to the dead-letter file
+
+    # Web search result cache
+    SEARCH_CACHE_ENABLED = os.environ.get('SEARCH_CACHE_ENABLED', 'true').lower() == 'true'
+    SEARCH_CACHE_TTL = int(os.environ.get('SEARCH_CACHE_TTL', '3600'))  # 1 hour
+    SEARCH_CACHE_VOLATILE_TTL = int(os.environ.get('SEARCH_CACHE_VOLATILE_TTL', '600'))  # 10 minutes for news-like queries
+    SEARCH_CACHE_MAX_ENTRIES = int(os.environ.get('SEARCH_CACHE_MAX_ENTRIES', '500'))
+    SEARCH_CACHE_SIMILARITY_THRESHOLD = float(os.environ.get('SEARCH_CACHE_SIMILARITY_THRESHOLD', '0.85'))  # 1.0 disables near-duplicate matching
+
+    # Image/video generation dedup (same user + prompt + params reuses the asset)
+    GENERATION_DEDUP_ENABLED = os.environ.get('GENERATION_DEDUP_ENABLED', 'true').lower() == 'true'
+    GENERATION_DEDUP_WINDOW = int(os.environ.get('GENERATION_DEDUP_WINDOW', '900'))  # 15 minutes
+    GENERATION_DEDUP_MAX_ENTRIES = int(os.environ.get('GENERATION_DEDUP_MAX_ENTRIES', '1000'))
+    GENERATION_DEDUP_WAIT_TIMEOUT = int(os.environ.get('GENERATION_DEDUP_WAIT_TIMEOUT', '600'))  # Max wait on an in-flight duplicate
+
+    # Coordinator context budget (estimated tokens, ~4 chars each)
+    HISTORY_TOKEN_BUDGET = int(os.environ.get('HISTORY_TOKEN_BUDGET', '4000'))
+    HISTORY_RECENT_MESSAGE_TOKENS = int(os.environ.get('HISTORY_RECENT_MESSAGE_TOKENS', '1500'))  # Last 2 messages
+    HISTORY_OLD_MESSAGE_TOKENS = int(os.environ.get('HISTORY_OLD_MESSAGE_TOKENS', '300'))  # Older messages get compacted to this
+    HISTORY_BANNER_MAX_FILES = int(os.environ.get('HISTORY_BANNER_MAX_FILES', '10'))  # Files listed in the upload banner
+
+    # Delta conversation saves (append log folded into the JSON snapshot every N deltas)
+    CONVERSATION_LOG_MAX_ENTRIES = int(os.environ.get('CONVERSATION_LOG_MAX_ENTRIES', '50'))
+
+    # Bounded per-process caches (thread contexts, shares, conversation bodies)
+    MEMORY_CACHE_MAX_ENTRIES = int(os.environ.get('MEMORY_CACHE_MAX_ENTRIES', '2000'))  # Per cache
+    MEMORY_CACHE_MAX_BYTES = int(os.environ.get('MEMORY_CACHE_MAX_BYTES', str(8 * 1024 * 1024)))  # Per cache, estimated
+    CONVERSATION_CACHE_MAX_BYTES = int(os.environ.get('CONVERSATION_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+    THREAD_CONTEXT_TTL = int(os.environ.get('THREAD_CONTEXT_TTL', '86400'))  # Idle threads' file context is dropped after a day
+
+    # Prerendered SEO landing pages (rendered once, served with gzip/brotli + ETag)
+    LANDING_PAGE_CACHE_ENABLED = os.environ.get('LANDING_PAGE_CACHE_ENABLED', 'true').lower() == 'true'
+    LANDING_PAGE_MAX_AGE = int(os.environ.get('LANDING_PAGE_MAX_AGE', '3600'))  # Revalidation is a cheap 304
+
+    # Response compression for JSON/HTML/text (media is never recompressed)
+    COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))  # Bytes; smaller bodies aren't worth it
+
+    # Media routes (/assets, /videos, /uploads, /documents, permanent links)
+    MEDIA_OFFLOAD = os.environ.get('MEDIA_OFFLOAD', '')  # '', 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache)
+    MEDIA_ACCEL_PREFIX = os.environ.get('MEDIA_ACCEL_PREFIX', '/_protected')  # nginx internal location aliased to DATA_DIR
+    MEDIA_IMMUTABLE_MAX_AGE = int(os.environ.get('MEDIA_IMMUTABLE_MAX_AGE', '31536000'))  # 1 year - names are never reused
+    MEDIA_MUTABLE_MAX_AGE = int(os.environ.get('MEDIA_MUTABLE_MAX_AGE', '3600'))  # Converted documents, revalidated by ETag
+
+    # Retention of uploaded/generated files (free-tier days; other tiers scale by their multiplier)
+    RETENTION_ENABLED = os.environ.get('RETENTION_ENABLED', 'true').lower() == 'true'
+    RETENTION_SWEEP_INTERVAL = int(os.environ.get('RETENTION_SWEEP_INTERVAL', '3600'))  # Seconds between sweeps (one worker sweeps)
+    RETENTION_BATCH_SIZE = int(os.environ.get('RETENTION_BATCH_SIZE', '200'))  # Files/rows deleted per batch
+    RETENTION_BATCH_PAUSE = float(os.environ.get('RETENTION_BATCH_PAUSE', '0.1'))  # Seconds between batches
+    RETENTION_UPLOADS_DAYS = float(os.environ.get('RETENTION_UPLOADS_DAYS', '7'))
+    RETENTION_ASSETS_DAYS = float(os.environ.get('RETENTION_ASSETS_DAYS', '30'))  # Generated images
+    RETENTION_VIDEOS_DAYS = float(os.environ.get('RETENTION_VIDEOS_DAYS', '30'))
+    RETENTION_DOCUMENTS_DAYS = float(os.environ.get('RETENTION_DOCUMENTS_DAYS', '7'))  # Converted documents
+    RETENTION_INTERMEDIATE_DAYS = float(os.environ.get('RETENTION_INTERMEDIATE_DAYS', '1'))  # PDF page images, split parts
+    RETENTION_GUEST_MULTIPLIER = float(os.environ.get('RETENTION_GUEST_MULTIPLIER', '0.5'))
+    RETENTION_PRO_MULTIPLIER = float(os.environ.get('RETENTION_PRO_MULTIPLIER', '4'))
+    RETENTION_ENTERPRISE_MULTIPLIER = float(os.environ.get('RETENTION_ENTERPRISE_MULTIPLIER', '12'))
+
+    # Content-addressed blob store (identical uploads stored once, hardlinked into place)
+    BLOB_STORE_ENABLED = os.environ.get('BLOB_STORE_ENABLED', 'true').lower() == 'true'
+    BLOB_GC_GRACE = int(os.environ.get('BLOB_GC_GRACE', '3600'))  # Seconds an unlinked blob is kept before collection
+
+    # Resumable chunked uploads (/api/uploads) - bodies are streamed to disk, not limited by MAX_CONTENT_LENGTH
+    CHUNKED_UPLOAD_MAX_SIZE = int(os.environ.get('CHUNKED_UPLOAD_MAX_SIZE', str(2 * 1024 * 1024 * 1024)))  # 2GB per file
+    CHUNKED_UPLOAD_CHUNK_SIZE = int(os.environ.get('CHUNKED_UPLOAD_CHUNK_SIZE', str(8 * 1024 * 1024)))  # Suggested to clients
+    CHUNKED_UPLOAD_CHUNK_MAX_SIZE = int(os.environ.get('CHUNKED_UPLOAD_CHUNK_MAX_SIZE', str(32 * 1024 * 1024)))  # Keep below MAX_CONTENT_LENGTH
+    CHUNKED_UPLOAD_SESSION_TTL = int(os.environ.get('CHUNKED_UPLOAD_SESSION_TTL', '86400'))  # Seconds an idle session is kept
+    CHUNKED_UPLOAD_MAX_OPEN_SESSIONS = int(os.environ.get('CHUNKED_UPLOAD_MAX_OPEN_SESSIONS', '5'))  # Unfinished sessions per user/guest IP
+    CHUNKED_UPLOAD_MAX_RESERVED_BYTES = int(os.environ.get('CHUNKED_UPLOAD_MAX_RESERVED_BYTES', str(4 * 1024 * 1024 * 1024)))  # Declared size of those sessions, combined
+
+    # Generated video downloads (streamed to a .part file, resumed with Range requests)
+    VIDEO_DOWNLOAD_CONNECT_TIMEOUT = int(os.environ.get('VIDEO_DOWNLOAD_CONNECT_TIMEOUT', '10'))
+    VIDEO_DOWNLOAD_READ_TIMEOUT = int(os.environ.get('VIDEO_DOWNLOAD_READ_TIMEOUT', '60'))  # Max silence between chunks
+    VIDEO_DOWNLOAD_MAX_RETRIES = int(os.environ.get('VIDEO_DOWNLOAD_MAX_RETRIES', '3'))
+    VIDEO_DOWNLOAD_MAX_MB = int(os.environ.get('VIDEO_DOWNLOAD_MAX_MB', '500'))
+
+    # Import heavy tool modules (PDF/Office/QR libraries) at startup instead of on first use
+    TOOL_IMPORTS_EAGER = os.environ.get('TOOL_IMPORTS_EAGER', 'false').lower() == 'true'
 
     # File storage paths
     if os.environ.get('RAILWAY_ENVIRONMENT'):
@@ -85,6 +187,23 @@ class Config:
     VIDEOS_DIR = f'{DATA_DIR}/videos'
     DOCUMENTS_DIR = f'{DATA_DIR}/documents'
     CONVERSATIONS_DIR = f'{DATA_DIR}/conversations'
+    CONVERSATION_INDEX_DB = f'{DATA_DIR}/conversation_index.db'  # Metadata index for the conversation sidebar
+    RATE_LIMIT_DB = f'{DATA_DIR}/rate_limits.db'  # Counters shared by all workers (sqlite rate-limit backend)
+    USAGE_LOG_DIR = f'{DATA_DIR}/usage_log'  # Per-worker append logs of usage not yet flushed
+    RETENTION_LOCK_FILE = f'{DATA_DIR}/retention.lock'  # Held by the sweeping worker; mtime = last sweep
+    RETENTION_REPORT_FILE = f'{DATA_DIR}/retention_report.json'  # Last sweep's report
+    RETENTION_OWNERS_DB = f'{DATA_DIR}/retention_owners.db'  # Owner tier of generated files that have no UploadedFile row
+    BLOB_DIR = f'{DATA_DIR}/blobs'  # sha256-sharded blobs; must be on the same volume as the media directories
+    BLOB_INDEX_DB = f'{DATA_DIR}/blob_index.db'  # Linked path -> digest
+    UPLOAD_SESSIONS_DIR = f'{DATA_DIR}/upload_sessions'  # Chunked uploads in progress; same volume as uploads/
+    LEGACY_USER_DB = f'{DATA_DIR}/aiezzy_users.db'  # Pre-SQLAlchemy sqlite3 user database; migrate_database.py moves its users
+
+    # Background video jobs (FAL queue API)
+    FAL_QUEUE_URL = os.environ.get('FAL_QUEUE_URL', 'https://queue.fal.run')  # Point at fake_fal_server.py for local testing
+    FAL_WEBHOOK_SECRET = os.environ.get('FAL_WEBHOOK_SECRET')  # If set, FAL calls /api/fal-webhook; polling still runs as a fallback
+    VIDEO_JOB_POLL_INTERVAL = int(os.environ.get('VIDEO_JOB_POLL_INTERVAL', '5'))
+    VIDEO_JOB_TIMEOUT = int(os.environ.get('VIDEO_JOB_TIMEOUT', '1800'))  # 30 minutes
+    VIDEO_JOBS_DB = f'{DATA_DIR}/video_jobs.db'  # Job state shared by all workers
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -0,0 +1,164 @@
+"""
+Conversation export for AIezzy.
+One renderer turns a conversation into JSON, Markdown or HTML for both the
+single-conversation download and the bulk ZIP. The ZIP is produced as a
+stream: conversations are loaded and rendered one at a time and compressed
+bytes are yielded as soon as they are written, so memory stays flat no matter
+how many conversations a user has.
+"""
+
+import json
+import re
+import time
+import zipfile
+from typing import Dict, Iterable, Iterator, Tuple
+
+# format -> (file extension, mimetype)
+EXPORT_FORMATS = {
+    'json': ('json', 'application/json'),
+    'markdown': ('md', 'text/markdown'),
+    'html': ('html', 'text/html')
+}
+
+# Rendered entries are fed to the compressor in slices of this size
+ZIP_WRITE_CHUNK = 64 * 1024
+
+def render_markdown(conversation: Dict) -> str:
+    """Conversation as Markdown, with message HTML reduced to text and image links"""
+    parts = [f"# {conversation.get('title', 'Conversation')}\n\n",
+             f"*Exported on {time.strftime('%B %d, %Y at %I:%M %p')}*\n\n",
+             "---\n\n"]
+
+    for message in conversation.get('messages', []):
+        if message.get('isUser'):
+            parts.append(f"**You:** {message.get('content', '')}\n\n")
+        else:
+            content = message.get('content', '')
+            # Convert HTML images to markdown
+            content = re.sub(r'<img[^>]+src="([^"]+)"[^>]*>', r'![Image](\1)', content)
+            # Remove other HTML tags
+            content = re.sub(r'<[^>]+>', '', content)
+            parts.append(f"**AIezzy:** {content}\n\n")
+    return ''.join(parts)
+
+def render_html(conversation: Dict) -> str:
+    """Conversation as a standalone HTML page"""
+    parts = [f"""
+<!DOCTYPE html>
+<html>
+<head>
+    <title>{conversation.get('title', 'Conversation')}</title>
+    <style>
+        body {{ font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif; max-width: 800px; margin: 0 auto; padding: 20px; }}
+        .message {{ margin: 20px 0; padding: 15px; border-radius: 8px; }}
+        .user {{ background: #f0f9ff; border-left: 4px solid #0ea5e9; }}
+        .assistant {{ background: #f9fafb; border-left: 4px solid #6b7280; }}
+        .timestamp {{ color: #6b7280; font-size: 12px; margin-top: 5px; }}
+        img {{ max-width: 100%; height: auto; border-radius: 4px; }}
+    </style>
+</head>
+<body>
+    <h1>{conversation.get('title', 'Conversation')}</h1>
+    <p><em>Exported on {time.strftime('%B %d, %Y at %I:%M %p')}</em></p>
+    <hr>
+"""]
+
+    for message in conversation.get('messages', []):
+        css_class = 'user' if message.get('isUser') else 'assistant'
+        sender = 'You' if message.get('isUser') else 'AIezzy'
+        timestamp = f'<div class="timestamp">{message.get("timestamp", "")}</div>' if message.get('timestamp') else ''
+        parts.append(f"""
+    <div class="message {css_class}">
+        <strong>{sender}:</strong>
+        <div>{message.get('content', '')}</div>
+        {timestamp}
+    </div>
+""")
+
+    parts.append("""
+</body>
+</html>
+""")
+    return ''.join(parts)
+
+def render_conversation(conversation: Dict, export_format: str) -> str:
+    """
+    Render a conversation for download
+
+    Args:
+        conversation: Full conversation (messages included)
+        export_format: 'json', 'markdown' or 'html'
+
+    Raises:
+        ValueError: Unknown format
+    """
+    if export_format == 'json':
+        return json.dumps(conversation, indent=2, ensure_ascii=False)
+    if export_format == 'markdown':
+        return render_markdown(conversation)
+    if export_format == 'html':
+        return render_html(conversation)
+    raise ValueError('Invalid format. Use json, markdown, or html')
+
+def export_filename(conversation: Dict, conversation_id: str, export_format: str) -> str:
+    """Name of a conversation's entry in the bulk ZIP"""
+    extension = EXPORT_FORMATS[export_format][0]
+    if export_format == 'json':
+        return f"{conversation_id}.{extension}"
+    title = re.sub(r'[\\/:*?"<>|]', '_', conversation.get('title', 'Conversation'))
+    return f"{title}_{conversation_id}.{extension}"
+
+class _ZipStream:
+    """Write-only file object that hands written bytes back to the generator"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def stream_zip(conversations: Iterable[Tuple[str, Dict]], export_format: str) -> Iterator[bytes]:
+    """
+    Yield a ZIP archive of rendered conversations piece by piece
+
+    Args:
+        conversations: (conversation_id, conversation) pairs, loaded lazily
+        export_format: 'json', 'markdown' or 'html'
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError('Invalid format. Use json, markdown, or html')
+
+    stream = _ZipStream()
+    # Unseekable output - zipfile writes sizes in data descriptors after each entry
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for conversation_id, conversation in conversations:
+            try:
+                body = render_conversation(conversation, export_format).encode('utf-8')
+            except Exception as e:
+                print(f"EXPORT: Skipping conversation {conversation_id}: {e}")
+                continue
+
+            info = zipfile.ZipInfo(export_filename(conversation, conversation_id, export_format),
+                                   date_time=time.localtime(time.time())[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with archive.open(info, 'w') as entry:
+                for offset in range(0, len(body), ZIP_WRITE_CHUNK):
+                    entry.write(body[offset:offset + ZIP_WRITE_CHUNK])
+                    data = stream.drain()
+                    if data:
+                        yield data
+            data = stream.drain()
+            if data:
+                yield data
+
+    # Central directory
+    yield stream.drain()
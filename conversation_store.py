@@ -0,0 +1,836 @@
+"""
+Conversation storage for AIezzy.
+Each conversation is a JSON snapshot CONVERSATIONS_DIR/<user_id>/<id>.json plus
+an append-only <id>.log of deltas (new or changed messages) written since the
+snapshot. Every save bumps a version; delta saves name the version they were
+based on and are rejected if another save got there first. The log is folded
+back into the snapshot every CONVERSATION_LOG_MAX_ENTRIES deltas.
+
+A SQLite index holds the metadata the sidebar needs (title, last update,
+message count, size, version) so listing is a keyset-paginated index scan
+instead of reading every file. Bodies are only read when a conversation is
+opened, and kept in a bounded cache keyed by file version so a save from
+another worker is never served stale.
+
+Titles and message text are also kept in an FTS5 table (one row per message)
+that is updated with each save, for ranked full-text search with snippets.
+"""
+
+import base64
+import hashlib
+import html
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+from bounded_cache import BoundedCache, file_version
+from config import get_config
+
+try:
+    import fcntl
+except ImportError:  # Windows - only threads within this process are serialized
+    fcntl = None
+
+config = get_config()
+
+# Fields a delta may not overwrite - they are maintained by the server
+SERVER_FIELDS = {'version', 'saved_at', 'user_id', 'server_saved'}
+
+# Conversations read per transaction when building a user's search index
+SEARCH_BACKFILL_BATCH = 50
+
+class ConversationConflict(Exception):
+    """A delta was based on an older version than the one stored"""
+
+    def __init__(self, current_version: int):
+        super().__init__(f"Conversation is at version {current_version}")
+        self.current_version = current_version
+
+def sort_timestamp(value) -> float:
+    """
+    Normalize a lastUpdated value to epoch seconds for ordering
+
+    The client sends ISO strings (new Date().toISOString()); older files only
+    have saved_at (epoch seconds) and some carry Date.now() milliseconds.
+    """
+    if isinstance(value, (int, float)):
+        return value / 1000 if value > 1e11 else float(value)
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            try:
+                return sort_timestamp(float(value))
+            except ValueError:
+                pass
+    return 0.0
+
+def encode_cursor(last_updated: float, conversation_id: str) -> str:
+    """Opaque keyset cursor for the row a page ended on"""
+    raw = json.dumps([last_updated, conversation_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_cursor(cursor: str) -> Optional[Tuple[float, str]]:
+    """Inverse of encode_cursor, None for a malformed cursor"""
+    try:
+        last_updated, conversation_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return float(last_updated), str(conversation_id)
+    except (ValueError, TypeError):
+        return None
+
+def owner_token(user_id: str) -> str:
+    """Single-token FTS key for a user - IDs like 'default_user' would tokenize into several words"""
+    return 'u' + hashlib.sha1(str(user_id).encode('utf-8')).hexdigest()[:16]
+
+def message_text(content) -> str:
+    """Searchable text of a message: HTML tags dropped, entities decoded, whitespace collapsed"""
+    if not isinstance(content, str):
+        return ''
+    text = re.sub(r'<(script|style)[^>]*>.*?</\1>', ' ', content, flags=re.S | re.I)
+    text = html.unescape(re.sub(r'<[^>]+>', ' ', text))
+    return ' '.join(text.split())
+
+def build_match_query(owner: str, query: str) -> Optional[str]:
+    """
+    FTS5 MATCH expression for free text typed by a user
+
+    Every word must appear (the last one as a prefix, for search-as-you-type),
+    in the title or message text of the given owner's rows. Words are quoted so
+    FTS syntax in the input is treated literally.
+    """
+    words = re.findall(r'\w+', query.lower())[:12]
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return f"owner:{owner} AND {{title content}}: ({' '.join(terms)})"
+
+def make_snippet(text: str, words: List[str], size: int = 16) -> str:
+    """
+    HTML-escaped excerpt of about size words around the first match, matches wrapped in <mark>
+
+    Args:
+        text: Indexed title or message text
+        words: Lowercased query words; the last one matches as a prefix
+    """
+    tokens = list(re.finditer(r'\w+', text))
+
+    def is_match(token) -> bool:
+        value = token.group().lower()
+        return value in words[:-1] or value.startswith(words[-1]) if words else False
+
+    first = next((n for n, token in enumerate(tokens) if is_match(token)), 0)
+    start = max(0, min(first - size // 4, len(tokens) - size))
+    window = tokens[start:start + size]
+    if not window:
+        return html.escape(text[:200])
+
+    parts = ['…' if start > 0 else '']
+    cursor = window[0].start()
+    for token in window:
+        parts.append(html.escape(text[cursor:token.start()]))
+        parts.append(f'<mark>{html.escape(token.group())}</mark>' if is_match(token) else html.escape(token.group()))
+        cursor = token.end()
+    if start + size < len(tokens):
+        parts.append('…')
+    return ''.join(parts)
+
+def apply_delta(conversation: Dict, delta: Dict) -> Dict:
+    """
+    Apply one logged delta to a conversation in place
+
+    'set' replaces top-level fields; each entry in 'arrays' keeps the first
+    `from` items of that list and appends `items` - so re-applying a delta is harmless.
+    """
+    for key, value in delta.get('set', {}).items():
+        conversation[key] = value
+    for name, (start, items) in delta.get('arrays', {}).items():
+        conversation[name] = (conversation.get(name) or [])[:start] + items
+    conversation['version'] = delta['version']
+    conversation['saved_at'] = delta['saved_at']
+    return conversation
+
+class ConversationStore:
+    """JSON conversation snapshots and delta logs with a SQLite metadata index"""
+
+    def __init__(self, conversations_dir: str = None, index_path: str = None, log_max_entries: int = None):
+        self.conversations_dir = conversations_dir or config.CONVERSATIONS_DIR
+        self.index_path = index_path or config.CONVERSATION_INDEX_DB
+        self.log_max_entries = log_max_entries or config.CONVERSATION_LOG_MAX_ENTRIES
+        self._lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self.bodies = BoundedCache('conversations', max_bytes=config.CONVERSATION_CACHE_MAX_BYTES)
+        self.search_enabled = True
+        self.stats = {'full_saves': 0, 'delta_saves': 0, 'conflicts': 0, 'compactions': 0, 'recoveries': 0,
+                      'full_bytes_written': 0, 'delta_bytes_written': 0}
+        os.makedirs(self.conversations_dir, exist_ok=True)
+        self.init_index()
+
+    def get_connection(self):
+        """Get index database connection"""
+        conn = sqlite3.connect(self.index_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def init_index(self):
+        """Initialize index tables"""
+        conn = self.get_connection()
+        try:
+            # WAL lets gunicorn workers read the index while another one writes
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS conversation_index (
+                    user_id TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    title TEXT,
+                    last_updated REAL NOT NULL,  -- epoch seconds, for ordering
+                    last_updated_raw TEXT,       -- JSON of the value the client sent
+                    message_count INTEGER DEFAULT 0,
+                    size INTEGER DEFAULT 0,      -- snapshot + log bytes
+                    saved_at REAL,
+                    server_saved BOOLEAN DEFAULT FALSE,
+                    version INTEGER DEFAULT 0,
+                    log_entries INTEGER DEFAULT 0,
+                    PRIMARY KEY (user_id, id)
+                )
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_conversation_recent
+                ON conversation_index (user_id, last_updated DESC, id DESC)
+            ''')
+
+            # Index files created before delta saves existed
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(conversation_index)')}
+            for column in ('version', 'log_entries'):
+                if column not in columns:
+                    conn.execute(f'ALTER TABLE conversation_index ADD COLUMN {column} INTEGER DEFAULT 0')
+
+            # Users whose pre-existing files have been scanned into the index
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS conversation_index_users (
+                    user_id TEXT PRIMARY KEY,
+                    indexed_at REAL NOT NULL
+                )
+            ''')
+
+            # Full-text search: row per message (position >= 0) plus one title row (position -1).
+            # conversation_fts_rows maps positions to FTS rowids so updates touch only changed rows.
+            try:
+                conn.execute('''
+                    CREATE VIRTUAL TABLE IF NOT EXISTS conversation_fts USING fts5(
+                        owner, conversation_id UNINDEXED, position UNINDEXED, title, content,
+                        tokenize = 'unicode61 remove_diacritics 2'
+                    )
+                ''')
+            except sqlite3.OperationalError as e:
+                self.search_enabled = False
+                print(f"CONVERSATIONS: SQLite FTS5 unavailable, conversation search disabled ({e})")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS conversation_fts_rows (
+                    user_id TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    fts_rowid INTEGER NOT NULL,
+                    PRIMARY KEY (user_id, id, position)
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS conversation_search_users (
+                    user_id TEXT PRIMARY KEY,
+                    indexed_at REAL NOT NULL
+                )
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _path(self, user_id: str, conversation_id: str) -> str:
+        # Keep IDs from escaping the user's directory
+        if os.path.basename(conversation_id) != conversation_id or conversation_id in ('', '.', '..'):
+            raise ValueError(f"Invalid conversation id: {conversation_id}")
+        return os.path.join(self.conversations_dir, str(user_id), f'{conversation_id}.json')
+
+    @staticmethod
+    def _log_path(path: str) -> str:
+        return path[:-5] + '.log'
+
+    @contextmanager
+    def _locked(self, path: str):
+        """Exclusive access to one conversation across threads and worker processes"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._write_lock:
+            with open(self._log_path(path), 'a+b') as log:
+                if fcntl is not None:
+                    fcntl.flock(log.fileno(), fcntl.LOCK_EX)
+                yield log
+
+    def _index_row(self, conn, user_id: str, conversation_id: str, conversation: Dict,
+                   size: int, log_entries: int = 0) -> None:
+        last_updated = conversation.get('lastUpdated', conversation.get('saved_at', 0))
+        conn.execute('''
+            INSERT OR REPLACE INTO conversation_index
+            (user_id, id, title, last_updated, last_updated_raw, message_count, size, saved_at,
+             server_saved, version, log_entries)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (str(user_id), conversation_id, conversation.get('title', 'Untitled Chat'),
+              sort_timestamp(last_updated) or sort_timestamp(conversation.get('saved_at', 0)),
+              json.dumps(last_updated), len(conversation.get('messages', [])), size,
+              conversation.get('saved_at'), bool(conversation.get('server_saved', False)),
+              conversation.get('version', 0), log_entries))
+
+    def _reindex(self, user_id: str, conversation_id: str, conversation: Dict, size: int) -> None:
+        conn = self.get_connection()
+        try:
+            self._index_row(conn, user_id, conversation_id, conversation, size)
+            self._search_replace(conn, user_id, conversation_id, conversation)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _search_delete(self, conn, user_id: str, conversation_id: str, from_position: int = None,
+                       position: int = None) -> None:
+        """Remove FTS rows of a conversation - all, one position, or from a position onwards"""
+        query = 'SELECT position, fts_rowid FROM conversation_fts_rows WHERE user_id = ? AND id = ?'
+        params = [str(user_id), conversation_id]
+        if position is not None:
+            query += ' AND position = ?'
+            params.append(position)
+        elif from_position is not None:
+            query += ' AND position >= ?'
+            params.append(from_position)
+        rows = conn.execute(query, params).fetchall()
+        if not rows:
+            return
+        if self.search_enabled:
+            conn.executemany('DELETE FROM conversation_fts WHERE rowid = ?', [(row['fts_rowid'],) for row in rows])
+        conn.executemany('DELETE FROM conversation_fts_rows WHERE user_id = ? AND id = ? AND position = ?',
+                         [(str(user_id), conversation_id, row['position']) for row in rows])
+
+    def _search_insert(self, conn, user_id: str, conversation_id: str, position: int,
+                       title: str = '', content: str = '') -> None:
+        if not self.search_enabled or not (title or content):
+            return
+        cursor = conn.execute('''
+            INSERT INTO conversation_fts (owner, conversation_id, position, title, content)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (owner_token(user_id), conversation_id, position, title, content))
+        conn.execute('INSERT OR REPLACE INTO conversation_fts_rows (user_id, id, position, fts_rowid) VALUES (?, ?, ?, ?)',
+                     (str(user_id), conversation_id, position, cursor.lastrowid))
+
+    def _search_replace(self, conn, user_id: str, conversation_id: str, conversation: Dict) -> None:
+        """(Re)index a whole conversation's title and messages"""
+        if not self.search_enabled:
+            return
+        self._search_delete(conn, user_id, conversation_id)
+        self._search_insert(conn, user_id, conversation_id, -1, title=conversation.get('title') or '')
+        for position, message in enumerate(conversation.get('messages') or []):
+            if isinstance(message, dict):
+                self._search_insert(conn, user_id, conversation_id, position,
+                                    content=message_text(message.get('content')))
+
+    def _search_apply_delta(self, conn, user_id: str, conversation_id: str,
+                            set_fields: Dict, array_changes: Dict) -> None:
+        """Update FTS rows for just the fields and messages a delta touched"""
+        if not self.search_enabled:
+            return
+        if 'title' in set_fields:
+            self._search_delete(conn, user_id, conversation_id, position=-1)
+            self._search_insert(conn, user_id, conversation_id, -1, title=set_fields['title'] or '')
+        if 'messages' in array_changes:
+            start, items = array_changes['messages']
+            self._search_delete(conn, user_id, conversation_id, from_position=start)
+            for offset, message in enumerate(items):
+                if isinstance(message, dict):
+                    self._search_insert(conn, user_id, conversation_id, start + offset,
+                                        content=message_text(message.get('content')))
+
+    def _row(self, user_id: str, conversation_id: str) -> Optional[sqlite3.Row]:
+        conn = self.get_connection()
+        try:
+            return conn.execute('SELECT * FROM conversation_index WHERE user_id = ? AND id = ?',
+                                (str(user_id), conversation_id)).fetchone()
+        finally:
+            conn.close()
+
+    def _write_snapshot(self, path: str, conversation: Dict) -> int:
+        """Atomically replace the snapshot file, returning its size"""
+        body = json.dumps(conversation, ensure_ascii=False).encode('utf-8')
+
+        # Write-then-rename so readers never see a half-written file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+        return len(body)
+
+    def _materialize(self, path: str) -> Dict:
+        """Snapshot with every newer logged delta applied"""
+        with open(path, 'r', encoding='utf-8') as f:
+            conversation = json.load(f)
+        try:
+            with open(self._log_path(path), 'rb') as f:
+                log = f.read()
+        except FileNotFoundError:
+            log = b''
+
+        for line in log.splitlines():
+            try:
+                delta = json.loads(line)
+            except ValueError:
+                # Torn final line from a crash mid-append - the client never got an ack for it
+                print(f"CONVERSATIONS: Skipping unreadable log entry in {path}")
+                continue
+            if delta.get('version', 0) > conversation.get('version', 0):
+                apply_delta(conversation, delta)
+        return conversation
+
+    def save(self, user_id: str, conversation_id: str, conversation_data: Dict) -> Dict:
+        """
+        Write a full conversation, replacing the snapshot and clearing its log
+
+        Args:
+            user_id: Owner
+            conversation_id: Client-generated conversation ID
+            conversation_data: Conversation as sent by the client
+
+        Returns:
+            dict: The stored conversation (with server-side metadata and new version)
+        """
+        self.ensure_indexed(user_id)
+        path = self._path(user_id, conversation_id)
+
+        with self._locked(path) as log:
+            row = self._row(user_id, conversation_id)
+            conversation = {
+                **conversation_data,
+                'saved_at': time.time(),
+                'user_id': user_id,
+                'server_saved': True,
+                'version': (row['version'] if row else 0) + 1
+            }
+            size = self._write_snapshot(path, conversation)
+            log.truncate(0)
+            self._reindex(user_id, conversation_id, conversation, size)
+
+        self.bodies.pop((str(user_id), conversation_id), None)
+        self.stats['full_saves'] += 1
+        self.stats['full_bytes_written'] += size
+        return conversation
+
+    def append(self, user_id: str, conversation_id: str, base_version: int,
+               set_fields: Dict = None, arrays: Dict = None) -> Dict:
+        """
+        Save only what changed since base_version
+
+        Args:
+            user_id: Owner
+            conversation_id: Conversation ID
+            base_version: Version the client's changes are based on (0 for a new conversation)
+            set_fields: Top-level fields to replace, e.g. title and lastUpdated
+            arrays: {'messages': {'from': n, 'items': [...]}, ...} - keep the first n
+                items of each list and append items after them
+
+        Returns:
+            dict: {'version': new version, 'message_count': n, 'compacted': bool}
+
+        Raises:
+            ConversationConflict: Another save happened after base_version
+            ValueError: Malformed delta
+        """
+        set_fields = {k: v for k, v in (set_fields or {}).items() if k not in SERVER_FIELDS}
+        array_changes = {}
+        for name, change in (arrays or {}).items():
+            start = change.get('from') if isinstance(change, dict) else None
+            items = change.get('items') if isinstance(change, dict) else None
+            if name in SERVER_FIELDS or not isinstance(start, int) or start < 0 or not isinstance(items, list):
+                raise ValueError(f"Invalid change for '{name}': expected {{'from': int, 'items': list}}")
+            array_changes[name] = [start, items]
+
+        self.ensure_indexed(user_id)
+        path = self._path(user_id, conversation_id)
+
+        with self._locked(path) as log:
+            row = self._row(user_id, conversation_id)
+            if (row is not None and os.path.exists(path)
+                    and os.path.getsize(path) + os.fstat(log.fileno()).st_size != row['size']):
+                # A worker died between writing the snapshot or a log line and updating the index:
+                # fold what the files hold into a fresh snapshot, so the next version follows the
+                # last one written rather than the last one indexed (and a torn line is dropped)
+                conversation = self._materialize(path)
+                size = self._write_snapshot(path, conversation)
+                log.truncate(0)
+                self._reindex(user_id, conversation_id, conversation, size)
+                self.stats['recoveries'] += 1
+                print(f"CONVERSATIONS: Recovered {path} at version {conversation.get('version', 0)}")
+                row = self._row(user_id, conversation_id)
+
+            current_version = row['version'] if row else 0
+            if base_version != current_version:
+                self.stats['conflicts'] += 1
+                raise ConversationConflict(current_version)
+
+            delta = {'version': current_version + 1, 'saved_at': time.time(),
+                     'set': set_fields, 'arrays': array_changes}
+
+            if row is None or not os.path.exists(path):
+                # New conversation - its first delta is the whole thing
+                conversation = apply_delta({'user_id': user_id, 'server_saved': True}, delta)
+                size = self._write_snapshot(path, conversation)
+                log.truncate(0)
+                self._reindex(user_id, conversation_id, conversation, size)
+                self.stats['delta_saves'] += 1
+                self.stats['delta_bytes_written'] += size
+                return {'version': delta['version'], 'message_count': len(conversation.get('messages', [])),
+                        'compacted': False}
+
+            line = json.dumps(delta, ensure_ascii=False).encode('utf-8') + b'\n'
+            log.write(line)
+            log.flush()
+            self.stats['delta_saves'] += 1
+            self.stats['delta_bytes_written'] += len(line)
+
+            if row['log_entries'] + 1 >= self.log_max_entries:
+                # Fold the log into a fresh snapshot
+                conversation = self._materialize(path)
+                size = self._write_snapshot(path, conversation)
+                log.truncate(0)
+                self._reindex(user_id, conversation_id, conversation, size)
+                self.stats['compactions'] += 1
+                return {'version': delta['version'], 'message_count': len(conversation.get('messages', [])),
+                        'compacted': True}
+
+            # O(1) index update from the delta alone
+            message_count = row['message_count']
+            if 'messages' in array_changes:
+                start, items = array_changes['messages']
+                message_count = min(start, message_count) + len(items)
+            title = set_fields.get('title', row['title'])
+            if 'lastUpdated' in set_fields:
+                last_updated_raw = set_fields['lastUpdated']
+                last_updated = sort_timestamp(last_updated_raw) or delta['saved_at']
+            else:
+                last_updated_raw = json.loads(row['last_updated_raw']) if row['last_updated_raw'] else row['last_updated']
+                last_updated = row['last_updated']
+
+            conn = self.get_connection()
+            try:
+                conn.execute('''
+                    UPDATE conversation_index
+                    SET title = ?, last_updated = ?, last_updated_raw = ?, message_count = ?,
+                        size = size + ?, saved_at = ?, version = ?, log_entries = log_entries + 1
+                    WHERE user_id = ? AND id = ?
+                ''', (title, last_updated, json.dumps(last_updated_raw), message_count, len(line),
+                      delta['saved_at'], delta['version'], str(user_id), conversation_id))
+                self._search_apply_delta(conn, user_id, conversation_id, set_fields, array_changes)
+                conn.commit()
+            finally:
+                conn.close()
+
+        return {'version': delta['version'], 'message_count': message_count, 'compacted': False}
+
+    def get(self, user_id: str, conversation_id: str, cache: bool = True) -> Optional[Dict]:
+        """
+        Load a full conversation (snapshot plus logged deltas), or None if it doesn't exist
+
+        Args:
+            user_id: Owner
+            conversation_id: Conversation ID
+            cache: Keep the body in the LRU (off for one-pass reads like bulk export)
+        """
+        path = self._path(user_id, conversation_id)
+        version = file_version(path)
+        if version is None:
+            # Removed outside the store (admin file browser) - drop the stale row
+            self._unindex(user_id, conversation_id)
+            return None
+
+        if not cache:
+            cached = self.bodies.get((str(user_id), conversation_id),
+                                     version=(version, file_version(self._log_path(path))))
+            return cached if cached is not None else self._materialize(path)
+
+        return self.bodies.get_or_load((str(user_id), conversation_id), lambda: self._materialize(path),
+                                       version=(version, file_version(self._log_path(path))))
+
+    def delete(self, user_id: str, conversation_id: str) -> bool:
+        """
+        Delete a conversation's snapshot, log and index row
+
+        Returns:
+            bool: True if the conversation existed
+        """
+        path = self._path(user_id, conversation_id)
+        self._unindex(user_id, conversation_id)
+        try:
+            os.remove(self._log_path(path))
+        except FileNotFoundError:
+            pass
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _unindex(self, user_id: str, conversation_id: str) -> None:
+        self.bodies.pop((str(user_id), conversation_id), None)
+        conn = self.get_connection()
+        try:
+            conn.execute('DELETE FROM conversation_index WHERE user_id = ? AND id = ?',
+                         (str(user_id), conversation_id))
+            self._search_delete(conn, user_id, conversation_id)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def unindex_path(self, relative_path: str) -> None:
+        """Forget a snapshot deleted directly, e.g. '<user_id>/<id>.json' (drops its log and index row)"""
+        parts = relative_path.replace('\\', '/').strip('/').split('/')
+        if len(parts) == 2 and parts[1].endswith('.json'):
+            self._unindex(parts[0], parts[1][:-5])
+            try:
+                os.remove(self._log_path(os.path.join(self.conversations_dir, *parts)))
+            except FileNotFoundError:
+                pass
+
+    def ensure_indexed(self, user_id: str) -> int:
+        """
+        Scan a user's existing conversation files into the index (once per user)
+
+        Returns:
+            int: Number of files indexed by this call
+        """
+        user_id = str(user_id)
+        conn = self.get_connection()
+        try:
+            if conn.execute('SELECT 1 FROM conversation_index_users WHERE user_id = ?', (user_id,)).fetchone():
+                return 0
+        finally:
+            conn.close()
+
+        with self._lock:
+            conn = self.get_connection()
+            try:
+                if conn.execute('SELECT 1 FROM conversation_index_users WHERE user_id = ?', (user_id,)).fetchone():
+                    return 0
+
+                indexed = 0
+                user_dir = os.path.join(self.conversations_dir, user_id)
+                if os.path.isdir(user_dir):
+                    for filename in os.listdir(user_dir):
+                        if not filename.endswith('.json'):
+                            continue
+                        file_path = os.path.join(user_dir, filename)
+                        try:
+                            conversation = self._materialize(file_path)
+                            size = os.path.getsize(file_path)
+                            if os.path.exists(self._log_path(file_path)):
+                                size += os.path.getsize(self._log_path(file_path))
+                            self._index_row(conn, user_id, filename[:-5], conversation, size)
+                            self._search_replace(conn, user_id, filename[:-5], conversation)
+                            indexed += 1
+                        except Exception as e:
+                            print(f"CONVERSATIONS: Could not index {file_path}: {e}")
+
+                conn.execute('INSERT OR REPLACE INTO conversation_index_users (user_id, indexed_at) VALUES (?, ?)',
+                             (user_id, time.time()))
+                conn.execute('INSERT OR REPLACE INTO conversation_search_users (user_id, indexed_at) VALUES (?, ?)',
+                             (user_id, time.time()))
+                conn.commit()
+            finally:
+                conn.close()
+
+        if indexed:
+            print(f"CONVERSATIONS: Indexed {indexed} existing conversations for user {user_id}")
+        return indexed
+
+    def ensure_search_indexed(self, user_id: str) -> int:
+        """
+        Build FTS rows for a user indexed before search existed (once per user)
+
+        Returns:
+            int: Number of conversations indexed by this call
+        """
+        user_id = str(user_id)
+        self.ensure_indexed(user_id)
+        conn = self.get_connection()
+        try:
+            if conn.execute('SELECT 1 FROM conversation_search_users WHERE user_id = ?', (user_id,)).fetchone():
+                return 0
+            ids = [row['id'] for row in conn.execute('SELECT id FROM conversation_index WHERE user_id = ?', (user_id,))]
+        finally:
+            conn.close()
+
+        indexed = 0
+        with self._lock:
+            conn = self.get_connection()
+            try:
+                if conn.execute('SELECT 1 FROM conversation_search_users WHERE user_id = ?', (user_id,)).fetchone():
+                    return 0
+            finally:
+                conn.close()
+
+            # Read a batch of bodies before opening the write transaction - get() may write
+            # the index itself (e.g. unindexing a conversation whose file is gone)
+            for i in range(0, len(ids), SEARCH_BACKFILL_BATCH):
+                conversations = [(conversation_id, self.get(user_id, conversation_id, cache=False))
+                                 for conversation_id in ids[i:i + SEARCH_BACKFILL_BATCH]]
+                conn = self.get_connection()
+                try:
+                    for conversation_id, conversation in conversations:
+                        if conversation is not None:
+                            self._search_replace(conn, user_id, conversation_id, conversation)
+                            indexed += 1
+                    conn.commit()
+                finally:
+                    conn.close()
+
+            conn = self.get_connection()
+            try:
+                conn.execute('INSERT OR REPLACE INTO conversation_search_users (user_id, indexed_at) VALUES (?, ?)',
+                             (user_id, time.time()))
+                conn.commit()
+            finally:
+                conn.close()
+
+        print(f"CONVERSATIONS: Built search index for {indexed} conversations of user {user_id}")
+        return indexed
+
+    def search(self, user_id: str, query: str, limit: int = 20, offset: int = 0) -> Tuple[List[Dict], bool]:
+        """
+        Rank a user's conversations by how well their title and messages match query
+
+        Args:
+            user_id: Owner
+            query: Free text; every word must match, the last one as a prefix
+            limit: Page size
+            offset: Results to skip (pagination)
+
+        Returns:
+            tuple: (results with an HTML-escaped snippet using <mark> around matches, has_more)
+        """
+        if not self.search_enabled:
+            return [], False
+        match = build_match_query(owner_token(user_id), query)
+        if match is None:
+            return [], False
+        self.ensure_search_indexed(user_id)
+
+        conn = self.get_connection()
+        try:
+            # Best-ranked row per conversation over every match; title hits weigh 4x message
+            # hits. bm25() can't be aggregated directly, so the matches are scored first.
+            hits = conn.execute('''
+                WITH hits AS MATERIALIZED (
+                    SELECT rowid AS fts_rowid, conversation_id, position,
+                           bm25(conversation_fts, 0, 0, 0, 4.0, 1.0) AS score
+                    FROM conversation_fts
+                    WHERE conversation_fts MATCH ?
+                )
+                SELECT fts_rowid, conversation_id, position, MIN(score) AS score, COUNT(*) AS matches
+                FROM hits
+                GROUP BY conversation_id
+                ORDER BY score, conversation_id
+                LIMIT ? OFFSET ?
+            ''', (match, limit + 1, offset)).fetchall()
+
+            has_more = len(hits) > limit
+            hits = hits[:limit]
+            metadata = {}
+            texts = {}
+            if hits:
+                placeholders = ','.join('?' * len(hits))
+                for row in conn.execute(f'SELECT * FROM conversation_index WHERE user_id = ? AND id IN ({placeholders})',
+                                        [str(user_id)] + [hit['conversation_id'] for hit in hits]):
+                    metadata[row['id']] = row
+                # Plain rowid lookups - FTS5's snippet() re-runs the query for every row
+                for row in conn.execute(f'SELECT rowid, title, content FROM conversation_fts WHERE rowid IN ({placeholders})',
+                                        [hit['fts_rowid'] for hit in hits]):
+                    texts[row['rowid']] = row['title'] if row['title'] else row['content']
+        finally:
+            conn.close()
+
+        words = re.findall(r'\w+', query.lower())[:12]
+        results = []
+        for hit in hits:
+            row = metadata.get(hit['conversation_id'])
+            if row is None:
+                continue
+            results.append({
+                'id': row['id'],
+                'title': row['title'],
+                'lastUpdated': json.loads(row['last_updated_raw']) if row['last_updated_raw'] else row['last_updated'],
+                'messageCount': row['message_count'],
+                'snippet': make_snippet(texts.get(hit['fts_rowid'], ''), words),
+                'messageIndex': hit['position'] if hit['position'] >= 0 else None,
+                'matches': hit['matches']
+            })
+        return results, has_more
+
+    def list(self, user_id: str, limit: int = 50, cursor: str = None) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Most recently updated conversations, newest first
+
+        Args:
+            user_id: Owner
+            limit: Page size
+            cursor: next_cursor from the previous page
+
+        Returns:
+            tuple: (conversation summaries, cursor for the next page or None)
+        """
+        self.ensure_indexed(user_id)
+
+        query = 'SELECT * FROM conversation_index WHERE user_id = ?'
+        params = [str(user_id)]
+        position = decode_cursor(cursor) if cursor else None
+        if position:
+            # Keyset pagination - rows strictly after the last one returned
+            query += ' AND (last_updated < ? OR (last_updated = ? AND id < ?))'
+            params += [position[0], position[0], position[1]]
+        query += ' ORDER BY last_updated DESC, id DESC LIMIT ?'
+        params.append(limit + 1)
+
+        conn = self.get_connection()
+        try:
+            rows = conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]['last_updated'], rows[-1]['id'])
+
+        return [{
+            'id': row['id'],
+            'title': row['title'],
+            'lastUpdated': json.loads(row['last_updated_raw']) if row['last_updated_raw'] else row['last_updated'],
+            'messageCount': row['message_count'],
+            'size': row['size'],
+            'version': row['version'],
+            'server_saved': bool(row['server_saved'])
+        } for row in rows], next_cursor
+
+    def iter_conversations(self, user_id: str, page_size: int = 100) -> Iterator[Tuple[str, Dict]]:
+        """Every conversation of a user, newest first, loaded one at a time"""
+        cursor = None
+        while True:
+            page, cursor = self.list(user_id, limit=page_size, cursor=cursor)
+            for summary in page:
+                conversation = self.get(user_id, summary['id'], cache=False)
+                if conversation is not None:
+                    yield summary['id'], conversation
+            if not cursor:
+                return
+
+    def get_stats(self) -> Dict:
+        """Save counters for this worker, including bytes written per save type"""
+        return {**self.stats, 'cache': self.bodies.get_stats()}
+
+# Global conversation store instance
+conversation_store = ConversationStore()
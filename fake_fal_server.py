@@ -0,0 +1,159 @@
+"""
+Fake FAL queue server for local testing of background video jobs.
+Implements the subset of the FAL queue API that video_jobs.py uses, with
+deterministic timing, so video tools can be exercised without a FAL key.
+
+Usage:
+    python fake_fal_server.py --port 8765 --polls 3
+    FAL_QUEUE_URL=http://localhost:8765 python web_app.py
+
+Behaviour:
+    - POST /<model>                    -> {request_id, status_url, response_url}
+    - GET  /<model>/requests/<id>/status -> IN_QUEUE, then IN_PROGRESS, then COMPLETED
+      after --polls status checks
+    - GET  /<model>/requests/<id>      -> {"video": {"url": ".../files/<id>.mp4"}}
+    - GET  /files/<id>.mp4             -> deterministic bytes (supports Range)
+    - Prompts containing "fail" complete with an error instead of a video
+    - If the submit request has ?fal_webhook=..., the webhook is called on completion
+"""
+
+import argparse
+import hashlib
+import json
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+VIDEO_SIZE = 256 * 1024
+
+requests_by_id = {}  # request_id -> {'model', 'prompt', 'polls', 'webhook', 'fail'}
+lock = threading.Lock()
+
+def video_bytes(request_id: str) -> bytes:
+    """Same request ID always yields the same 'video'"""
+    seed = hashlib.sha256(request_id.encode()).digest()
+    return (seed * (VIDEO_SIZE // len(seed) + 1))[:VIDEO_SIZE]
+
+class FakeFalHandler(BaseHTTPRequestHandler):
+    polls_until_done = 3
+
+    def base_url(self) -> str:
+        return f"http://{self.headers.get('Host')}"
+
+    def send_json(self, data: dict, status: int = 200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        model = url.path.strip('/')
+        length = int(self.headers.get('Content-Length', 0))
+        arguments = json.loads(self.rfile.read(length) or b'{}')
+
+        with lock:
+            request_id = f"fake-{len(requests_by_id) + 1:06d}"
+            requests_by_id[request_id] = {
+                'model': model,
+                'prompt': arguments.get('prompt', ''),
+                'polls': 0,
+                'webhook': parse_qs(url.query).get('fal_webhook', [None])[0],
+                'fail': 'fail' in arguments.get('prompt', '').lower()
+            }
+
+        print(f"FAKE_FAL: Queued {request_id} for {model}: {arguments.get('prompt', '')!r}")
+        self.send_json({
+            'request_id': request_id,
+            'status_url': f"{self.base_url()}/{model}/requests/{request_id}/status",
+            'response_url': f"{self.base_url()}/{model}/requests/{request_id}"
+        })
+
+    def do_GET(self):
+        path = urlparse(self.path).path.strip('/')
+
+        if path.startswith('files/'):
+            return self.serve_file(path.split('/', 1)[1].rsplit('.', 1)[0])
+
+        parts = path.split('/')
+        if 'requests' not in parts:
+            return self.send_json({'detail': 'Not found'}, 404)
+        request_id = parts[parts.index('requests') + 1]
+        job = requests_by_id.get(request_id)
+        if job is None:
+            return self.send_json({'detail': 'Request not found'}, 404)
+
+        if parts[-1] == 'status':
+            with lock:
+                job['polls'] += 1
+                polls = job['polls']
+            if polls >= self.polls_until_done:
+                status = 'COMPLETED'
+                if polls == self.polls_until_done:
+                    self.notify_webhook(request_id, job)
+            else:
+                status = 'IN_QUEUE' if polls == 1 else 'IN_PROGRESS'
+            return self.send_json({'status': status, 'request_id': request_id})
+
+        if job['polls'] < self.polls_until_done:
+            return self.send_json({'detail': 'Request is still in progress'}, 400)
+        if job['fail']:
+            return self.send_json({'detail': 'Generation failed'}, 500)
+        return self.send_json(self.result_for(request_id))
+
+    def result_for(self, request_id: str) -> dict:
+        return {'video': {'url': f"{self.base_url()}/files/{request_id}.mp4"}, 'seed': 42}
+
+    def notify_webhook(self, request_id: str, job: dict):
+        """POST the completion to the app's webhook, as FAL does"""
+        if not job['webhook']:
+            return
+        if job['fail']:
+            payload = {'request_id': request_id, 'status': 'ERROR', 'error': 'Generation failed'}
+        else:
+            payload = {'request_id': request_id, 'status': 'OK', 'payload': self.result_for(request_id)}
+
+        def send():
+            request = urllib.request.Request(job['webhook'], data=json.dumps(payload).encode(),
+                                             headers={'Content-Type': 'application/json'})
+            try:
+                urllib.request.urlopen(request, timeout=10)
+            except Exception as e:
+                print(f"FAKE_FAL: Webhook for {request_id} failed: {e}")
+
+        threading.Thread(target=send, daemon=True).start()
+
+    def serve_file(self, request_id: str):
+        data = video_bytes(request_id)
+        start = 0
+        range_header = self.headers.get('Range')
+        if range_header and range_header.startswith('bytes='):
+            start = int(range_header[6:].split('-')[0])
+
+        self.send_response(206 if range_header else 200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Length', str(len(data) - start))
+        if range_header:
+            self.send_header('Content-Range', f"bytes {start}-{len(data) - 1}/{len(data)}")
+        self.end_headers()
+        self.wfile.write(data[start:])
+
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake FAL queue server for local video job testing')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--polls', type=int, default=3, help='Status checks before a request completes')
+    args = parser.parse_args()
+
+    FakeFalHandler.polls_until_done = args.polls
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), FakeFalHandler)
+    print(f"FAKE_FAL: Listening on http://127.0.0.1:{args.port} (completes after {args.polls} polls)")
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+In-process fake of the small Redis subset rate_limit.RedisBackend uses.
+Lets the Redis code path run without a server: RATE_LIMIT_BACKEND=redis
+with RATE_LIMIT_REDIS_URL=fake:// (state is per process, like the memory backend).
+
+Supported: GET, SET, INCR, EXPIRE, TTL, DELETE and pipeline().execute().
+"""
+
+import threading
+import time
+from typing import Any, List, Optional
+
+class FakeRedis:
+    """Dict-backed stand-in for redis.Redis with key expiry"""
+
+    def __init__(self):
+        self._data = {}  # key -> [value, expires_at or None]
+        self._lock = threading.RLock()
+
+    def _live(self, key: str) -> Optional[list]:
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._live(key)
+            return None if entry is None else str(entry[0]).encode('utf-8')
+
+    def set(self, key: str, value: Any, ex: int = None) -> bool:
+        with self._lock:
+            self._data[key] = [value, time.time() + ex if ex else None]
+            return True
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                entry = self._data[key] = [0, None]
+            entry[0] = int(entry[0]) + amount
+            return entry[0]
+
+    def expire(self, key: str, seconds: int) -> bool:
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                return False
+            entry[1] = time.time() + seconds
+            return True
+
+    def ttl(self, key: str) -> int:
+        """Seconds left, -1 without expiry, -2 if missing (as Redis)"""
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                return -2
+            return -1 if entry[1] is None else max(0, int(entry[1] - time.time()))
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            return sum(1 for key in keys if self._data.pop(key, None) is not None)
+
+    def pipeline(self, transaction: bool = True) -> 'FakePipeline':
+        return FakePipeline(self)
+
+class FakePipeline:
+    """Queues commands and runs them atomically on execute()"""
+
+    def __init__(self, client: FakeRedis):
+        self._client = client
+        self._commands = []
+
+    def __getattr__(self, name: str):
+        method = getattr(self._client, name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((method, args, kwargs))
+            return self
+        return queue
+
+    def execute(self) -> List[Any]:
+        with self._client._lock:
+            results = [method(*args, **kwargs) for method, args, kwargs in self._commands]
+        self._commands = []
+        return results
@@ -0,0 +1,152 @@
+"""
+Idempotency layer for expensive generation tools (images, videos).
+Identical requests from the same user within a time window reuse the
+already-generated asset, and concurrent duplicates wait on the first
+request instead of calling the upstream model again (single-flight).
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+from config import get_config
+
+config = get_config()
+
+class GenerationInProgress(Exception):
+    """Raised when a duplicate request gives up waiting on the in-flight one"""
+    pass
+
+class _Flight:
+    """One in-flight or completed generation"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.completed_at = None
+
+class GenerationDedup:
+    """Single-flight + short-lived result reuse keyed by (scope, kind, prompt, params)"""
+
+    def __init__(self, window: int = None, max_entries: int = None, wait_timeout: int = None):
+        self.window = window or config.GENERATION_DEDUP_WINDOW
+        self.max_entries = max_entries or config.GENERATION_DEDUP_MAX_ENTRIES
+        self.wait_timeout = wait_timeout or config.GENERATION_DEDUP_WAIT_TIMEOUT
+        self.enabled = config.GENERATION_DEDUP_ENABLED
+
+        self._flights = OrderedDict()  # key -> _Flight
+        self._lock = threading.Lock()
+        self.stats = {'generated': 0, 'reused': 0, 'joined': 0}
+
+    @staticmethod
+    def normalize_prompt(prompt: str) -> str:
+        """Case/whitespace-insensitive prompt, without trailing punctuation"""
+        prompt = ' '.join(prompt.lower().split())
+        return re.sub(r'[\s.!?]+$', '', prompt)
+
+    def make_key(self, scope: str, kind: str, prompt: str, params: Dict = None) -> str:
+        """Stable hash of the request identity"""
+        payload = json.dumps({
+            'scope': str(scope),
+            'kind': kind,
+            'prompt': self.normalize_prompt(prompt),
+            'params': params or {}
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def run(self, scope: str, kind: str, prompt: str, params: Dict,
+            producer: Callable[[], Any], is_valid: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Run producer once per identical request within the reuse window
+
+        Args:
+            scope: Who the request belongs to (user ID, or thread ID for guests)
+            kind: Tool name, e.g. 'image' or 'video_text'
+            prompt: User prompt (normalized before hashing)
+            params: Generation parameters that change the output
+            producer: Callable doing the actual upstream generation
+            is_valid: Optional check that a cached result is still usable
+                      (e.g. its files still exist on disk)
+
+        Returns:
+            The producer's result - fresh, reused, or shared with a concurrent caller.
+            None results are returned but never cached.
+        """
+        if not self.enabled:
+            return producer()
+
+        key = self.make_key(scope, kind, prompt, params)
+        now = time.time()
+
+        with self._lock:
+            self._expire(now)
+            flight = self._flights.get(key)
+
+            if flight and flight.done.is_set():
+                if flight.error is None and (is_valid is None or is_valid(flight.result)):
+                    self.stats['reused'] += 1
+                    print(f"GENERATION_DEDUP: Reusing {kind} result from {now - flight.completed_at:.0f}s ago for scope {scope}")
+                    return flight.result
+                # Stale or failed - start a fresh generation
+                del self._flights[key]
+                flight = None
+
+            if flight is None:
+                flight = _Flight()
+                self._flights[key] = flight
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            self.stats['joined'] += 1
+            print(f"GENERATION_DEDUP: Waiting on in-flight {kind} generation for scope {scope}")
+            if not flight.done.wait(self.wait_timeout):
+                raise GenerationInProgress(f"{kind} generation for this prompt is still running")
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            result = producer()
+            flight.result = result
+            self.stats['generated'] += 1
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            flight.completed_at = time.time()
+            flight.done.set()
+            with self._lock:
+                # Failures and empty results are not reused
+                if (flight.error is not None or flight.result is None) and self._flights.get(key) is flight:
+                    del self._flights[key]
+
+        return result
+
+    def forget(self, scope: str, kind: str, prompt: str, params: Dict = None) -> None:
+        """Drop a cached result so the next identical request regenerates"""
+        with self._lock:
+            self._flights.pop(self.make_key(scope, kind, prompt, params), None)
+
+    def get_stats(self) -> Dict:
+        """Counters for generated/reused/joined requests"""
+        with self._lock:
+            return {**self.stats, 'entries': len(self._flights)}
+
+    def _expire(self, now: float) -> None:
+        """Drop completed entries older than the window and enforce the size bound (lock held)"""
+        for key in [k for k, f in self._flights.items()
+                    if f.done.is_set() and now - f.completed_at > self.window]:
+            del self._flights[key]
+
+        completed = [k for k, f in self._flights.items() if f.done.is_set()]
+        while len(self._flights) > self.max_entries and completed:
+            del self._flights[completed.pop(0)]
+
+# Global generation dedup instance
+generation_dedup = GenerationDedup()
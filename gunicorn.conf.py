@@ -1,5 +1,8 @@
 # Gunicorn configuration for production deployment
 import os
+import time
+
+_boot_started = time.time()
 
 # Server socket
 bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
@@ -29,4 +32,23 @@ max_requests_jitter = 100
 # Security
 limit_request_line = 4094
 limit_request_fields = 100
-limit_request_field_size = 8190
\ No newline at end of file
+limit_request_field_size = 8190
+
+# Server hooks - warm shared state before fork, per-worker clients after
+def when_ready(server):
+    """Master is up and (with preload_app) has imported web_app - warm it before forking workers"""
+    if not server.cfg.preload_app:
+        return
+    from web_app import web_app
+    import prefork
+    prefork.warm_shared_state(web_app)
+    server.log.info(f"Startup: ready in {time.time() - _boot_started:.1f}s, master memory {prefork.memory_usage()}")
+
+def post_fork(server, worker):
+    from web_app import web_app
+    import prefork
+    prefork.init_worker(web_app)
+
+def worker_exit(server, worker):
+    import prefork
+    server.log.info(f"Worker {worker.pid} exiting after {worker.nr} requests, memory {prefork.memory_usage(worker.pid)}")
@@ -0,0 +1,115 @@
+"""
+Token-budgeted conversation history for the AIezzy coordinator.
+Recent messages are kept nearly verbatim; older ones are compacted so long tool
+outputs (OCR text, extracted tables, search results) are not re-sent to Gemini
+on every turn. File paths and URLs are always kept so tools can still find files.
+"""
+
+import re
+from typing import Dict, List
+from config import get_config
+
+config = get_config()
+
+# ~4 characters per token for English text - close enough for budgeting without
+# a tokenizer round-trip to the Gemini API
+CHARS_PER_TOKEN = 4
+
+# Paths/links worth keeping when a message is compacted
+FILE_REFERENCE_PATTERN = re.compile(
+    r'(?:https?://\S+|/app/data/\S+|/?(?:assets|videos|uploads|documents|permanent_files)/[\w.\-]+)'
+)
+
+class HistoryBudget:
+    """Builds the message history sent to the coordinator within a token budget"""
+
+    def __init__(self, total_tokens: int = None, recent_tokens: int = None,
+                 old_tokens: int = None, recent_messages: int = 2):
+        self.total_tokens = total_tokens or config.HISTORY_TOKEN_BUDGET
+        self.recent_tokens = recent_tokens or config.HISTORY_RECENT_MESSAGE_TOKENS
+        self.old_tokens = old_tokens or config.HISTORY_OLD_MESSAGE_TOKENS
+        self.recent_messages = recent_messages
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """Rough token count for budgeting"""
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+    @staticmethod
+    def strip_media(content: str) -> str:
+        """Remove <img> tags and collapse video HTML into short file references"""
+        # Images are dropped entirely to prevent image bleeding between requests
+        content = re.sub(r'<img[^>]*>', '', content)
+        content = re.sub(r'<video[^>]*>.*?<source src="([^"]+)"[^>]*>.*?</video>', r'[video: \1]', content, flags=re.DOTALL)
+        content = re.sub(r'<div class="video-job"[^>]*>.*?</div>', '[video generating]', content, flags=re.DOTALL)
+        return content
+
+    def compact(self, content: str, max_tokens: int) -> str:
+        """
+        Shorten a message to roughly max_tokens
+
+        Keeps the start and end of the text and lists any file paths/URLs from
+        the omitted middle, so later tool calls can still reference them.
+        """
+        if self.estimate_tokens(content) <= max_tokens:
+            return content
+
+        keep_chars = max_tokens * CHARS_PER_TOKEN
+        head = content[:keep_chars * 2 // 3]
+        tail = content[-(keep_chars // 3):]
+        middle = content[len(head):len(content) - len(tail)]
+
+        references = list(dict.fromkeys(FILE_REFERENCE_PATTERN.findall(middle)))[:10]
+        note = f"\n[... {self.estimate_tokens(middle)} tokens of earlier output omitted"
+        if references:
+            note += "; files referenced: " + ", ".join(references)
+        note += " ...]\n"
+        return head + note + tail
+
+    def build(self, history: List[Dict], max_messages: int) -> List[Dict]:
+        """
+        Turn client-side history into coordinator messages within the budget
+
+        Args:
+            history: [{'role', 'content', 'hasImage'}] oldest first
+            max_messages: Upper bound on messages considered
+
+        Returns:
+            list: [{'role', 'content'}] oldest first
+        """
+        selected = []
+        used_tokens = 0
+        original_tokens = 0
+
+        for age, msg in enumerate(reversed(history[-max_messages:])):
+            content = self.strip_media(msg.get('content', '') or '')
+            original_tokens += self.estimate_tokens(content)
+
+            limit = self.recent_tokens if age < self.recent_messages else self.old_tokens
+            content = self.compact(content, limit)
+
+            if msg.get('hasImage', False):
+                content = f"[Previous message included an image] {content}"
+
+            tokens = self.estimate_tokens(content)
+            if selected and used_tokens + tokens > self.total_tokens:
+                break
+
+            selected.append({"role": msg.get('role', 'user'), "content": content})
+            used_tokens += tokens
+
+        selected.reverse()
+        print(f"HISTORY_BUDGET: {len(selected)} message(s), ~{original_tokens} -> ~{used_tokens} tokens")
+        return selected
+
+    def file_banner_entries(self, files: List[Dict], now: float) -> List[str]:
+        """File list for the coordinator's upload banner - most recent files only"""
+        shown = files[-config.HISTORY_BANNER_MAX_FILES:]
+        entries = [f"- {f['filename']} ({f['category']}, {f['size']} bytes, uploaded {int(now - f['timestamp'])}s ago)\n  PATH: {f['path']}"
+                   for f in shown]
+        if len(files) > len(shown):
+            entries.insert(0, f"- ({len(files) - len(shown)} older file(s) not listed)")
+        return entries
+
+# Global history budget instance
+history_budget = HistoryBudget()
@@ -0,0 +1,120 @@
+"""
+Serving of generated and uploaded media for AIezzy.
+Files get a content-hash ETag (If-None-Match -> 304), byte-range support for
+video seeking and resumable downloads, long immutable caching for files whose
+names are never reused, and optional X-Accel-Redirect / X-Sendfile offload so a
+fronting nginx/Apache streams the bytes instead of a gunicorn worker.
+"""
+
+import hashlib
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+from flask import Response, request, send_file
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+from blob_store import blob_store
+from config import get_config
+
+config = get_config()
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+class MediaFiles:
+    """send_from_directory replacement with content ETags, ranges and proxy offload"""
+
+    def __init__(self, offload: str = None, accel_prefix: str = None, max_cached_hashes: int = 4096):
+        self.offload = (offload if offload is not None else config.MEDIA_OFFLOAD).lower()
+        self.accel_prefix = (accel_prefix or config.MEDIA_ACCEL_PREFIX).rstrip('/')
+        self.immutable_max_age = config.MEDIA_IMMUTABLE_MAX_AGE
+        self.mutable_max_age = config.MEDIA_MUTABLE_MAX_AGE
+        self.max_cached_hashes = max_cached_hashes
+
+        # (path, mtime_ns, size) -> sha256 prefix; re-hashed whenever the file changes
+        self._hashes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def content_etag(self, path: str, stat: os.stat_result) -> str:
+        """Content hash of a file, cached by path/mtime/size"""
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            etag = self._hashes.get(key)
+            if etag:
+                self._hashes.move_to_end(key)
+                return etag
+
+        # Blob-store files already have their sha256 indexed
+        digest = blob_store.known_digest(path, stat)
+        if digest is None:
+            sha = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                    sha.update(chunk)
+            digest = sha.hexdigest()
+        etag = digest[:32]
+
+        with self._lock:
+            self._hashes[key] = etag
+            while len(self._hashes) > self.max_cached_hashes:
+                self._hashes.popitem(last=False)
+        return etag
+
+    def send(self, directory: str, filename: str, immutable: bool = True,
+             download_name: Optional[str] = None) -> Response:
+        """
+        Serve a file from a media directory
+
+        Args:
+            directory: Base directory (e.g. VIDEOS_DIR)
+            filename: Requested file name, relative to directory
+            immutable: File names are never reused, so clients may cache forever
+            download_name: Optional attachment name for Content-Disposition
+
+        Raises:
+            NotFound: Missing file or path outside the directory
+        """
+        path = safe_join(os.path.abspath(directory), filename)
+        if path is None or not os.path.isfile(path):
+            raise NotFound()
+
+        stat = os.stat(path)
+        etag = self.content_etag(path, stat)
+        max_age = self.immutable_max_age if immutable else self.mutable_max_age
+
+        if self.offload in ('x-accel-redirect', 'x-sendfile'):
+            response = self._offload(path, etag, stat)
+        else:
+            # Flask handles If-None-Match/If-Modified-Since -> 304 and Range -> 206 here
+            response = send_file(path, etag=etag, conditional=True, max_age=max_age,
+                                 last_modified=stat.st_mtime,
+                                 as_attachment=download_name is not None, download_name=download_name)
+
+        response.headers['Accept-Ranges'] = 'bytes'
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        if immutable:
+            response.cache_control.immutable = True
+        return response
+
+    def _offload(self, path: str, etag: str, stat: os.stat_result) -> Response:
+        """Let the fronting proxy stream the file; 304s are still answered here"""
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+
+        response = Response(mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        if self.offload == 'x-accel-redirect':
+            # nginx: location <prefix>/ { internal; alias <DATA_DIR>/; }
+            relative = os.path.relpath(path, os.path.abspath(config.DATA_DIR)).replace(os.sep, '/')
+            response.headers['X-Accel-Redirect'] = f"{self.accel_prefix}/{relative}"
+        else:
+            response.headers['X-Sendfile'] = path
+        response.set_etag(etag)
+        response.last_modified = stat.st_mtime
+        return response
+
+# Global media files instance
+media_files = MediaFiles()
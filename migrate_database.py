@@ -2,48 +2,127 @@
 Database migration script for AIezzy.
 Migrates existing data from old SQLite schema to new enhanced schema.
 Supports both SQLite and PostgreSQL.
+
+The old database is config.LEGACY_USER_DB. A successful migration leaves a
+'.migrated' marker next to it; until then web_app refuses to start while that
+file still holds users (require_migrated_user_db), since they could not log in.
 """
 
 import os
 import sys
 import sqlite3
 from datetime import datetime
+from typing import Optional
 from config import get_config
-from models import UserManager as OldUserManager
 from models_v2 import db, User, UserSession, UserActivity, init_db
 import hashlib
 import secrets
 
 config = get_config()
 
-def migrate_from_old_db(app):
+MIGRATED_SUFFIX = '.migrated'
+
+def legacy_user_count(old_db_path: str = None) -> int:
+    """
+    Users in an old-schema database that hasn't been migrated yet
+
+    Args:
+        old_db_path: Old database file (default: config.LEGACY_USER_DB)
+
+    Returns:
+        int: 0 if the file is missing, already migrated or not in the old schema
+    """
+    old_db_path = old_db_path or config.LEGACY_USER_DB
+    if not os.path.exists(old_db_path) or os.path.exists(old_db_path + MIGRATED_SUFFIX):
+        return 0
+    conn = sqlite3.connect(f'file:{os.path.abspath(old_db_path)}?mode=ro', uri=True)
+    try:
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(users)')}
+        if not columns or 'tier' in columns:
+            # No users table, or already the models_v2 schema
+            return 0
+        return conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+    except sqlite3.DatabaseError:
+        return 0
+    finally:
+        conn.close()
+
+def _same_database(app, old_db_path: str) -> bool:
+    """True if the app's database is the old SQLite file itself"""
+    with app.app_context():
+        url = db.engine.url
+        return (url.get_backend_name() == 'sqlite' and bool(url.database) and url.database != ':memory:'
+                and os.path.realpath(url.database) == os.path.realpath(old_db_path))
+
+def require_migrated_user_db(app) -> None:
+    """
+    Refuse to start while config.LEGACY_USER_DB holds users the app can't see
+
+    Args:
+        app: Flask application (already passed to init_db)
+
+    Raises:
+        RuntimeError: The old database has unmigrated users
+    """
+    users = legacy_user_count()
+    if not users:
+        return
+    old_db_path = config.LEGACY_USER_DB
+    if _same_database(app, old_db_path):
+        command = (f"mv {old_db_path} {old_db_path}.legacy && "
+                   f"python migrate_database.py migrate --yes --from {old_db_path}.legacy")
+    else:
+        command = 'python migrate_database.py migrate --yes'
+    raise RuntimeError(f"{old_db_path} has {users} users in the old schema that were never migrated to "
+                       f"{app.config['SQLALCHEMY_DATABASE_URI']}. Run: {command} "
+                       f"(or move the file away to start without them)")
+
+def migrate_from_old_db(app, assume_yes: bool = False, old_db_path: str = None) -> bool:
     """
     Migrate data from old database to new schema
 
     Args:
         app: Flask application instance
+        assume_yes: Don't ask for confirmation (deploy scripts)
+        old_db_path: Old database file (default: config.LEGACY_USER_DB)
+
+    Returns:
+        bool: True if data was migrated
     """
     print("=" * 60)
     print("DATABASE MIGRATION TOOL")
     print("=" * 60)
 
     # Check if old database exists
-    old_db_path = 'aiezzy_users.db'
+    old_db_path = old_db_path or config.LEGACY_USER_DB
     if not os.path.exists(old_db_path):
         print("❌ Old database not found. Skipping migration.")
         print("✓ Initializing fresh database...")
         with app.app_context():
             init_db(app)
-        return
+        return False
+
+    if os.path.exists(old_db_path + MIGRATED_SUFFIX):
+        print(f"✓ {old_db_path} was already migrated ({old_db_path + MIGRATED_SUFFIX}).")
+        return False
 
     print(f"📦 Found old database: {old_db_path}")
-    print(f"🎯 Target database: {config.SQLALCHEMY_DATABASE_URI}")
+    print(f"🎯 Target database: {app.config['SQLALCHEMY_DATABASE_URI']}")
+
+    # Creates the new schema (once per app - init_db registers the extension)
+    init_db(app)
+    if _same_database(app, old_db_path):
+        print("❌ The old database is the target database itself - move it aside and migrate from the copy:")
+        print(f"   mv {old_db_path} {old_db_path}.legacy && "
+              f"python migrate_database.py migrate --yes --from {old_db_path}.legacy")
+        return False
 
     # Ask for confirmation
-    response = input("\n⚠️  This will migrate all data to the new schema. Continue? (yes/no): ")
-    if response.lower() != 'yes':
-        print("Migration cancelled.")
-        return
+    if not assume_yes:
+        response = input("\n⚠️  This will migrate all data to the new schema. Continue? (yes/no): ")
+        if response.lower() != 'yes':
+            print("Migration cancelled.")
+            return False
 
     print("\n🔄 Starting migration...")
 
@@ -54,9 +133,8 @@ def migrate_from_old_db(app):
         old_cursor = old_conn.cursor()
 
         with app.app_context():
-            # Initialize new database
-            print("1️⃣  Initializing new database schema...")
-            init_db(app)
+            # New schema was created by init_db above
+            print("1️⃣  Initialized new database schema")
 
             # Migrate users
             print("2️⃣  Migrating users...")
@@ -65,6 +143,11 @@ def migrate_from_old_db(app):
             user_mapping = {}  # Map old IDs to new IDs
 
             for old_user in users:
+                existing = User.query.filter_by(email=old_user['email']).first()
+                if existing:
+                    # Already there (an earlier, interrupted run) - keep its rows pointing at it
+                    user_mapping[old_user['id']] = existing.id
+                    continue
                 new_user = User(
                     username=old_user['username'],
                     email=old_user['email'],
@@ -93,7 +176,8 @@ def migrate_from_old_db(app):
             sessions = old_cursor.fetchall()
 
             for old_session in sessions:
-                if old_session['user_id'] in user_mapping:
+                if old_session['user_id'] in user_mapping and not UserSession.query.filter_by(
+                        session_token=old_session['session_token']).first():
                     new_session = UserSession(
                         user_id=user_mapping[old_session['user_id']],
                         session_token=old_session['session_token'],
@@ -129,6 +213,10 @@ def migrate_from_old_db(app):
 
         old_conn.close()
 
+        # Lets the app start against the migrated database (require_migrated_user_db)
+        with open(old_db_path + MIGRATED_SUFFIX, 'w') as f:
+            f.write(f"{datetime.utcnow().isoformat()} {app.config['SQLALCHEMY_DATABASE_URI']}\n")
+
         print("\n" + "=" * 60)
         print("✅ MIGRATION COMPLETED SUCCESSFULLY!")
         print("=" * 60)
@@ -139,6 +227,7 @@ def migrate_from_old_db(app):
         print("\n💡 Note: The old database has been preserved.")
         print(f"   Location: {old_db_path}")
         print("\n🎉 Your application is now ready to use with enhanced features!")
+        return True
 
     except Exception as e:
         print(f"\n❌ Migration failed: {e}")
@@ -199,7 +288,8 @@ if __name__ == '__main__':
     app.config.from_object(config)
 
     if len(sys.argv) > 1 and sys.argv[1] == 'migrate':
-        migrate_from_old_db(app)
+        old_db_path = sys.argv[sys.argv.index('--from') + 1] if '--from' in sys.argv[2:-1] else None
+        migrate_from_old_db(app, assume_yes='--yes' in sys.argv[2:], old_db_path=old_db_path)
     elif len(sys.argv) > 1 and sys.argv[1] == 'create-admin':
         if len(sys.argv) < 5:
             print("Usage: python migrate_database.py create-admin <username> <email> <password>")
@@ -207,5 +297,5 @@ if __name__ == '__main__':
             create_admin_user(app, sys.argv[2], sys.argv[3], sys.argv[4])
     else:
         print("Usage:")
-        print("  python migrate_database.py migrate")
+        print("  python migrate_database.py migrate [--yes] [--from <old database>]")
         print("  python migrate_database.py create-admin <username> <email> <password>")
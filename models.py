@@ -1,450 +1,404 @@
 """
 Database models for AIezzy user authentication and management system.
-Uses SQLite with SQLAlchemy ORM for user accounts, sessions, and metadata.
+UserManager is the data-access layer for accounts, sessions and activity on
+top of the SQLAlchemy models in models_v2, so auth, the admin pages and the v2
+API routes all share one engine, one connection pool and one session per request.
+
+The session lookup behind every authenticated request is the exception on
+SQLite: it runs on a per-thread sqlite3 connection kept open between requests
+(WAL, prepared statement reused), skipping the ORM session and pool checkout.
 """
 
-import sqlite3
 import os
-import hashlib
-import secrets
-import time
+import sqlite3
+import threading
 from datetime import datetime, timedelta
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 import json
+import secrets
+from sqlalchemy import func, or_, desc, case, select, update, bindparam
+from models_v2 import db, User, UserSession, UserActivity, hash_password, verify_password
+from config import get_config
 
-# Database file path - use environment-specific path
-if os.environ.get('RAILWAY_ENVIRONMENT'):
-    # Production: Use Railway persistent volume
-    DB_PATH = '/app/data/aiezzy_users.db'
-    # Ensure data directory exists
-    os.makedirs('/app/data', exist_ok=True)
-else:
-    # Development: Use local file
-    DB_PATH = 'aiezzy_users.db'
-
-class Database:
-    """Simple database manager for user authentication"""
-    
-    def __init__(self):
-        self.init_database()
-    
-    def get_connection(self):
-        """Get database connection"""
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row  # Enable dict-like access
-        return conn
-    
-    def init_database(self):
-        """Initialize database tables"""
-        conn = self.get_connection()
-        try:
-            # Users table
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE NOT NULL,
-                    email TEXT UNIQUE NOT NULL,
-                    password_hash TEXT NOT NULL,
-                    full_name TEXT,
-                    is_active BOOLEAN DEFAULT TRUE,
-                    is_admin BOOLEAN DEFAULT FALSE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_login TIMESTAMP,
-                    profile_image TEXT,
-                    preferences TEXT  -- JSON string for user preferences
-                )
-            ''')
-            
-            # Sessions table for login sessions
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS user_sessions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    session_token TEXT UNIQUE NOT NULL,
-                    expires_at TIMESTAMP NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    ip_address TEXT,
-                    user_agent TEXT,
-                    is_active BOOLEAN DEFAULT TRUE,
-                    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
-                )
-            ''')
-            
-            # Password reset tokens
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS password_reset_tokens (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    token TEXT UNIQUE NOT NULL,
-                    expires_at TIMESTAMP NOT NULL,
-                    used BOOLEAN DEFAULT FALSE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
-                )
-            ''')
-            
-            # User activity log
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS user_activity (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    activity_type TEXT NOT NULL,  -- login, logout, conversation_created, etc.
-                    activity_data TEXT,  -- JSON for additional data
-                    ip_address TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
-                )
-            ''')
-            
-            conn.commit()
-            print("Database initialized successfully")
-            
-        except Exception as e:
-            print(f"Error initializing database: {e}")
-            raise
-        finally:
-            conn.close()
+config = get_config()
+
+# Days a login session stays valid
+SESSION_LIFETIME_DAYS = 30
+
+# Session lookup runs on every authenticated request - built once, executed with a bound token
+SESSION_LOOKUP = select(
+    User.id, User.username, User.email, User.full_name, User.is_admin, UserSession.expires_at
+).join(UserSession, UserSession.user_id == User.id).where(
+    UserSession.session_token == bindparam('token'),
+    UserSession.is_active == True,
+    User.is_active == True
+)
+# The same lookup for the sqlite3 fast path
+SESSION_LOOKUP_SQL = '''
+    SELECT u.id, u.username, u.email, u.full_name, u.is_admin, s.expires_at
+    FROM users u
+    JOIN user_sessions s ON s.user_id = u.id
+    WHERE s.session_token = ? AND s.is_active = 1 AND u.is_active = 1
+'''
+EXPIRE_SESSION = update(UserSession).where(UserSession.session_token == bindparam('token')).values(is_active=False)
+
+def format_timestamp(value: Optional[datetime]) -> Optional[str]:
+    """'YYYY-MM-DD HH:MM:SS' as the admin templates and API responses expect"""
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else None
 
 class UserManager:
     """User management operations"""
-    
+
     def __init__(self):
-        self.db = Database()
-    
+        # Per thread: database file -> sqlite3 connection for the session lookup
+        self._local = threading.local()
+
+    def _lookup_connection(self) -> Optional[sqlite3.Connection]:
+        """Open sqlite3 connection to the app database for this thread, None unless it is an SQLite file"""
+        url = db.engine.url
+        if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+            return None
+        connections = getattr(self._local, 'connections', None)
+        if connections is None or getattr(self._local, 'pid', None) != os.getpid():
+            # Forked (gunicorn worker) - connections must not cross processes
+            connections = self._local.connections = {}
+            self._local.pid = os.getpid()
+        conn = connections.get(url.database)
+        if conn is None:
+            # Autocommit, so each lookup sees the latest committed sessions
+            conn = sqlite3.connect(url.database, timeout=config.USER_DB_BUSY_TIMEOUT, isolation_level=None)
+            conn.execute(f'PRAGMA cache_size=-{config.USER_DB_CACHE_KB}')
+            connections[url.database] = conn
+        return conn
+
     def hash_password(self, password: str) -> str:
         """Hash a password using SHA256 with salt"""
-        salt = secrets.token_hex(32)
-        pwd_hash = hashlib.sha256((password + salt).encode()).hexdigest()
-        return f"{salt}${pwd_hash}"
-    
+        return hash_password(password)
+
     def verify_password(self, password: str, password_hash: str) -> bool:
         """Verify a password against its hash"""
-        try:
-            salt, pwd_hash = password_hash.split('$')
-            return hashlib.sha256((password + salt).encode()).hexdigest() == pwd_hash
-        except:
-            return False
-    
+        return verify_password(password, password_hash)
+
+    def _add_activity(self, user_id: int, activity_type: str, activity_data: Dict = None, ip_address: str = None):
+        """Stage an activity row in the current transaction"""
+        db.session.add(UserActivity(
+            user_id=user_id,
+            activity_type=activity_type,
+            activity_data=json.dumps(activity_data) if activity_data else None,
+            ip_address=ip_address
+        ))
+
     def create_user(self, email: str, password: str, full_name: str = None) -> Dict:
         """Create a new user account"""
-        conn = self.db.get_connection()
         try:
             # Check if email already exists
-            existing = conn.execute(
-                'SELECT id FROM users WHERE email = ?', 
-                (email,)
-            ).fetchone()
-            
-            if existing:
+            if db.session.query(User.id).filter_by(email=email).first():
                 return {'success': False, 'error': 'Email already exists'}
-            
+
             # Validate input
             if '@' not in email:
                 return {'success': False, 'error': 'Invalid email format'}
-            
+
             if len(password) < 1:
                 return {'success': False, 'error': 'Password is required'}
-            
+
             # Generate username from email (part before @)
             username = email.split('@')[0]
-            
+
             # Make sure username is unique by adding numbers if needed
             base_username = username
             counter = 1
-            while True:
-                existing_username = conn.execute(
-                    'SELECT id FROM users WHERE username = ?', 
-                    (username,)
-                ).fetchone()
-                
-                if not existing_username:
-                    break
-                    
+            while db.session.query(User.id).filter_by(username=username).first():
                 username = f"{base_username}{counter}"
                 counter += 1
-            
-            # Create user
-            password_hash = self.hash_password(password)
-            cursor = conn.execute('''
-                INSERT INTO users (username, email, password_hash, full_name, preferences)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (username, email, password_hash, full_name, '{}'))
-            
-            user_id = cursor.lastrowid
-            conn.commit()
-            
-            # Log activity
-            self.log_activity(user_id, 'account_created', {'username': username, 'email': email})
-            
+
+            # Create user and log activity in one transaction
+            user = User(username=username, email=email, password_hash=self.hash_password(password),
+                        full_name=full_name, preferences='{}')
+            db.session.add(user)
+            db.session.flush()
+            self._add_activity(user.id, 'account_created', {'username': username, 'email': email})
+            db.session.commit()
+
             return {
-                'success': True, 
-                'user_id': user_id,
+                'success': True,
+                'user_id': user.id,
                 'username': username,
                 'message': 'User created successfully'
             }
-            
+
         except Exception as e:
+            db.session.rollback()
             return {'success': False, 'error': str(e)}
-        finally:
-            conn.close()
-    
+
     def authenticate_user(self, username: str, password: str, ip_address: str = None, user_agent: str = None) -> Dict:
         """Authenticate user and create session"""
-        conn = self.db.get_connection()
         try:
             # Find user by username or email
-            user = conn.execute('''
-                SELECT id, username, email, password_hash, is_active, full_name, is_admin 
-                FROM users 
-                WHERE (username = ? OR email = ?) AND is_active = TRUE
-            ''', (username, username)).fetchone()
-            
+            user = User.query.filter(
+                or_(User.username == username, User.email == username),
+                User.is_active == True
+            ).first()
+
             if not user:
                 return {'success': False, 'error': 'Invalid username or password'}
-            
+
             # Verify password
-            if not self.verify_password(password, user['password_hash']):
+            if not self.verify_password(password, user.password_hash):
                 return {'success': False, 'error': 'Invalid username or password'}
-            
+
             # Create session token
             session_token = secrets.token_urlsafe(48)
-            expires_at = datetime.now() + timedelta(days=30)  # 30-day session
-            
-            # Store session
-            conn.execute('''
-                INSERT INTO user_sessions (user_id, session_token, expires_at, ip_address, user_agent)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (user['id'], session_token, expires_at, ip_address, user_agent))
-            
-            # Update last login
-            conn.execute('''
-                UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?
-            ''', (user['id'],))
-            
-            conn.commit()
-            
-            # Log activity
-            self.log_activity(user['id'], 'login', {'ip_address': ip_address})
-            
+            expires_at = datetime.utcnow() + timedelta(days=SESSION_LIFETIME_DAYS)
+
+            # Store session, update last login and log activity together
+            db.session.add(UserSession(user_id=user.id, session_token=session_token, expires_at=expires_at,
+                                       ip_address=ip_address, user_agent=user_agent))
+            user.last_login = datetime.utcnow()
+            self._add_activity(user.id, 'login', {'ip_address': ip_address})
+            db.session.commit()
+
             return {
                 'success': True,
                 'user': {
-                    'id': user['id'],
-                    'username': user['username'],
-                    'email': user['email'],
-                    'full_name': user['full_name'],
-                    'is_admin': bool(user['is_admin'])
+                    'id': user.id,
+                    'username': user.username,
+                    'email': user.email,
+                    'full_name': user.full_name,
+                    'is_admin': bool(user.is_admin)
                 },
                 'session_token': session_token,
                 'expires_at': expires_at.isoformat()
             }
-            
+
         except Exception as e:
+            db.session.rollback()
             return {'success': False, 'error': str(e)}
-        finally:
-            conn.close()
-    
+
     def get_user_by_session(self, session_token: str) -> Optional[Dict]:
         """Get user by session token"""
-        conn = self.db.get_connection()
+        found = self.get_session(session_token)
+        return found[0] if found else None
+
+    def get_session(self, session_token: str) -> Optional[Tuple[Dict, datetime]]:
+        """(user, session expiry in UTC) for an active session token, None if invalid or expired"""
         try:
-            result = conn.execute('''
-                SELECT u.id, u.username, u.email, u.full_name, u.is_admin, s.expires_at
-                FROM users u
-                JOIN user_sessions s ON u.id = s.user_id
-                WHERE s.session_token = ? AND s.is_active = TRUE AND u.is_active = TRUE
-            ''', (session_token,)).fetchone()
-            
+            conn = self._lookup_connection()
+            if conn is not None:
+                result = conn.execute(SESSION_LOOKUP_SQL, (session_token,)).fetchone()
+            else:
+                result = db.session.execute(SESSION_LOOKUP, {'token': session_token}).first()
+
             if not result:
                 return None
-            
+
+            user_id, username, email, full_name, is_admin, expires_at = result
+            if isinstance(expires_at, str):
+                expires_at = datetime.fromisoformat(expires_at)
+
             # Check if session expired
-            expires_at = datetime.fromisoformat(result['expires_at'].replace('Z', '+00:00'))
-            if expires_at < datetime.now():
+            if expires_at < datetime.utcnow():
                 # Deactivate expired session
-                conn.execute('UPDATE user_sessions SET is_active = FALSE WHERE session_token = ?', (session_token,))
-                conn.commit()
+                db.session.execute(EXPIRE_SESSION, {'token': session_token})
+                db.session.commit()
                 return None
-            
+
             return {
-                'id': result['id'],
-                'username': result['username'], 
-                'email': result['email'],
-                'full_name': result['full_name'],
-                'is_admin': bool(result['is_admin'])
-            }
-            
+                'id': user_id,
+                'username': username,
+                'email': email,
+                'full_name': full_name,
+                'is_admin': bool(is_admin)
+            }, expires_at
+
         except Exception as e:
+            db.session.rollback()
             print(f"Error getting user by session: {e}")
             return None
-        finally:
-            conn.close()
-    
+
     def logout_user(self, session_token: str) -> bool:
         """Logout user by deactivating session"""
-        conn = self.db.get_connection()
         try:
-            # Get user_id for logging
-            result = conn.execute(
-                'SELECT user_id FROM user_sessions WHERE session_token = ?', 
-                (session_token,)
-            ).fetchone()
-            
-            if result:
-                user_id = result['user_id']
-                
-                # Deactivate session
-                conn.execute('''
-                    UPDATE user_sessions SET is_active = FALSE 
-                    WHERE session_token = ?
-                ''', (session_token,))
-                conn.commit()
-                
-                # Log activity
-                self.log_activity(user_id, 'logout')
-                
-                return True
-            return False
-            
+            user_session = UserSession.query.filter_by(session_token=session_token).first()
+            if not user_session:
+                return False
+
+            user_session.is_active = False
+            self._add_activity(user_session.user_id, 'logout')
+            db.session.commit()
+            return True
+
         except Exception as e:
+            db.session.rollback()
             print(f"Error logging out user: {e}")
             return False
-        finally:
-            conn.close()
-    
+
     def update_user_profile(self, user_id: int, **kwargs) -> Dict:
         """Update user profile information"""
-        conn = self.db.get_connection()
         try:
             allowed_fields = ['full_name', 'email', 'profile_image']
-            update_fields = []
-            values = []
-            
-            for field, value in kwargs.items():
-                if field in allowed_fields and value is not None:
-                    update_fields.append(f"{field} = ?")
-                    values.append(value)
-            
-            if not update_fields:
+            update_data = {field: value for field, value in kwargs.items()
+                           if field in allowed_fields and value is not None}
+
+            if not update_data:
                 return {'success': False, 'error': 'No valid fields to update'}
-            
-            # Add updated_at
-            update_fields.append("updated_at = CURRENT_TIMESTAMP")
-            values.append(user_id)
-            
-            query = f"UPDATE users SET {', '.join(update_fields)} WHERE id = ?"
-            conn.execute(query, values)
-            conn.commit()
-            
-            # Log activity
-            self.log_activity(user_id, 'profile_updated', kwargs)
-            
+
+            update_data['updated_at'] = datetime.utcnow()
+            User.query.filter_by(id=user_id).update(update_data)
+            self._add_activity(user_id, 'profile_updated', kwargs)
+            db.session.commit()
+
             return {'success': True, 'message': 'Profile updated successfully'}
-            
+
         except Exception as e:
+            db.session.rollback()
             return {'success': False, 'error': str(e)}
-        finally:
-            conn.close()
-    
+
     def change_password(self, user_id: int, old_password: str, new_password: str) -> Dict:
         """Change user password"""
-        conn = self.db.get_connection()
         try:
-            # Get current password hash
-            result = conn.execute(
-                'SELECT password_hash FROM users WHERE id = ?', 
-                (user_id,)
-            ).fetchone()
-            
-            if not result:
+            user = db.session.get(User, user_id)
+            if not user:
                 return {'success': False, 'error': 'User not found'}
-            
+
             # Verify old password
-            if not self.verify_password(old_password, result['password_hash']):
+            if not self.verify_password(old_password, user.password_hash):
                 return {'success': False, 'error': 'Current password is incorrect'}
-            
+
             # Validate new password
             if len(new_password) < 6:
                 return {'success': False, 'error': 'New password must be at least 6 characters'}
-            
-            # Update password
-            new_hash = self.hash_password(new_password)
-            conn.execute('''
-                UPDATE users SET password_hash = ?, updated_at = CURRENT_TIMESTAMP 
-                WHERE id = ?
-            ''', (new_hash, user_id))
-            conn.commit()
-            
-            # Log activity
-            self.log_activity(user_id, 'password_changed')
-            
+
+            user.password_hash = self.hash_password(new_password)
+            user.updated_at = datetime.utcnow()
+            self._add_activity(user_id, 'password_changed')
+            db.session.commit()
+
             return {'success': True, 'message': 'Password changed successfully'}
-            
+
         except Exception as e:
+            db.session.rollback()
             return {'success': False, 'error': str(e)}
-        finally:
-            conn.close()
-    
+
     def log_activity(self, user_id: int, activity_type: str, activity_data: Dict = None, ip_address: str = None):
         """Log user activity"""
-        conn = self.db.get_connection()
         try:
-            data_json = json.dumps(activity_data) if activity_data else None
-            conn.execute('''
-                INSERT INTO user_activity (user_id, activity_type, activity_data, ip_address)
-                VALUES (?, ?, ?, ?)
-            ''', (user_id, activity_type, data_json, ip_address))
-            conn.commit()
+            self._add_activity(user_id, activity_type, activity_data, ip_address)
+            db.session.commit()
         except Exception as e:
+            db.session.rollback()
             print(f"Error logging activity: {e}")
-        finally:
-            conn.close()
-    
+
     def get_user_stats(self, user_id: int) -> Dict:
         """Get user statistics"""
-        conn = self.db.get_connection()
         try:
             # Get basic user info
-            user = conn.execute('''
-                SELECT username, full_name, email, created_at, last_login
-                FROM users WHERE id = ?
-            ''', (user_id,)).fetchone()
-            
+            user = db.session.get(User, user_id)
             if not user:
                 return {'error': 'User not found'}
-            
+
             # Count conversations
-            import os
             conv_dir = f'conversations/{user_id}'
             conversation_count = 0
             if os.path.exists(conv_dir):
                 conversation_count = len([f for f in os.listdir(conv_dir) if f.endswith('.json')])
-            
+
             # Get recent activity count
-            activity_count = conn.execute('''
-                SELECT COUNT(*) as count FROM user_activity 
-                WHERE user_id = ? AND created_at > date('now', '-30 days')
-            ''', (user_id,)).fetchone()['count']
-            
+            activity_count = db.session.query(func.count(UserActivity.id)).filter(
+                UserActivity.user_id == user_id,
+                UserActivity.created_at > datetime.utcnow() - timedelta(days=30)
+            ).scalar()
+
             return {
-                'username': user['username'],
-                'full_name': user['full_name'],
-                'email': user['email'],
-                'created_at': user['created_at'],
-                'last_login': user['last_login'],
+                'username': user.username,
+                'full_name': user.full_name,
+                'email': user.email,
+                'created_at': format_timestamp(user.created_at),
+                'last_login': format_timestamp(user.last_login),
                 'conversation_count': conversation_count,
                 'recent_activity_count': activity_count
             }
-            
+
         except Exception as e:
+            db.session.rollback()
             return {'error': str(e)}
-        finally:
-            conn.close()
-
-# Initialize database when module is imported
-if __name__ == '__main__':
-    # Test the database setup
-    db = Database()
-    user_manager = UserManager()
-    print("Database setup completed successfully")
\ No newline at end of file
+
+    # ==================== Admin queries ====================
+
+    def get_dashboard_counts(self) -> Dict:
+        """Total users and active unexpired sessions"""
+        return {
+            'total_users': db.session.query(func.count(User.id)).scalar(),
+            'active_sessions': db.session.query(func.count(UserSession.id)).filter(
+                UserSession.is_active == True,
+                UserSession.expires_at > datetime.utcnow()
+            ).scalar()
+        }
+
+    def get_recent_users(self, limit: int = 10) -> List[Dict]:
+        """Newest accounts first"""
+        users = User.query.order_by(desc(User.created_at)).limit(limit).all()
+        return [{
+            'id': u.id,
+            'username': u.username,
+            'email': u.email,
+            'tier': u.tier or ('enterprise' if u.is_admin else 'free'),
+            'is_active': bool(u.is_active),
+            'created_at': format_timestamp(u.created_at),
+            'last_login': format_timestamp(u.last_login)
+        } for u in users]
+
+    def get_top_activity(self, days: int = 7, limit: int = 5) -> List[Dict]:
+        """Users with the most generated images, videos and messages in the last days"""
+        def counted(activity_type):
+            return func.sum(case((UserActivity.activity_type == activity_type, 1), else_=0))
+
+        images, videos, messages = counted('image_generated'), counted('video_generated'), counted('message_sent')
+        rows = db.session.query(User.username, images, videos, messages).join(
+            UserActivity, UserActivity.user_id == User.id
+        ).filter(
+            UserActivity.created_at >= datetime.utcnow() - timedelta(days=days)
+        ).group_by(User.id, User.username).having(
+            images + videos + messages > 0
+        ).order_by(desc(images + videos + messages)).limit(limit).all()
+        return [{'username': r[0], 'images': r[1], 'videos': r[2], 'messages': r[3]} for r in rows]
+
+    def list_users_with_stats(self) -> List[Dict]:
+        """All users, newest first, with activity and active session counts"""
+        activity_count = db.session.query(func.count(UserActivity.id)).filter(
+            UserActivity.user_id == User.id).correlate(User).scalar_subquery()
+        active_sessions = db.session.query(func.count(UserSession.id)).filter(
+            UserSession.user_id == User.id, UserSession.is_active == True).correlate(User).scalar_subquery()
+        rows = db.session.query(
+            User.id, User.username, User.email, User.full_name, User.is_active, User.is_admin,
+            User.created_at, User.last_login,
+            activity_count.label('activity_count'), active_sessions.label('active_sessions')
+        ).order_by(desc(User.created_at)).all()
+        return [{**row._mapping, 'created_at': format_timestamp(row.created_at),
+                 'last_login': format_timestamp(row.last_login)} for row in rows]
+
+    def get_activity_summary(self, active_days: int = 7, recent_limit: int = 50) -> Dict:
+        """User totals, recently active users, latest activity and activity counts by type"""
+        recent = db.session.query(UserActivity, User.username, User.email).join(
+            User, UserActivity.user_id == User.id
+        ).order_by(desc(UserActivity.created_at)).limit(recent_limit).all()
+        by_type = db.session.query(UserActivity.activity_type, func.count(UserActivity.id).label('count')).group_by(
+            UserActivity.activity_type
+        ).order_by(desc('count')).all()
+
+        return {
+            'total_users': db.session.query(func.count(User.id)).scalar(),
+            'active_users': db.session.query(func.count(User.id)).filter(
+                User.last_login > datetime.utcnow() - timedelta(days=active_days)).scalar(),
+            'recent_activity': [{
+                'id': activity.id,
+                'user_id': activity.user_id,
+                'activity_type': activity.activity_type,
+                'activity_data': activity.activity_data,
+                'ip_address': activity.ip_address,
+                'created_at': format_timestamp(activity.created_at),
+                'username': username,
+                'email': email
+            } for activity, username, email in recent],
+            'activity_by_type': [{'activity_type': row[0], 'count': row[1]} for row in by_type]
+        }
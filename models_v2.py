@@ -4,11 +4,15 @@ Uses SQLAlchemy ORM for better database abstraction and migration support.
 """
 
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import and_, event, insert, update
 from datetime import datetime, timedelta
 import hashlib
 import secrets
 import json
 from typing import Optional, Dict, List
+from config import get_config
+
+config = get_config()
 
 db = SQLAlchemy()
 
@@ -198,6 +202,28 @@ class DailyUsage(db.Model):
     def __repr__(self):
         return f'<DailyUsage user {self.user_id} on {self.date}>'
 
+class UsageRollup(db.Model):
+    """Usage and signups pre-aggregated per hour/day bucket (UTC) and tier"""
+    __tablename__ = 'usage_rollups'
+
+    id = db.Column(db.Integer, primary_key=True)
+    granularity = db.Column(db.String(10), nullable=False)  # hour, day
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    tier = db.Column(db.String(20), nullable=False)  # guest, free, pro, enterprise
+
+    signups = db.Column(db.Integer, nullable=False, default=0)
+    messages = db.Column(db.Integer, nullable=False, default=0)
+    images = db.Column(db.Integer, nullable=False, default=0)
+    videos = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # Also serves range scans: granularity = ? AND bucket_start BETWEEN ? AND ?
+        db.UniqueConstraint('granularity', 'bucket_start', 'tier', name='unique_rollup_bucket'),
+    )
+
+    def __repr__(self):
+        return f'<UsageRollup {self.granularity} {self.bucket_start} {self.tier}>'
+
 class UploadedFile(db.Model):
     """Track uploaded files across workers using database (solves multi-worker issue)"""
     __tablename__ = 'uploaded_files'
@@ -253,9 +279,60 @@ def verify_password(password: str, password_hash: str) -> bool:
     except:
         return False
 
+def increment_counters(executor, model, rows: List[Dict], keys: List[str], counters: List[str],
+                       replace: List[str] = ()) -> None:
+    """
+    Add counts to rows identified by unique keys, inserting rows that don't exist yet
+
+    Args:
+        executor: db.session or a Connection (e.g. inside a mapper event)
+        model: Model with a unique constraint over keys
+        rows: Dicts with the keys, counter deltas and replace columns
+        keys: Columns of the unique constraint
+        counters: Columns incremented by the row's value
+        replace: Columns overwritten with the row's value
+    """
+    if not rows:
+        return
+    table = model.__table__
+    dialect = executor.dialect.name if hasattr(executor, 'dialect') else executor.get_bind().dialect.name
+
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        statement = upsert(table).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=keys,
+            set_={**{column: table.c[column] + statement.excluded[column] for column in counters},
+                  **{column: statement.excluded[column] for column in replace}})
+        executor.execute(statement)
+        return
+
+    # No portable UPSERT - update, then insert what didn't exist
+    for row in rows:
+        result = executor.execute(update(table).where(and_(*(table.c[key] == row[key] for key in keys))).values(
+            {**{column: table.c[column] + row[column] for column in counters},
+             **{column: row[column] for column in replace}}))
+        if result.rowcount == 0:
+            executor.execute(insert(table).values(row))
+
+def _tune_sqlite_connection(dbapi_connection, connection_record):
+    """WAL mode (readers don't block the writer), busy timeout and page cache for each pooled connection"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute(f'PRAGMA synchronous={config.USER_DB_SYNCHRONOUS}')
+    cursor.execute(f'PRAGMA cache_size=-{config.USER_DB_CACHE_KB}')
+    cursor.execute(f'PRAGMA busy_timeout={int(config.USER_DB_BUSY_TIMEOUT * 1000)}')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.close()
+
 def init_db(app):
     """Initialize database with Flask app"""
     db.init_app(app)
     with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            event.listen(db.engine, 'connect', _tune_sqlite_connection)
         db.create_all()
         print(f"Database initialized: {app.config['SQLALCHEMY_DATABASE_URI']}")
@@ -0,0 +1,117 @@
+"""
+Prerendered page cache for AIezzy's static SEO landing pages.
+Each template is rendered once (pre-fork, or on first hit), kept in memory with
+precompressed gzip/brotli variants and a strong content-hash ETag, so requests
+are answered without any template work and revalidations get a 304.
+"""
+
+import hashlib
+import threading
+from typing import Dict
+from flask import Response, render_template, request
+from compression import available_encodings, compress, negotiate
+from config import get_config
+
+config = get_config()
+
+class PageCache:
+    """In-memory rendered pages keyed by template name"""
+
+    def __init__(self, max_age: int = None):
+        self.max_age = max_age if max_age is not None else config.LANDING_PAGE_MAX_AGE
+        self.enabled = config.LANDING_PAGE_CACHE_ENABLED
+
+        # template -> {'etag': str, 'variants': {None|'gzip'|'br': bytes}}
+        self._pages = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'renders': 0, 'not_modified': 0}
+
+    def _render(self, template_name: str) -> Dict:
+        """Render a template and precompute its encoded variants"""
+        body = render_template(template_name).encode('utf-8')
+        page = {
+            'etag': hashlib.sha256(body).hexdigest()[:32],
+            'variants': {None: body}
+        }
+        for encoding in available_encodings():
+            page['variants'][encoding] = compress(body, encoding, best=True)
+        self.stats['renders'] += 1
+        return page
+
+    def get(self, template_name: str) -> Dict:
+        """Cached page, rendering it on first use"""
+        page = self._pages.get(template_name)
+        if page is None:
+            with self._lock:
+                page = self._pages.get(template_name)
+                if page is None:
+                    page = self._render(template_name)
+                    self._pages[template_name] = page
+        else:
+            self.stats['hits'] += 1
+        return page
+
+    def prerender(self, flask_app, prefix: str = 'landing/') -> int:
+        """
+        Render every template under prefix ahead of time (e.g. before fork)
+
+        Returns:
+            int: Number of pages rendered
+        """
+        if not self.enabled:
+            return 0
+        names = [n for n in flask_app.jinja_env.list_templates(extensions=['html']) if n.startswith(prefix)]
+        with flask_app.test_request_context('/'):
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    print(f"PAGE_CACHE: Could not prerender {name}: {e}")
+        return len(names)
+
+    def serve(self, template_name: str) -> Response:
+        """
+        Response for a cached page, honouring If-None-Match and Accept-Encoding
+
+        Raises:
+            jinja2.TemplateNotFound: If the template does not exist
+        """
+        if not self.enabled:
+            return render_template(template_name)
+
+        page = self.get(template_name)
+        encoding = negotiate(request.headers.get('Accept-Encoding', ''), [e for e in page['variants'] if e])
+        etag = page['etag'] if encoding is None else f"{page['etag']}-{encoding}"
+
+        # Any variant's ETag means the client already has this exact page
+        if any(request.if_none_match.contains_weak(page['etag'] if e is None else f"{page['etag']}-{e}")
+               for e in page['variants']):
+            self.stats['not_modified'] += 1
+            response = Response(status=304)
+        else:
+            response = Response(page['variants'][encoding], mimetype='text/html')
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+
+        response.set_etag(etag)
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        return response
+
+    def clear(self) -> None:
+        """Drop all rendered pages (e.g. after templates change)"""
+        with self._lock:
+            self._pages.clear()
+
+    def get_stats(self) -> Dict:
+        """Hit counters and cached bytes per encoding"""
+        sizes = {}
+        for page in list(self._pages.values()):
+            for encoding, body in page['variants'].items():
+                key = encoding or 'identity'
+                sizes[key] = sizes.get(key, 0) + len(body)
+        return {**self.stats, 'pages': len(self._pages), 'bytes': sizes}
+
+# Global page cache instance
+page_cache = PageCache()
@@ -0,0 +1,113 @@
+"""
+Pre-fork warm-up and per-worker initialization for AIezzy under gunicorn.
+With preload_app the gunicorn master imports web_app (and with it the compiled
+LangGraph coordinator) once. warm_shared_state() then builds the remaining
+read-only state in the master so every worker - including ones recycled by
+max_requests - inherits it copy-on-write. init_worker() creates the mutable,
+fork-unsafe pieces (DB connections, background threads) inside each worker.
+"""
+
+import gc
+import os
+import time
+from typing import Dict
+
+def memory_usage(pid: int = None) -> Dict:
+    """
+    RSS / PSS / shared memory of a process in MB (Linux /proc, empty elsewhere)
+
+    PSS splits shared copy-on-write pages across the processes using them,
+    so it is the honest per-worker cost under preload_app.
+    """
+    pid = pid or os.getpid()
+    usage = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty'):
+                    usage[key] = int(value.split()[0]) / 1024
+    except OSError:
+        return usage
+
+    return {
+        'rss_mb': round(usage.get('Rss', 0), 1),
+        'pss_mb': round(usage.get('Pss', 0), 1),
+        'shared_mb': round(usage.get('Shared_Clean', 0) + usage.get('Shared_Dirty', 0), 1),
+        'private_mb': round(usage.get('Private_Clean', 0) + usage.get('Private_Dirty', 0), 1)
+    }
+
+def warm_shared_state(flask_app) -> Dict:
+    """
+    Build immutable state before workers fork (call once, in the master)
+
+    Args:
+        flask_app: The Flask application
+
+    Returns:
+        dict: Milliseconds spent per warm-up step
+    """
+    from page_cache import page_cache
+    from tool_registry import tool_registry
+
+    timings = {}
+
+    # Heavy tool libraries - imported once here instead of once per worker on first use
+    start = time.perf_counter()
+    tool_registry.preload()
+    timings['tool_modules'] = (time.perf_counter() - start) * 1000
+
+    # Compile every Jinja template into the environment's cache
+    start = time.perf_counter()
+    templates = flask_app.jinja_env.list_templates(extensions=['html', 'xml', 'txt'])
+    for name in templates:
+        try:
+            flask_app.jinja_env.get_template(name)
+        except Exception as e:
+            print(f"PREFORK: Could not compile template {name}: {e}")
+    timings['templates'] = (time.perf_counter() - start) * 1000
+
+    # Render static landing pages (with gzip/brotli variants) once for all workers
+    start = time.perf_counter()
+    pages = page_cache.prerender(flask_app)
+    timings['landing_pages'] = (time.perf_counter() - start) * 1000
+
+    # Move everything built so far out of the GC's reach - collections in the workers
+    # would otherwise write to these objects' headers and unshare their pages
+    start = time.perf_counter()
+    gc.collect()
+    gc.freeze()
+    timings['gc_freeze'] = (time.perf_counter() - start) * 1000
+
+    print(f"PREFORK: Warmed {len(templates)} templates, {pages} landing pages, {len(tool_registry.get_stats())} tool modules "
+          f"({', '.join(f'{k} {v:.0f}ms' for k, v in timings.items())}), {gc.get_freeze_count()} objects frozen")
+    return timings
+
+def init_worker(flask_app) -> None:
+    """
+    Create per-worker mutable state (call in each worker after fork)
+
+    Args:
+        flask_app: The Flask application
+    """
+    from models_v2 import db
+    from retention import retention_sweeper
+    from usage_buffer import usage_buffer
+    from video_jobs import video_jobs
+
+    # Pooled connections inherited from the master must not be shared across processes
+    with flask_app.app_context():
+        db.engine.dispose(close=False)
+
+    # Threads don't survive fork - restart polling for jobs left pending
+    # (workers take turns polling via a lock file; downloads are claimed atomically)
+    video_jobs.resume_pending()
+
+    # Own usage log and flusher; also replays logs left by workers that died
+    if usage_buffer.enabled:
+        usage_buffer.start()
+
+    # Retention sweeps (workers take turns via a lock file)
+    retention_sweeper.start()
+
+    print(f"PREFORK: Worker {os.getpid()} initialized, memory {memory_usage()}")
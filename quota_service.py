@@ -1,16 +1,34 @@
 """
 Usage tracking and quota management for AIezzy.
-Tracks API usage and enforces tier-based limits.
+Tracks API usage and enforces tier-based limits. Usage is written behind
+through usage_buffer once it is attached to the app; quota reads include the
+counts it has not flushed yet.
+
+Quota decisions read a per-user state (tier plus today's counters) from
+quota_cache: loaded with one query, updated in place by log_usage() and
+dropped when the tier changes or usage is reset, so hot endpoints check quota
+without a database round trip. Usage recorded by other workers becomes
+visible when the entry expires (QUOTA_CACHE_TTL).
 """
 
+import threading
 from datetime import datetime, date, timedelta
 from typing import Dict, Optional
 from models_v2 import db, User, UsageLog, DailyUsage
+from analytics_service import analytics_service
+from bounded_cache import BoundedCache
 from config import get_config
-from sqlalchemy import func
+from sqlalchemy import and_, func, select
+from usage_buffer import usage_buffer, check_usage_event
 
 config = get_config()
 
+RESOURCE_TYPES = ('image', 'video', 'message')
+
+# user_id -> {'tier', 'day', 'usage': {resource_type: count}}
+quota_cache = BoundedCache('quota_state', max_entries=config.QUOTA_CACHE_MAX_ENTRIES,
+                           max_bytes=config.QUOTA_CACHE_MAX_ENTRIES * 256, ttl=config.QUOTA_CACHE_TTL)
+
 class QuotaService:
     """Service for tracking usage and enforcing quotas"""
 
@@ -39,7 +57,60 @@ class QuotaService:
     }
 
     def __init__(self):
-        pass
+        # Serializes loading a user's state with recording usage, so a load that already
+        # sees an event can't also have that event added to it afterwards
+        self._state_lock = threading.Lock()
+
+    def get_limit(self, tier: str, resource_type: str) -> int:
+        """Daily limit of a tier for a resource type ('image' or 'images')"""
+        limits = self.TIER_LIMITS.get(tier, self.TIER_LIMITS['free'])
+        return limits.get(f'{resource_type}s', limits.get(resource_type, 0))
+
+    def _load_quota_state(self, user_id: int, today: date) -> Dict:
+        """Tier and today's counters in one query, plus this worker's unflushed usage"""
+        row = db.session.execute(
+            select(User.tier, DailyUsage.images_generated, DailyUsage.videos_created, DailyUsage.messages_sent)
+            .outerjoin(DailyUsage, and_(DailyUsage.user_id == User.id, DailyUsage.date == today))
+            .where(User.id == user_id)
+        ).first()
+        tier, images, videos, messages = row if row else ('free', 0, 0, 0)
+
+        usage = {'image': images or 0, 'video': videos or 0, 'message': messages or 0}
+        for resource_type in RESOURCE_TYPES:
+            usage[resource_type] += usage_buffer.pending_usage(user_id, resource_type, today, today)
+        return {'tier': tier or 'free', 'day': today.isoformat(), 'usage': usage}
+
+    def get_quota_state(self, user_id: Optional[int]) -> Dict:
+        """
+        Tier and today's usage for quota decisions (cached per user)
+
+        Args:
+            user_id: User ID (None for guests)
+
+        Returns:
+            dict: {'tier': str, 'day': ISO date, 'usage': {resource_type: count}}
+        """
+        today = date.today()
+        if not user_id:
+            # Guests aren't tracked persistently
+            return {'tier': 'guest', 'day': today.isoformat(), 'usage': dict.fromkeys(RESOURCE_TYPES, 0)}
+
+        state = quota_cache.get(user_id)
+        if state is None or state['day'] != today.isoformat():
+            with self._state_lock:
+                state = quota_cache.get(user_id)
+                if state is None or state['day'] != today.isoformat():
+                    state = self._load_quota_state(user_id, today)
+                    quota_cache.set(user_id, state)
+        return state
+
+    def _count_cached_usage(self, user_id: Optional[int], resource_type: str, count: int) -> None:
+        """Apply logged usage to the user's cached quota state, if any (caller holds _state_lock)"""
+        if not user_id:
+            return
+        state = quota_cache.get(user_id)
+        if state is not None and state['day'] == date.today().isoformat() and resource_type in state['usage']:
+            state['usage'][resource_type] += count
 
     def log_usage(self, user_id: Optional[int], resource_type: str, count: int = 1, metadata: Dict = None) -> bool:
         """
@@ -52,20 +123,32 @@ class QuotaService:
             metadata: Additional metadata (JSON)
 
         Returns:
-            bool: True if logged successfully
+            bool: True if logged (or buffered) successfully
+
+        Raises:
+            ValueError: Unknown resource_type or a count that isn't a non-negative int
         """
+        check_usage_event(resource_type, count)
+        if usage_buffer.enabled:
+            try:
+                with self._state_lock:
+                    usage_buffer.record(user_id, resource_type, count, metadata)
+                    self._count_cached_usage(user_id, resource_type, count)
+                return True
+            except Exception as e:
+                # Log unwritable - fall back to writing the database directly
+                print(f"Error buffering usage: {e}")
+
         try:
-            # Create usage log entry
-            usage_log = UsageLog(
-                user_id=user_id if user_id else 0,  # 0 for guests
-                resource_type=resource_type,
-                resource_count=count,
-                resource_metadata=str(metadata) if metadata else None
-            )
-            db.session.add(usage_log)
-
-            # Update daily usage aggregate
+            # Update the usage log and daily aggregate (guests only count toward the rollups)
             if user_id:
+                db.session.add(UsageLog(
+                    user_id=user_id,
+                    resource_type=resource_type,
+                    resource_count=count,
+                    resource_metadata=str(metadata) if metadata else None
+                ))
+
                 today = date.today()
                 daily_usage = DailyUsage.query.filter_by(
                     user_id=user_id,
@@ -84,7 +167,10 @@ class QuotaService:
                 elif resource_type == 'message':
                     daily_usage.messages_sent += count
 
-            db.session.commit()
+            analytics_service.record_usage([(user_id or 0, resource_type, count, datetime.utcnow())])
+            with self._state_lock:
+                db.session.commit()
+                self._count_cached_usage(user_id, resource_type, count)
             return True
 
         except Exception as e:
@@ -124,7 +210,7 @@ class QuotaService:
                 DailyUsage.date <= end_date
             ).scalar()
 
-            return usage or 0
+            return (usage or 0) + usage_buffer.pending_usage(user_id, resource_type, start_date, end_date)
 
         except Exception as e:
             print(f"Error getting daily usage: {e}")
@@ -148,19 +234,11 @@ class QuotaService:
                 'message': str (if not allowed)
             }
         """
-        # Get user tier
-        if user_id:
-            user = User.query.get(user_id)
-            tier = user.tier if user else 'free'
-        else:
-            tier = 'guest'
-
-        # Get tier limits
-        limits = self.TIER_LIMITS.get(tier, self.TIER_LIMITS['free'])
-        limit = limits.get(resource_type, 0)
-
-        # Get current usage
-        current_usage = self.get_daily_usage(user_id, resource_type, days=1)
+        # Tier and today's usage - from the cache on hot paths
+        state = self.get_quota_state(user_id)
+        tier = state['tier']
+        limit = self.get_limit(tier, resource_type)
+        current_usage = state['usage'].get(resource_type, 0)
 
         # Calculate remaining
         remaining = max(0, limit - current_usage)
@@ -191,12 +269,8 @@ class QuotaService:
         Returns:
             dict: Complete quota status
         """
-        if not user_id:
-            tier = 'guest'
-        else:
-            user = User.query.get(user_id)
-            tier = user.tier if user else 'free'
-
+        state = self.get_quota_state(user_id)
+        tier = state['tier']
         limits = self.TIER_LIMITS.get(tier, self.TIER_LIMITS['free'])
 
         status = {
@@ -206,9 +280,9 @@ class QuotaService:
             'remaining': {}
         }
 
-        for resource_type in ['image', 'video', 'message']:
-            usage = self.get_daily_usage(user_id, resource_type, days=1)
-            limit = limits.get(f'{resource_type}s', limits.get(resource_type, 0))
+        for resource_type in RESOURCE_TYPES:
+            usage = state['usage'][resource_type]
+            limit = self.get_limit(tier, resource_type)
             remaining = max(0, limit - usage)
 
             status['usage'][resource_type] = usage
@@ -227,6 +301,9 @@ class QuotaService:
             bool: True if successful
         """
         try:
+            # Buffered usage would otherwise land on top of the reset
+            usage_buffer.flush()
+
             today = date.today()
             daily_usage = DailyUsage.query.filter_by(
                 user_id=user_id,
@@ -239,6 +316,7 @@ class QuotaService:
                 daily_usage.messages_sent = 0
                 db.session.commit()
 
+            quota_cache.invalidate(user_id)
             return True
 
         except Exception as e:
@@ -267,6 +345,8 @@ class QuotaService:
 
             user.tier = new_tier
             db.session.commit()
+            # Limits change with the tier
+            quota_cache.invalidate(user_id)
             return True
 
         except Exception as e:
@@ -0,0 +1,270 @@
+"""
+Rate limiting for AIezzy.
+Each limit is a sliding window approximated from two fixed-window counters
+(the current window plus the previous one weighted by how much of it still
+overlaps), so a check is one counter increment and one read no matter how
+busy the key is. Counters live in a pluggable backend:
+
+    memory  - per worker (limits multiply with the number of workers)
+    sqlite  - one file shared by all workers on the host (RATE_LIMIT_DB)
+    redis   - shared across hosts; RATE_LIMIT_REDIS_URL=fake:// uses fake_redis.FakeRedis
+
+init_rate_limiting() applies RATE_LIMIT_RULES to chat, upload and auth
+endpoints as a before_request hook and answers 429 with Retry-After.
+"""
+
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+from flask import jsonify, request
+from bounded_cache import BoundedCache
+from config import get_config
+
+config = get_config()
+
+# name -> path prefixes, who is counted ('user' falls back to the IP for guests), [(limit, window seconds)]
+RATE_LIMIT_RULES = {
+    'auth': {
+        'prefixes': ('/api/login', '/api/register', '/api/user/change-password', '/api/v2/login',
+                     '/api/v2/register', '/api/v2/forgot-password', '/api/v2/reset-password'),
+        'scope': 'ip',
+        'limits': [(config.RATE_LIMIT_AUTH_PER_MINUTE, 60)]
+    },
+    'chat': {
+        'prefixes': ('/api/chat',),
+        'scope': 'user',
+        'limits': [(config.RATE_LIMIT_PER_MINUTE, 60), (config.RATE_LIMIT_PER_HOUR, 3600)]
+    },
+    'upload': {
+        'prefixes': ('/api/upload-',),
+        'scope': 'user',
+        'limits': [(config.RATE_LIMIT_UPLOAD_PER_MINUTE, 60)]
+    }
+}
+
+def match_rule(path: str) -> Optional[str]:
+    """Name of the rule covering a request path, if any"""
+    for name, rule in RATE_LIMIT_RULES.items():
+        if path.startswith(rule['prefixes']):
+            return name
+    return None
+
+class MemoryBackend:
+    """Counters in this process only"""
+
+    name = 'memory'
+
+    def __init__(self, max_keys: int = 100000):
+        self._counters = BoundedCache('rate_limits', max_entries=max_keys, max_bytes=max_keys * 128,
+                                      sizeof=lambda value: 128)
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, window: int, start: int) -> Tuple[int, int]:
+        """
+        Count one request in the window starting at start
+
+        Returns:
+            tuple: (count in the current window including this one, count in the previous window)
+        """
+        with self._lock:
+            current = self._counters.get((key, start), 0) + 1
+            self._counters.set((key, start), current, ttl=2 * window)
+            return current, self._counters.get((key, start - window), 0)
+
+class SQLiteBackend:
+    """Counters in a SQLite file shared by every worker on the host"""
+
+    name = 'sqlite'
+
+    # Expired rows are swept every N hits per process
+    CLEANUP_EVERY = 1000
+
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or config.RATE_LIMIT_DB
+        self._local = threading.local()
+        self._hits = 0
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = self._connection()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                key TEXT NOT NULL,
+                window_start INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                expires_at INTEGER NOT NULL,
+                PRIMARY KEY (key, window_start)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_rate_limits_expires ON rate_limits (expires_at)')
+
+    def _connection(self) -> sqlite3.Connection:
+        """One autocommit connection per thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=config.USER_DB_BUSY_TIMEOUT, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def hit(self, key: str, window: int, start: int) -> Tuple[int, int]:
+        conn = self._connection()
+        current = conn.execute('''
+            INSERT INTO rate_limits (key, window_start, count, expires_at) VALUES (?, ?, 1, ?)
+            ON CONFLICT (key, window_start) DO UPDATE SET count = count + 1
+            RETURNING count
+        ''', (key, start, start + 2 * window)).fetchone()[0]
+        previous = conn.execute('SELECT count FROM rate_limits WHERE key = ? AND window_start = ?',
+                                (key, start - window)).fetchone()
+
+        self._hits += 1
+        if self._hits % self.CLEANUP_EVERY == 0:
+            conn.execute('DELETE FROM rate_limits WHERE expires_at < ?', (int(time.time()),))
+        return current, previous[0] if previous else 0
+
+class RedisBackend:
+    """Counters in Redis (or anything speaking its INCR/EXPIRE/GET), shared across hosts"""
+
+    name = 'redis'
+
+    def __init__(self, client=None, url: str = None):
+        """
+        Args:
+            client: Redis-compatible client; built from url when omitted
+            url: redis:// URL, or fake:// for the in-process fake_redis.FakeRedis
+        """
+        if client is None:
+            url = url or config.RATE_LIMIT_REDIS_URL
+            if url.startswith('fake://'):
+                from fake_redis import FakeRedis
+                client = FakeRedis()
+            else:
+                import redis
+                client = redis.Redis.from_url(url)
+        self.client = client
+
+    def hit(self, key: str, window: int, start: int) -> Tuple[int, int]:
+        current_key = f"ratelimit:{key}:{start}"
+        pipe = self.client.pipeline()
+        pipe.incr(current_key)
+        pipe.expire(current_key, 2 * window)
+        pipe.get(f"ratelimit:{key}:{start - window}")
+        current, _, previous = pipe.execute()
+        return int(current), int(previous or 0)
+
+BACKENDS = {'memory': MemoryBackend, 'sqlite': SQLiteBackend, 'redis': RedisBackend}
+
+class RateLimiter:
+    """Sliding-window limits over a counter backend"""
+
+    def __init__(self, backend=None, enabled: bool = None):
+        self.enabled = config.RATE_LIMIT_ENABLED if enabled is None else enabled
+        self._backend = backend
+        self._lock = threading.Lock()
+        self.stats = {'allowed': 0, 'limited': 0, 'errors': 0}
+        self.limited_by_rule: Dict[str, int] = {}
+
+    @property
+    def backend(self):
+        """Backend from RATE_LIMIT_BACKEND, created on first use"""
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = BACKENDS[config.RATE_LIMIT_BACKEND]()
+        return self._backend
+
+    def hit(self, key: str, limit: int, window: int, now: float = None) -> Tuple[bool, int]:
+        """
+        Count a request against one limit
+
+        Args:
+            key: Who and what is being limited, e.g. 'chat:user:42'
+            limit: Requests allowed per window
+            window: Window length in seconds
+            now: Current time (for tests)
+
+        Returns:
+            tuple: (allowed, seconds until a request would be allowed again - 0 if allowed)
+
+        Backend errors fail open: the request is allowed and counted in stats['errors'].
+        """
+        now = time.time() if now is None else now
+        start = int(now // window * window)
+        try:
+            current, previous = self.backend.hit(f"{key}:{window}", window, start)
+        except Exception as e:
+            self.stats['errors'] += 1
+            print(f"RATE_LIMIT: Backend error, allowing request: {e}")
+            return True, 0
+
+        # previous * overlap + current <= limit, where overlap is the share of the previous
+        # window still inside the sliding window - scaled by window so whole seconds stay exact
+        if previous * (start + window - now) + current * window <= limit * window:
+            return True, 0
+
+        # Assuming no more requests arrive, when the next one (+1) would fit
+        if current < limit:
+            # Later in this window, once the previous window's weight has decayed enough
+            retry_at = start + window - (limit - current - 1) * window / previous
+        else:
+            # In the next window, where this window's count becomes the decaying previous one
+            retry_at = start + 2 * window - (limit - 1) * window / current
+        return False, max(1, math.ceil(retry_at - now))
+
+    def check(self, rule_name: str, identity: str, now: float = None) -> int:
+        """Count a request under a rule; 0 if allowed, otherwise seconds to wait"""
+        retry_after = 0
+        for limit, window in RATE_LIMIT_RULES[rule_name]['limits']:
+            allowed, wait = self.hit(f"{rule_name}:{identity}", limit, window, now)
+            if not allowed:
+                retry_after = max(retry_after, wait)
+
+        if retry_after:
+            self.stats['limited'] += 1
+            self.limited_by_rule[rule_name] = self.limited_by_rule.get(rule_name, 0) + 1
+        else:
+            self.stats['allowed'] += 1
+        return retry_after
+
+    def get_stats(self) -> Dict:
+        """Allowed/limited counters for this worker"""
+        return {**self.stats, 'limited_by_rule': dict(self.limited_by_rule),
+                'backend': config.RATE_LIMIT_BACKEND if self._backend is None else self._backend.name,
+                'enabled': self.enabled}
+
+def init_rate_limiting(flask_app, current_user: Callable[[], Optional[Dict]], client_ip: Callable[[], str]) -> None:
+    """
+    Enforce RATE_LIMIT_RULES before matching requests reach their view
+
+    Args:
+        flask_app: Flask application
+        current_user: Returns the signed-in user dict or None
+        client_ip: Returns the caller's IP address
+    """
+    if not rate_limiter.enabled:
+        return
+
+    @flask_app.before_request
+    def enforce_rate_limits():
+        rule_name = match_rule(request.path)
+        if rule_name is None:
+            return None
+
+        user = current_user() if RATE_LIMIT_RULES[rule_name]['scope'] == 'user' else None
+        identity = f"user:{user['id']}" if user else f"ip:{client_ip()}"
+        retry_after = rate_limiter.check(rule_name, identity)
+        if not retry_after:
+            return None
+
+        print(f"RATE_LIMIT: {rule_name} limit reached for {identity}, retry in {retry_after}s")
+        response = jsonify({'error': 'Too many requests. Please slow down and try again shortly.',
+                            'retry_after': retry_after})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+
+# Global rate limiter instance
+rate_limiter = RateLimiter()
@@ -0,0 +1,445 @@
+"""
+Retention for AIezzy's uploaded and generated files.
+Files in the upload, asset, video and document directories expire after a
+per-category TTL (shorter for per-step intermediates such as PDF page images
+and split parts) scaled by the owner's tier. UploadedFile rows get expires_at
+from the uploader's tier when created. Generated files (images, videos,
+converted documents) have no row: record_owner() notes the requester's tier
+when a response first links them, and files on disk with no live row are
+judged by age with that tier - the most generous tier when no owner is known.
+
+A background sweeper (one worker at a time, elected with a lock file) deletes
+expired files and rows in batches, pausing between batches so the volume stays
+responsive. Files referenced by saved or shared conversations, permanent links
+or a live UploadedFile row are never deleted, nor is the video of a job whose
+placeholder a conversation still shows. References are found by scanning those
+sources for media URLs and video job IDs; each source is rescanned only when it
+changes. Finished video jobs no conversation references are purged.
+
+Each sweep also drops abandoned chunked-upload sessions and ends with
+blob_store.collect_garbage(), removing blobs whose last linked path is gone.
+sweep(dry_run=True) reports what would be deleted without touching anything.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import unquote
+from sqlalchemy import delete, select
+from blob_store import blob_store
+from bounded_cache import file_version
+from config import get_config
+from upload_sessions import upload_sessions
+from video_jobs import video_jobs
+
+try:
+    import fcntl
+except ImportError:  # Windows - every worker may sweep
+    fcntl = None
+
+config = get_config()
+
+# Directories the sweeper manages, by category
+CATEGORY_DIRS = {
+    'uploads': config.UPLOAD_FOLDER,
+    'assets': config.ASSETS_DIR,
+    'videos': config.VIDEOS_DIR,
+    'documents': config.DOCUMENTS_DIR
+}
+
+# Free-tier TTL per category, in days
+RETENTION_DAYS = {
+    'uploads': config.RETENTION_UPLOADS_DAYS,
+    'assets': config.RETENTION_ASSETS_DAYS,
+    'videos': config.RETENTION_VIDEOS_DAYS,
+    'documents': config.RETENTION_DOCUMENTS_DAYS,
+    'intermediate': config.RETENTION_INTERMEDIATE_DAYS
+}
+
+# TTL multiplier per tier
+TIER_MULTIPLIERS = {
+    'guest': config.RETENTION_GUEST_MULTIPLIER,
+    'free': 1,
+    'pro': config.RETENTION_PRO_MULTIPLIER,
+    'enterprise': config.RETENTION_ENTERPRISE_MULTIPLIER
+}
+
+# Loose files nobody recorded an owner for are kept as long as any owner's would be
+UNKNOWN_OWNER_TIER = max(TIER_MULTIPLIERS, key=TIER_MULTIPLIERS.get)
+
+# Per-step outputs: PDF page images (<name>_page_3.png) and split parts (<name>_part2_pages1-4.pdf)
+INTERMEDIATE_PATTERN = re.compile(r'_page_\d+\.\w+$|_part\d+_pages?\d')
+
+# Media paths in conversation JSON/HTML: /assets/x.png, assets/x.png, https://host/videos/y.mp4, /app/data/uploads/z.pdf
+MEDIA_REFERENCE = re.compile(r'(?<![\w.-])(uploads|assets|videos|documents)/([^\s"\'<>()?#\\]+)')
+
+# Video job placeholders not yet replaced by the player (quotes are escaped inside JSON)
+VIDEO_JOB_REFERENCE = re.compile(r'class=\\?"video-job\\?" data-job-id=\\?"([0-9a-f]+)')
+
+# Shared conversations are written relative to the working directory by web_app
+SHARED_DIR = 'shared'
+PERMANENT_FILES_DB = os.path.join(config.DATA_DIR, 'permanent_files.json')
+
+def file_category(category: str, filename: str) -> str:
+    """Policy category of a file in a managed directory"""
+    return 'intermediate' if INTERMEDIATE_PATTERN.search(filename) else category
+
+def retention_seconds(category: str, tier: str = 'free') -> float:
+    """How long a file of this category and owner tier is kept"""
+    return RETENTION_DAYS[category] * TIER_MULTIPLIERS.get(tier, 1) * 86400
+
+def current_tier() -> str:
+    """Tier of the user making the current request ('free' outside requests)"""
+    from flask import has_request_context
+    if not has_request_context():
+        return 'free'
+    from auth import get_current_user
+    from quota_service import quota_service
+    user = get_current_user()
+    return quota_service.get_quota_state(user['id'])['tier'] if user else 'guest'
+
+class RetentionSweeper:
+    """Finds and deletes expired files and UploadedFile rows"""
+
+    def __init__(self, category_dirs: Dict[str, str] = None, batch_size: int = None, interval: int = None,
+                 owners_path: str = None):
+        self.category_dirs = category_dirs or CATEGORY_DIRS
+        self.owners_path = owners_path or config.RETENTION_OWNERS_DB
+        self._local = threading.local()
+        self.batch_size = batch_size or config.RETENTION_BATCH_SIZE
+        self.interval = interval or config.RETENTION_SWEEP_INTERVAL
+        self.app = None
+        self._pid = None
+        self._lock = threading.Lock()  # Guards _references (background and admin dry-run sweeps)
+        # source path -> (file version, {(category, filename)}, {video job ID})
+        self._references: Dict[str, Tuple[tuple, frozenset, frozenset]] = {}
+        self.stats = {'sweeps': 0, 'files_deleted': 0, 'bytes_freed': 0, 'rows_deleted': 0, 'errors': 0,
+                      'last_sweep_at': None, 'last_duration_ms': None}
+
+    def init_app(self, flask_app) -> None:
+        """Use flask_app's database; start() runs the sweeper in each worker"""
+        self.app = flask_app
+
+    def start(self) -> None:
+        """Start this process's sweeper thread (again after a fork); idempotent"""
+        if not config.RETENTION_ENABLED or self.app is None or self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        threading.Thread(target=self._run, name='retention-sweeper', daemon=True).start()
+
+    def _run(self) -> None:
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.interval)
+            try:
+                with self.app.app_context():
+                    self.sweep(if_due=True)
+            except Exception as e:
+                self.stats['errors'] += 1
+                print(f"RETENTION: Sweep failed: {e}")
+
+    def expiry_for(self, file_path: str, tier: str = None) -> Optional[datetime]:
+        """expires_at for a new UploadedFile row (None outside the managed directories)"""
+        category = self._classify(file_path)
+        if category is None:
+            return None
+        tier = tier or current_tier()
+        return datetime.utcnow() + timedelta(seconds=retention_seconds(file_category(category, os.path.basename(file_path)), tier))
+
+    def _classify(self, path: str) -> Optional[str]:
+        """Managed category whose directory directly contains path"""
+        parent = os.path.dirname(os.path.realpath(path))
+        for category, directory in self.category_dirs.items():
+            if parent == os.path.realpath(directory):
+                return category
+        return None
+
+    # ---- Owners of generated files ----
+
+    def _owners(self) -> sqlite3.Connection:
+        """One autocommit connection per thread (reopened after a fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.owners_path)), exist_ok=True)
+            conn = sqlite3.connect(self.owners_path, timeout=config.USER_DB_BUSY_TIMEOUT, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS file_owners (
+                    category TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    tier TEXT NOT NULL,
+                    multiplier REAL NOT NULL,
+                    recorded_at REAL NOT NULL,
+                    PRIMARY KEY (category, filename)
+                )
+            ''')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def record_owner(self, text: str, tier: str = None) -> int:
+        """
+        Note the owner tier of the generated files a response links to
+
+        A file linked by several owners keeps the most generous of their tiers.
+
+        Args:
+            text: Response text or HTML containing media URLs
+            tier: Owner's tier (default: the current request's)
+
+        Returns:
+            int: Number of files recorded
+        """
+        files = {(category, unquote(name).rsplit('/', 1)[-1]) for category, name in MEDIA_REFERENCE.findall(text or '')
+                 if category in self.category_dirs}
+        if not files:
+            return 0
+        tier = tier or current_tier()
+        multiplier = TIER_MULTIPLIERS.get(tier, 1)
+        try:
+            self._owners().executemany('''
+                INSERT INTO file_owners (category, filename, tier, multiplier, recorded_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (category, filename) DO UPDATE SET tier = excluded.tier, multiplier = excluded.multiplier
+                WHERE excluded.multiplier > file_owners.multiplier
+            ''', [(category, filename, tier, multiplier, time.time()) for category, filename in files])
+        except sqlite3.Error as e:
+            print(f"RETENTION: Could not record owner of {len(files)} files: {e}")
+            return 0
+        return len(files)
+
+    def owner_tiers(self) -> Dict[Tuple[str, str], str]:
+        """(category, filename) -> recorded owner tier"""
+        return {(category, filename): tier for category, filename, tier
+                in self._owners().execute('SELECT category, filename, tier FROM file_owners')}
+
+    # ---- Protection ----
+
+    def _sources(self) -> List[str]:
+        """Files that can reference media: saved conversations, shared conversations, permanent links"""
+        sources = []
+        for root, _, files in os.walk(config.CONVERSATIONS_DIR):
+            sources.extend(os.path.join(root, name) for name in files if name.endswith(('.json', '.log')))
+        if os.path.isdir(SHARED_DIR):
+            sources.extend(os.path.join(SHARED_DIR, name) for name in os.listdir(SHARED_DIR) if name.endswith('.json'))
+        if os.path.exists(PERMANENT_FILES_DB):
+            sources.append(PERMANENT_FILES_DB)
+        return sources
+
+    def references(self) -> Tuple[Set[Tuple[str, str]], Set[str]]:
+        """
+        What conversations, shares and permanent links point at
+
+        Returns:
+            tuple: (category, filename) of every referenced file, and the IDs of
+                video jobs still shown as a placeholder
+        """
+        referenced, job_ids = set(), set()
+        seen = set()
+        with self._lock:
+            for path in self._sources():
+                seen.add(path)
+                version = file_version(path)
+                cached = self._references.get(path)
+                if cached is None or cached[0] != version:
+                    try:
+                        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                            text = f.read()
+                    except OSError:
+                        continue
+                    cached = (version, frozenset((category, unquote(name).rsplit('/', 1)[-1])
+                                                 for category, name in MEDIA_REFERENCE.findall(text)),
+                              frozenset(VIDEO_JOB_REFERENCE.findall(text)))
+                    self._references[path] = cached
+                referenced.update(cached[1])
+                job_ids.update(cached[2])
+
+            for path in set(self._references) - seen:
+                del self._references[path]
+        return referenced, job_ids
+
+    # ---- Sweeping ----
+
+    def _expired_rows(self, now: datetime, report: Dict) -> Tuple[List[Tuple[int, Optional[str], str]], Set[Tuple[str, str]]]:
+        """Expired UploadedFile rows as (id, category, path), and the files live rows still use"""
+        from models_v2 import db, UploadedFile
+
+        expired, live = [], set()
+        rows = db.session.execute(select(UploadedFile.id, UploadedFile.file_path, UploadedFile.created_at,
+                                         UploadedFile.expires_at)).all()
+        for row_id, file_path, created_at, expires_at in rows:
+            category = self._classify(file_path)
+            if expires_at is None:
+                # Rows from before retention existed - free-tier policy from their creation time
+                policy = file_category(category, os.path.basename(file_path)) if category else 'uploads'
+                expires_at = (created_at or now) + timedelta(seconds=retention_seconds(policy))
+            if expires_at <= now:
+                expired.append((row_id, category, file_path))
+            elif category:
+                live.add((category, os.path.basename(file_path)))
+
+        report['rows'] = {'total': len(rows), 'expired': len(expired), 'deleted': 0}
+        return expired, live
+
+    def sweep(self, dry_run: bool = False, if_due: bool = False) -> Optional[Dict]:
+        """
+        Delete (or with dry_run, list) expired files and UploadedFile rows
+
+        Args:
+            dry_run: Only report what would be deleted
+            if_due: Skip if any worker swept within the interval (background sweeps)
+
+        Returns:
+            dict: Per-category counts, rows, duration and a sample of files - None if skipped
+        """
+        lock_file = None
+        if not dry_run:
+            lock_file = open(config.RETENTION_LOCK_FILE, 'a')
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    lock_file.close()
+                    return None  # Another worker is sweeping
+            if if_due and time.time() - os.stat(config.RETENTION_LOCK_FILE).st_mtime < self.interval * 0.9:
+                lock_file.close()
+                return None
+
+        try:
+            return self._sweep(dry_run)
+        finally:
+            if lock_file:
+                os.utime(config.RETENTION_LOCK_FILE)
+                lock_file.close()
+
+    def _sweep(self, dry_run: bool) -> Dict:
+        from models_v2 import db, UploadedFile
+
+        started = time.perf_counter()
+        now = datetime.utcnow()
+        report = {'dry_run': dry_run, 'started_at': now.isoformat(), 'categories': {}, 'sample': []}
+
+        expired_rows, live = self._expired_rows(now, report)
+        referenced, job_ids = self.references()
+        job_videos = {('videos', os.path.basename(path)) for path in video_jobs.local_files(job_ids)}
+        protected = referenced | job_videos | live
+        report['referenced_files'] = len(protected)
+
+        # Expired files, oldest first: aged out by their owner's tier, or belonging to an expired row
+        owners = self.owner_tiers()
+        on_disk = set()
+        candidates = []
+        expired_row_files = {(category, os.path.basename(path)): path for _, category, path in expired_rows if category}
+        for category, directory in self.category_dirs.items():
+            counts = report['categories'].setdefault(category, {'scanned': 0, 'expired': 0, 'protected': 0,
+                                                                'deleted': 0, 'bytes': 0})
+            if not os.path.isdir(directory):
+                continue
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.') or not entry.is_file(follow_symlinks=False):
+                        continue
+                    counts['scanned'] += 1
+                    on_disk.add((category, entry.name))
+                    stat = entry.stat(follow_symlinks=False)
+                    tier = owners.get((category, entry.name), UNKNOWN_OWNER_TIER)
+                    if (now.timestamp() - stat.st_mtime < retention_seconds(file_category(category, entry.name), tier)
+                            and (category, entry.name) not in expired_row_files):
+                        continue
+                    if (category, entry.name) in protected:
+                        counts['protected'] += 1
+                        continue
+                    counts['expired'] += 1
+                    counts['bytes'] += stat.st_size
+                    candidates.append((stat.st_mtime, entry.path, category, stat.st_size))
+        candidates.sort()
+        report['sample'] = [path for _, path, _, _ in candidates[:20]]
+
+        if not dry_run:
+            for i in range(0, len(candidates), self.batch_size):
+                if i:
+                    time.sleep(config.RETENTION_BATCH_PAUSE)
+                for _, path, category, size in candidates[i:i + self.batch_size]:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        continue
+                    except OSError as e:
+                        self.stats['errors'] += 1
+                        print(f"RETENTION: Could not delete {path}: {e}")
+                        continue
+                    on_disk.discard((category, os.path.basename(path)))
+                    report['categories'][category]['deleted'] += 1
+                    self.stats['files_deleted'] += 1
+                    self.stats['bytes_freed'] += size
+
+            for i in range(0, len(expired_rows), self.batch_size):
+                batch = [row_id for row_id, _, _ in expired_rows[i:i + self.batch_size]]
+                try:
+                    db.session.execute(delete(UploadedFile).where(UploadedFile.id.in_(batch)))
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    self.stats['errors'] += 1
+                    print(f"RETENTION: Could not delete {len(batch)} expired upload rows: {e}")
+                    break
+                report['rows']['deleted'] += len(batch)
+                self.stats['rows_deleted'] += len(batch)
+
+        # Owner records of files that are gone
+        stale_owners = [key for key in owners if key not in on_disk]
+        report['owner_rows_pruned'] = len(stale_owners)
+        if not dry_run and stale_owners:
+            self._owners().executemany('DELETE FROM file_owners WHERE category = ? AND filename = ?', stale_owners)
+
+        report['upload_sessions'] = upload_sessions.cleanup_expired(dry_run=dry_run)
+        report['video_jobs_purged'] = video_jobs.purge_finished(keep=job_ids, dry_run=dry_run)
+
+        # Blobs whose last linked path was just deleted
+        report['blobs'] = blob_store.collect_garbage(dry_run=dry_run)
+
+        report['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        if not dry_run:
+            self.stats['sweeps'] += 1
+            self.stats['last_sweep_at'] = now.isoformat()
+            self.stats['last_duration_ms'] = report['duration_ms']
+            self._save_report(report)
+            deleted = sum(counts['deleted'] for counts in report['categories'].values())
+            print(f"RETENTION: Deleted {deleted} files and {report['rows']['deleted']} upload rows in {report['duration_ms']}ms")
+        return report
+
+    @staticmethod
+    def _save_report(report: Dict) -> None:
+        """Keep the last sweep's report where every worker can read it"""
+        try:
+            temp_path = f"{config.RETENTION_REPORT_FILE}.{os.getpid()}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(report, f, indent=2)
+            os.replace(temp_path, config.RETENTION_REPORT_FILE)
+        except OSError as e:
+            print(f"RETENTION: Could not save sweep report: {e}")
+
+    def get_stats(self) -> Dict:
+        """This worker's counters, the last sweep's report (from any worker) and the policies"""
+        last_report = None
+        try:
+            with open(config.RETENTION_REPORT_FILE) as f:
+                last_report = json.load(f)
+        except (OSError, ValueError):
+            pass
+        return {
+            **self.stats,
+            'enabled': config.RETENTION_ENABLED,
+            'unknown_owner_tier': UNKNOWN_OWNER_TIER,
+            'policy_days': {category: {tier: round(retention_seconds(category, tier) / 86400, 2) for tier in TIER_MULTIPLIERS}
+                            for category in RETENTION_DAYS},
+            'last_report': last_report
+        }
+
+# Global retention sweeper instance
+retention_sweeper = RetentionSweeper()
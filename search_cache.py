@@ -0,0 +1,162 @@
+"""
+Search result cache for AIezzy web search.
+Caches Tavily responses by normalized query so repeated and near-duplicate
+questions share one upstream call within a freshness window.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from config import get_config
+
+config = get_config()
+
+# Queries mentioning these words are about fast-moving topics and get the short TTL
+VOLATILE_KEYWORDS = {
+    'news', 'latest', 'today', 'now', 'live', 'breaking', 'score', 'scores',
+    'price', 'prices', 'stock', 'stocks', 'weather', 'current', 'tonight'
+}
+
+# Filler words ignored when comparing queries for near-duplicates
+STOPWORDS = {
+    'a', 'an', 'the', 'is', 'are', 'was', 'what', 'whats', 'who', 'how', 'of',
+    'in', 'on', 'for', 'to', 'me', 'tell', 'about', 'please', 'can', 'you', 'i'
+}
+
+class SearchCache:
+    """Bounded in-memory TTL cache for web search results"""
+
+    def __init__(self, max_entries: int = None, default_ttl: int = None,
+                 volatile_ttl: int = None, similarity_threshold: float = None):
+        self.max_entries = max_entries or config.SEARCH_CACHE_MAX_ENTRIES
+        self.default_ttl = default_ttl or config.SEARCH_CACHE_TTL
+        self.volatile_ttl = volatile_ttl or config.SEARCH_CACHE_VOLATILE_TTL
+        self.similarity_threshold = (similarity_threshold if similarity_threshold is not None
+                                     else config.SEARCH_CACHE_SIMILARITY_THRESHOLD)
+        self.enabled = config.SEARCH_CACHE_ENABLED
+
+        # key -> {'result', 'expires_at', 'shingles', 'numbers'}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'near_hits': 0, 'misses': 0, 'evictions': 0}
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Lowercase, strip punctuation and collapse whitespace"""
+        query = query.lower()
+        query = re.sub(r'[^\w\s]', ' ', query)
+        return ' '.join(query.split())
+
+    @staticmethod
+    def shingles(normalized_query: str, size: int = 3) -> frozenset:
+        """Character shingles of the content words in query order, used for near-duplicate matching"""
+        words = [w for w in normalized_query.split() if w not in STOPWORDS]
+        text = ' '.join(words)
+        if len(text) <= size:
+            return frozenset([text]) if text else frozenset()
+        return frozenset(text[i:i + size] for i in range(len(text) - size + 1))
+
+    @staticmethod
+    def numbers(normalized_query: str) -> Tuple[str, ...]:
+        """Tokens containing digits (years, models, quantities) - near-duplicates must agree on all of them"""
+        return tuple(w for w in normalized_query.split() if any(ch.isdigit() for ch in w))
+
+    def ttl_for(self, normalized_query: str) -> int:
+        """Freshness window for a query - short for news-like queries"""
+        if VOLATILE_KEYWORDS.intersection(normalized_query.split()):
+            return self.volatile_ttl
+        return self.default_ttl
+
+    def make_key(self, query: str, params: Dict) -> Tuple[str, Tuple]:
+        """Build the exact cache key from normalized query plus search parameters"""
+        return self.normalize_query(query), tuple(sorted(params.items()))
+
+    def get(self, query: str, params: Dict) -> Optional[Dict]:
+        """
+        Look up a cached search result
+
+        Args:
+            query: Raw user query (without injected date context)
+            params: Search parameters that affect the upstream result
+
+        Returns:
+            dict: Cached Tavily result, or None on miss
+        """
+        if not self.enabled:
+            return None
+
+        key = self.make_key(query, params)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry['expires_at'] > now:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry['result']
+            if entry:
+                del self._entries[key]
+
+            # Near-duplicate match among fresh entries with identical parameters and numbers
+            # ("iphone 14 price" vs "iphone 15 price" differ by one shingle but not in answer)
+            if self.similarity_threshold < 1:
+                query_shingles = self.shingles(key[0])
+                query_numbers = self.numbers(key[0])
+                best_key, best_score = None, 0.0
+                for other_key, other in self._entries.items():
+                    if other['expires_at'] <= now or other_key[1] != key[1] or other['numbers'] != query_numbers:
+                        continue
+                    score = self._jaccard(query_shingles, other['shingles'])
+                    if score > best_score:
+                        best_key, best_score = other_key, score
+
+                if best_key is not None and best_score >= self.similarity_threshold:
+                    self._entries.move_to_end(best_key)
+                    self.stats['near_hits'] += 1
+                    print(f"SEARCH_CACHE: Near-duplicate hit ({best_score:.2f}) '{key[0]}' -> '{best_key[0]}'")
+                    return self._entries[best_key]['result']
+
+            self.stats['misses'] += 1
+            return None
+
+    def set(self, query: str, params: Dict, result: Dict) -> None:
+        """Store a search result with a freshness window based on the query"""
+        if not self.enabled or not result:
+            return
+
+        key = self.make_key(query, params)
+        with self._lock:
+            self._entries[key] = {
+                'result': result,
+                'expires_at': time.time() + self.ttl_for(key[0]),
+                'shingles': self.shingles(key[0]),
+                'numbers': self.numbers(key[0])
+            }
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def clear(self) -> None:
+        """Drop all cached results"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['near_hits'] + self.stats['misses']
+            hit_rate = (self.stats['hits'] + self.stats['near_hits']) / lookups if lookups else 0.0
+            return {**self.stats, 'size': len(self._entries), 'hit_rate': round(hit_rate, 3)}
+
+    @staticmethod
+    def _jaccard(a: frozenset, b: frozenset) -> float:
+        if not a or not b:
+            return 0.0
+        return len(a & b) / len(a | b)
+
+# Global search cache instance
+search_cache = SearchCache()
@@ -161,7 +161,8 @@ def create_admin_user():
 
 def run_migration():
     """Run database migration if needed"""
-    old_db = 'aiezzy_users.db'
+    from config import get_config
+    old_db = get_config().LEGACY_USER_DB
 
     if os.path.exists(old_db):
         print_info(f"Found existing database: {old_db}")
@@ -177,7 +178,7 @@ def run_migration():
                 app = Flask(__name__)
                 app.config.from_object(config)
 
-                migrate_from_old_db(app)
+                migrate_from_old_db(app, assume_yes=True)
                 print_success("Migration completed successfully")
                 return True
 
@@ -0,0 +1,72 @@
+"""
+Sliding-window limits and Retry-After against every rate_limit backend
+The same assertions run on MemoryBackend, SQLiteBackend and RedisBackend
+(through fake_redis.FakeRedis), with the clock passed in explicitly.
+
+Usage:
+    python -m pytest test_rate_limit.py
+"""
+
+import pytest
+from fake_redis import FakeRedis
+from rate_limit import MemoryBackend, RateLimiter, RedisBackend, SQLiteBackend
+
+WINDOW = 60
+
+@pytest.fixture(params=['memory', 'sqlite', 'redis'])
+def limiter(request, tmp_path):
+    if request.param == 'memory':
+        backend = MemoryBackend()
+    elif request.param == 'sqlite':
+        backend = SQLiteBackend(db_path=str(tmp_path / 'rate_limits.db'))
+    else:
+        backend = RedisBackend(client=FakeRedis())
+    return RateLimiter(backend=backend, enabled=True)
+
+def replay(limiter, key, limit, times):
+    """Hit key at each time, returning the (allowed, retry_after) of the last hit"""
+    for now in times:
+        result = limiter.hit(key, limit, WINDOW, now=now)
+    return result
+
+def test_fixed_limit_within_window(limiter):
+    results = [limiter.hit('k', 3, WINDOW, now=960 + i) for i in range(4)]
+    assert [allowed for allowed, _ in results] == [True, True, True, False]
+    assert all(wait == 0 for _, wait in results[:3])
+    assert results[3][1] > 0
+
+def test_previous_window_weight_decays(limiter):
+    replay(limiter, 'k', 10, [960] * 10)
+    # Halfway into the next window the previous 10 weigh 5, leaving room for 5
+    results = [limiter.hit('k', 10, WINDOW, now=1050) for _ in range(6)]
+    assert [allowed for allowed, _ in results] == [True] * 5 + [False]
+
+def test_retry_after_when_over_limit_in_this_window(limiter):
+    # 5 hits against a limit of 3: the previous-window weight of 5 must fall to 2
+    history = [1000, 1001, 1002, 1003, 1004]
+    allowed, retry_after = replay(limiter, 'a', 3, history)
+    assert not allowed
+    assert retry_after == 52  # 1056: 5 * (24 / 60) + 1 == 3
+
+    assert replay(limiter, 'b', 3, history + [1004 + retry_after - 1])[0] is False
+    assert replay(limiter, 'c', 3, history + [1004 + retry_after])[0] is True
+
+def test_retry_after_while_previous_window_decays(limiter):
+    history = [960] * 10 + [1050] * 6
+    allowed, retry_after = replay(limiter, 'a', 10, history)
+    assert not allowed
+    assert retry_after == 12  # 1062: 10 * (18 / 60) + 7 == 10
+
+    assert replay(limiter, 'b', 10, history + [1050 + retry_after - 1])[0] is False
+    assert replay(limiter, 'c', 10, history + [1050 + retry_after])[0] is True
+
+def test_backend_errors_fail_open():
+    class BrokenBackend:
+        name = 'broken'
+
+        def hit(self, key, window, start):
+            raise ConnectionError('down')
+
+    limiter = RateLimiter(backend=BrokenBackend(), enabled=True)
+    assert limiter.hit('k', 1, WINDOW, now=1000) == (True, 0)
+    assert limiter.stats['errors'] == 1
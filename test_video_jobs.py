@@ -0,0 +1,80 @@
+"""
+Background video jobs against fake_fal_server.py
+Runs the fake FAL queue in-process and drives VideoJobManager through
+submit -> poll -> download -> completed (and the failure path) without a FAL key.
+
+Usage:
+    python -m pytest test_video_jobs.py
+"""
+
+import threading
+from http.server import ThreadingHTTPServer
+import pytest
+import requests
+import fake_fal_server
+from video_jobs import VideoJobManager, COMPLETED, FAILED, QUEUED, RUNNING
+
+POLLS_UNTIL_DONE = 3
+
+@pytest.fixture
+def fal_url():
+    fake_fal_server.FakeFalHandler.polls_until_done = POLLS_UNTIL_DONE
+    server = ThreadingHTTPServer(('127.0.0.1', 0), fake_fal_server.FakeFalHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def manager(fal_url, tmp_path):
+    # Long interval: the background poller never ticks, the test polls explicitly
+    jobs = VideoJobManager(queue_url=fal_url, db_path=str(tmp_path / 'video_jobs.db'),
+                           poll_interval=3600, job_timeout=600)
+
+    def download(video_url):
+        path = tmp_path / video_url.rsplit('/', 1)[-1]
+        path.write_bytes(requests.get(video_url, timeout=10).content)
+        return str(path)
+
+    jobs.set_downloader(download)
+    return jobs
+
+def test_submit_poll_complete(manager):
+    job = manager.submit('fal-ai/ltx-video', {'prompt': 'a cat surfing'}, 'video_text', 'a cat surfing',
+                         thread_id='thread-1')
+    assert manager.get_job(job['id'])['status'] == QUEUED
+
+    statuses = []
+    for _ in range(POLLS_UNTIL_DONE):
+        manager.poll_once()
+        statuses.append(manager.get_job(job['id'])['status'])
+    assert statuses == [QUEUED, RUNNING, COMPLETED]
+
+    done = manager.get_job(job['id'])
+    with open(done['local_path'], 'rb') as f:
+        assert f.read() == fake_fal_server.video_bytes(job['request_id'])
+    assert done['video_url'].endswith(f"{job['request_id']}.mp4")
+    assert [j['id'] for j in manager.jobs_for_thread('thread-1')] == [job['id']]
+    assert not manager._has_pending()
+
+def test_failed_generation(manager):
+    job = manager.submit('fal-ai/ltx-video', {'prompt': 'please fail'}, 'video_text', 'please fail')
+    for _ in range(POLLS_UNTIL_DONE):
+        manager.poll_once()
+
+    failed = manager.get_job(job['id'])
+    assert failed['status'] == FAILED
+    assert failed['local_path'] is None
+
+def test_webhook_and_poller_download_once(manager):
+    job = manager.submit('fal-ai/ltx-video', {'prompt': 'a dog'}, 'video_text', 'a dog')
+    calls = []
+    download = manager.downloader
+    manager.set_downloader(lambda url: calls.append(url) or download(url))
+
+    result = {'video': {'url': f"{manager.queue_url}/files/{job['request_id']}.mp4"}}
+    manager._complete(job['id'], result)
+    manager._complete(job['id'], result)  # Late webhook after the poller finished it
+
+    assert manager.get_job(job['id'])['status'] == COMPLETED
+    assert len(calls) == 1
@@ -0,0 +1,95 @@
+"""
+Lazy registry for heavy tool modules used by AIezzy agents.
+Modules like pdf_converter pull in PyMuPDF, pypdf, python-docx, openpyxl and
+python-pptx at import time. Registering them here defers that cost to the first
+tool call that actually needs them, so worker boot only pays for what is used.
+"""
+
+import importlib
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from config import get_config
+
+config = get_config()
+
+class LazyModule:
+    """Stand-in for a module that imports it on first attribute access"""
+
+    def __init__(self, name: str, on_load: Optional[Callable] = None):
+        self._name = name
+        self._on_load = on_load
+        self._module = None
+        self._load_time = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._module is not None
+
+    def load(self):
+        """Import the real module (once, thread-safe) and return it"""
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    if self._on_load:
+                        self._on_load(module)
+                    self._load_time = time.perf_counter() - start
+                    self._module = module
+                    print(f"TOOL_REGISTRY: Imported {self._name} in {self._load_time * 1000:.0f}ms")
+        return self._module
+
+    def __getattr__(self, attr):
+        # Only called for attributes not set in __init__, i.e. the module's own
+        return getattr(self.load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self.is_loaded else 'not loaded'
+        return f"<LazyModule {self._name} ({state})>"
+
+class ToolRegistry:
+    """Name -> lazily imported tool module"""
+
+    def __init__(self, eager: bool = None):
+        self.eager = config.TOOL_IMPORTS_EAGER if eager is None else eager
+        self._modules: Dict[str, LazyModule] = {}
+
+    def register(self, name: str, on_load: Optional[Callable] = None) -> LazyModule:
+        """
+        Register a tool module by import name
+
+        Args:
+            name: Importable module name, e.g. 'pdf_converter'
+            on_load: Optional callback run with the module right after import
+                     (e.g. to set an API key)
+
+        Returns:
+            LazyModule: Proxy to use in place of the module
+        """
+        if name not in self._modules:
+            self._modules[name] = LazyModule(name, on_load)
+            if self.eager:
+                self._modules[name].load()
+        return self._modules[name]
+
+    def get(self, name: str):
+        """Loaded module for a registered name"""
+        return self._modules[name].load()
+
+    def preload(self, names: List[str] = None) -> None:
+        """Import registered modules now (all of them by default)"""
+        for name in names or list(self._modules):
+            self._modules[name].load()
+
+    def get_stats(self) -> Dict:
+        """Which modules are loaded and how long each import took"""
+        return {
+            name: {'loaded': module.is_loaded,
+                   'load_ms': round(module._load_time * 1000, 1) if module._load_time else None}
+            for name, module in self._modules.items()
+        }
+
+# Global tool registry instance
+tool_registry = ToolRegistry()
@@ -0,0 +1,455 @@
+"""
+Resumable chunked uploads for AIezzy.
+A multipart POST to /api/upload-file is buffered whole and limited by
+MAX_CONTENT_LENGTH; a dropped connection starts it over. Here a client opens
+an upload session, then sends the file as a series of small PATCH bodies at
+explicit offsets (tus-style):
+
+    POST   /api/uploads            {filename, size, thread_id, sha256?} -> upload_id
+    HEAD   /api/uploads/<id>       Upload-Offset: bytes stored so far
+    PATCH  /api/uploads/<id>       Upload-Offset + raw chunk [+ Upload-Checksum: sha256 <base64>]
+    DELETE /api/uploads/<id>       abandon
+
+Each chunk is streamed to <id>.part in UPLOAD_SESSIONS_DIR, so worker memory
+stays at one read buffer however large the file. The part file's size is the
+offset - there is no other state to keep consistent - and a chunk whose
+checksum doesn't match is cut off again. When the last byte arrives the part
+file is renamed into place (through the blob store) and the route registers it
+with add_uploaded_file(). The upload only reports complete once registration
+succeeds; until then a resent last chunk (or an empty PATCH at the final
+offset) retries the registration.
+
+Each user (or guest IP) may hold CHUNKED_UPLOAD_MAX_OPEN_SESSIONS unfinished
+sessions reserving at most CHUNKED_UPLOAD_MAX_RESERVED_BYTES between them.
+
+A session idle for CHUNKED_UPLOAD_SESSION_TTL is removed by cleanup_expired(), which
+the retention sweeper runs.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from typing import BinaryIO, Callable, Dict, Optional, Tuple
+from werkzeug.utils import secure_filename
+from blob_store import blob_store
+from config import get_config
+
+try:
+    import fcntl
+except ImportError:  # Windows - concurrent chunks for one session aren't rejected
+    fcntl = None
+
+config = get_config()
+
+READ_SIZE = 1024 * 1024
+
+# Upload-Checksum algorithms (tus checksum extension names)
+CHECKSUM_ALGORITHMS = {'sha1': hashlib.sha1, 'sha256': hashlib.sha256, 'md5': hashlib.md5}
+
+UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+
+class UploadNotFound(Exception):
+    """No such session, it expired, or it belongs to another user"""
+
+class UploadOffsetMismatch(Exception):
+    """A chunk was sent for an offset other than the bytes stored so far"""
+
+    def __init__(self, current_offset: int):
+        super().__init__(f"Upload is at offset {current_offset}")
+        self.current_offset = current_offset
+
+class UploadChecksumMismatch(Exception):
+    """A chunk (or the assembled file) didn't match the checksum the client sent"""
+
+class UploadBusy(Exception):
+    """Another request is writing to this session"""
+
+class UploadTooLarge(ValueError):
+    """File or chunk exceeds the configured limits"""
+
+class UploadQuotaExceeded(Exception):
+    """The caller already has too many unfinished sessions or reserved bytes"""
+
+class UploadSessions:
+    """Upload sessions stored as <id>.json (metadata) and <id>.part (bytes so far)"""
+
+    def __init__(self, sessions_dir: str = None, ttl: int = None):
+        self.sessions_dir = sessions_dir or config.UPLOAD_SESSIONS_DIR
+        self.ttl = ttl or config.CHUNKED_UPLOAD_SESSION_TTL
+        self.stats = {'created': 0, 'chunks': 0, 'bytes': 0, 'checksum_failures': 0, 'completed': 0, 'expired': 0,
+                      'registration_failures': 0, 'rejected_quota': 0}
+
+    def _path(self, upload_id: str, suffix: str) -> str:
+        return os.path.join(self.sessions_dir, f"{upload_id}{suffix}")
+
+    def _load(self, upload_id: str, user_id: Optional[int]) -> Dict:
+        """Session metadata; UploadNotFound unless it exists and belongs to user_id"""
+        if not UPLOAD_ID.match(upload_id or ''):
+            raise UploadNotFound(upload_id)
+        try:
+            with open(self._path(upload_id, '.json')) as f:
+                session = json.load(f)
+        except (OSError, ValueError):
+            raise UploadNotFound(upload_id)
+        # Guest sessions are guarded by the unguessable id alone
+        if session['user_id'] and session['user_id'] != user_id:
+            raise UploadNotFound(upload_id)
+        return session
+
+    def _save(self, session: Dict) -> None:
+        temp_path = self._path(session['upload_id'], f'.{os.getpid()}.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(session, f)
+        os.replace(temp_path, self._path(session['upload_id'], '.json'))
+
+    def _status(self, session: Dict, offset: int) -> Dict:
+        return {
+            'upload_id': session['upload_id'],
+            'filename': session['filename'],
+            'size': session['size'],
+            'offset': offset,
+            'complete': session.get('result') is not None,
+            'file': session.get('result'),
+            'chunk_size': config.CHUNKED_UPLOAD_CHUNK_SIZE,
+            'expires_at': (os.path.getmtime(self._path(session['upload_id'], '.json')) if session.get('result')
+                           else self._last_activity(session['upload_id'])) + self.ttl
+        }
+
+    def _last_activity(self, upload_id: str) -> float:
+        try:
+            return os.path.getmtime(self._path(upload_id, '.part'))
+        except OSError:
+            return os.path.getmtime(self._path(upload_id, '.json'))
+
+    def _open_sessions(self, owner: str) -> Tuple[int, int]:
+        """(count, declared bytes) of owner's unfinished sessions"""
+        count, reserved = 0, 0
+        for name in os.listdir(self.sessions_dir):
+            upload_id, ext = os.path.splitext(name)
+            if ext != '.json' or not os.path.exists(self._path(upload_id, '.part')):
+                continue
+            try:
+                with open(os.path.join(self.sessions_dir, name)) as f:
+                    session = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if session.get('owner') == owner:
+                count += 1
+                reserved += session['size']
+        return count, reserved
+
+    def create(self, filename: str, size: int, thread_id: str = 'default', user_id: Optional[int] = None,
+               sha256: str = None, client_ip: str = None) -> Dict:
+        """
+        Open an upload session
+
+        Args:
+            filename: Client's file name (sanitized here)
+            size: Total file size in bytes
+            thread_id: Conversation the file belongs to
+            user_id: Owner (None for guests)
+            sha256: Optional hex digest of the whole file, verified on completion
+            client_ip: Caller's address - guests' session limits are per IP
+
+        Returns:
+            dict: Session status (upload_id, offset 0, chunk_size, expires_at)
+
+        Raises:
+            ValueError: Missing file name or bad size/digest
+            UploadTooLarge: size exceeds CHUNKED_UPLOAD_MAX_SIZE
+            UploadQuotaExceeded: Too many unfinished sessions or reserved bytes for this user/IP
+        """
+        filename = secure_filename(filename or '')
+        if not filename:
+            raise ValueError('filename is required')
+        if not isinstance(size, int) or isinstance(size, bool) or size <= 0:
+            raise ValueError('size must be a positive number of bytes')
+        if size > config.CHUNKED_UPLOAD_MAX_SIZE:
+            raise UploadTooLarge(f'File exceeds the {config.CHUNKED_UPLOAD_MAX_SIZE // (1024 * 1024)}MB upload limit')
+        if sha256 is not None and not re.match(r'^[0-9a-fA-F]{64}$', str(sha256)):
+            raise ValueError('sha256 must be a hex digest')
+
+        os.makedirs(self.sessions_dir, exist_ok=True)
+        session = {
+            'upload_id': uuid.uuid4().hex,
+            'filename': filename,
+            'size': size,
+            'thread_id': thread_id or 'default',
+            'user_id': user_id,
+            'owner': f"user:{user_id}" if user_id else f"ip:{client_ip}",
+            'sha256': sha256.lower() if sha256 else None,
+            'created_at': time.time(),
+            'result': None
+        }
+        # Counted and created under one lock so parallel requests can't both slip under the limits
+        with open(os.path.join(self.sessions_dir, '.create.lock'), 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            count, reserved = self._open_sessions(session['owner'])
+            if count >= config.CHUNKED_UPLOAD_MAX_OPEN_SESSIONS:
+                self.stats['rejected_quota'] += 1
+                raise UploadQuotaExceeded(f'At most {config.CHUNKED_UPLOAD_MAX_OPEN_SESSIONS} unfinished uploads at a time; '
+                                          f'finish or cancel one first')
+            if reserved + size > config.CHUNKED_UPLOAD_MAX_RESERVED_BYTES:
+                self.stats['rejected_quota'] += 1
+                raise UploadQuotaExceeded(f'Unfinished uploads may total at most '
+                                          f'{config.CHUNKED_UPLOAD_MAX_RESERVED_BYTES // (1024 * 1024)}MB; '
+                                          f'finish or cancel one first')
+            open(self._path(session['upload_id'], '.part'), 'wb').close()
+            self._save(session)
+        self.stats['created'] += 1
+        print(f"UPLOAD_SESSION: Opened {session['upload_id']} for '{filename}' ({size} bytes)")
+        return self._status(session, 0)
+
+    def status(self, upload_id: str, user_id: Optional[int] = None) -> Dict:
+        """Offset to resume from (or the finished file); UploadNotFound if unknown"""
+        session = self._load(upload_id, user_id)
+        if session.get('result') or session.get('moved'):
+            return self._status(session, session['size'])
+        try:
+            offset = os.path.getsize(self._path(upload_id, '.part'))
+        except OSError:
+            raise UploadNotFound(upload_id)
+        return self._status(session, offset)
+
+    def write_chunk(self, upload_id: str, user_id: Optional[int], offset: int, stream: BinaryIO,
+                    length: int, checksum: str = None,
+                    on_complete: Callable[[Dict, str], Dict] = None) -> Dict:
+        """
+        Append one chunk, streaming it to disk; completes the upload with its last byte
+
+        Args:
+            upload_id: Session ID
+            user_id: Requesting user (None for guests)
+            offset: Upload-Offset the client believes it is at
+            stream: Request body
+            length: Body length (Content-Length)
+            checksum: Upload-Checksum header value, '<algorithm> <base64 digest>'
+            on_complete: Called with (session, file path) when the file is in place; its
+                dict is added to the session's 'file'. If it raises, the upload stays
+                incomplete and the next request for the final offset calls it again.
+
+        Returns:
+            dict: Session status; 'file' holds the finished file's path once complete
+
+        Raises:
+            UploadNotFound, UploadOffsetMismatch, UploadChecksumMismatch, UploadBusy,
+            UploadTooLarge, ValueError: bad checksum header
+        """
+        session = self._load(upload_id, user_id)
+        if session.get('result') or session.get('moved'):
+            return self._repeat_completion(session, offset, length, on_complete)
+        if length > config.CHUNKED_UPLOAD_CHUNK_MAX_SIZE:
+            raise UploadTooLarge(f'Chunks may be at most {config.CHUNKED_UPLOAD_CHUNK_MAX_SIZE} bytes')
+
+        hasher, expected = None, None
+        if checksum:
+            algorithm, _, encoded = checksum.strip().partition(' ')
+            if algorithm.lower() not in CHECKSUM_ALGORITHMS:
+                raise ValueError(f"Unsupported checksum algorithm; use one of: {', '.join(CHECKSUM_ALGORITHMS)}")
+            try:
+                expected = base64.b64decode(encoded.strip(), validate=True)
+            except ValueError:
+                raise ValueError('Upload-Checksum digest must be base64')
+            hasher = CHECKSUM_ALGORITHMS[algorithm.lower()]()
+
+        try:
+            part = open(self._path(upload_id, '.part'), 'r+b')
+        except FileNotFoundError:
+            # Completed (or aborted) since we loaded it
+            return self._repeat_completion(self._load(upload_id, user_id), offset, length, on_complete)
+        with part:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(part, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    raise UploadBusy(upload_id)
+                if not os.path.exists(self._path(upload_id, '.part')):
+                    # Moved into place by the request that held the lock
+                    return self._repeat_completion(self._load(upload_id, user_id), offset, length, on_complete)
+
+            current = os.fstat(part.fileno()).st_size
+            if offset != current:
+                raise UploadOffsetMismatch(current)
+            if current + length > session['size']:
+                raise UploadTooLarge('Chunk extends past the declared file size')
+
+            part.seek(current)
+            written = 0
+            try:
+                while written < length:
+                    data = stream.read(min(READ_SIZE, length - written))
+                    if not data:
+                        break
+                    if hasher:
+                        hasher.update(data)
+                    part.write(data)
+                    written += len(data)
+                if hasher and (written != length or hasher.digest() != expected):
+                    self.stats['checksum_failures'] += 1
+                    raise UploadChecksumMismatch(f'Chunk at offset {offset} failed its checksum')
+            except Exception:
+                if hasher:
+                    # Unverified bytes must not count toward the offset
+                    part.truncate(current)
+                else:
+                    # Keep what arrived intact so the client resumes after it
+                    part.flush()
+                    part.truncate(current + written)
+                raise
+            part.flush()
+
+            self.stats['chunks'] += 1
+            self.stats['bytes'] += written
+            if current + written < session['size']:
+                return self._status(session, current + written)
+
+            # Complete - still under the lock, so only one request finishes it
+            return self._complete(session, part, on_complete)
+
+    def _repeat_completion(self, session: Dict, offset: int, length: int,
+                           on_complete: Callable[[Dict, str], Dict] = None) -> Dict:
+        """
+        A finished session's status, for a client resending its last chunk after a lost response
+
+        A file that is in place but whose registration failed is registered now.
+        """
+        if not session.get('result') and not session.get('moved'):
+            raise UploadNotFound(session['upload_id'])
+        if offset != session['size'] and offset + length != session['size']:
+            raise UploadOffsetMismatch(session['size'])
+        if session.get('result'):
+            return self._status(session, session['size'])
+        with self._registration_lock(session['upload_id']):
+            session = self._load(session['upload_id'], session['user_id'])
+            if session.get('result'):
+                # Registered by the request that held the lock
+                return self._status(session, session['size'])
+            return self._register(session, on_complete)
+
+    def _complete(self, session: Dict, part: BinaryIO, on_complete: Callable[[Dict, str], Dict] = None) -> Dict:
+        """Verify the whole-file digest, then rename the part file into UPLOAD_FOLDER"""
+        upload_id = session['upload_id']
+        digest = None
+        if session['sha256'] or blob_store.enabled:
+            sha = hashlib.sha256()
+            part.seek(0)
+            for data in iter(lambda: part.read(READ_SIZE), b''):
+                sha.update(data)
+            digest = sha.hexdigest()
+            if session['sha256'] and digest != session['sha256']:
+                self.stats['checksum_failures'] += 1
+                self._remove(upload_id)
+                raise UploadChecksumMismatch('Assembled file does not match its sha256; upload it again')
+
+        unique_filename = f"{int(time.time() * 1000)}_{session['filename']}"
+        file_path = os.path.join(config.UPLOAD_FOLDER, unique_filename)
+        os.fsync(part.fileno())
+
+        # The target is recorded before the part file moves: a retried last chunk neither moves a
+        # second copy nor finds the session gone, and a crash mid-way is finished by _register
+        with self._registration_lock(upload_id):
+            session['moved'] = {'file_path': file_path, 'unique_filename': unique_filename}
+            session['digest'] = digest
+            self._save(session)
+            return self._register(session, on_complete)
+
+    @contextmanager
+    def _registration_lock(self, upload_id: str):
+        """Held while a finished file is registered, so a retry can't register it twice"""
+        with open(self._path(upload_id, '.lock'), 'a') as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    raise UploadBusy(upload_id)
+            yield
+
+    def _register(self, session: Dict, on_complete: Callable[[Dict, str], Dict] = None) -> Dict:
+        """Move the finished part file into place if that hasn't happened yet, then run on_complete"""
+        upload_id = session['upload_id']
+        file_path = session['moved']['file_path']
+        part_path = self._path(upload_id, '.part')
+        if not os.path.exists(file_path):
+            try:
+                complete = os.path.getsize(part_path) == session['size']
+            except OSError:
+                complete = False
+            if not complete:
+                # Removed (e.g. by retention) before it was ever registered
+                self._remove(upload_id)
+                raise UploadNotFound(upload_id)
+            blob_store.move_file(part_path, file_path, digest=session.get('digest'))
+
+        result = dict(session['moved'])
+        if on_complete:
+            try:
+                result.update(on_complete(session, file_path) or {})
+            except Exception:
+                self.stats['registration_failures'] += 1
+                raise
+        session['result'] = result
+        self._save(session)
+        self.stats['completed'] += 1
+        print(f"UPLOAD_SESSION: Completed {upload_id} -> {result['unique_filename']} ({session['size']} bytes)")
+        return self._status(session, session['size'])
+
+    def _remove(self, upload_id: str) -> None:
+        for suffix in ('.part', '.json', '.lock'):
+            try:
+                os.remove(self._path(upload_id, suffix))
+            except FileNotFoundError:
+                pass
+
+    def abort(self, upload_id: str, user_id: Optional[int] = None) -> None:
+        """Discard a session and its bytes; UploadNotFound if unknown"""
+        self._load(upload_id, user_id)
+        self._remove(upload_id)
+
+    def cleanup_expired(self, dry_run: bool = False) -> Dict:
+        """
+        Remove sessions idle (or finished) for longer than the TTL
+
+        Returns:
+            dict: Sessions scanned, expired and part-file bytes freed
+        """
+        report = {'sessions': 0, 'expired': 0, 'bytes': 0}
+        if not os.path.isdir(self.sessions_dir):
+            return report
+
+        now = time.time()
+        for name in os.listdir(self.sessions_dir):
+            upload_id, ext = os.path.splitext(name)
+            if ext == '.tmp' and now - os.path.getmtime(os.path.join(self.sessions_dir, name)) > self.ttl:
+                if not dry_run:
+                    os.remove(os.path.join(self.sessions_dir, name))
+                continue
+            if ext != '.json':
+                continue
+            report['sessions'] += 1
+            try:
+                finished = not os.path.exists(self._path(upload_id, '.part'))
+                last = os.path.getmtime(self._path(upload_id, '.json')) if finished else self._last_activity(upload_id)
+                size = 0 if finished else os.path.getsize(self._path(upload_id, '.part'))
+            except OSError:
+                continue
+            if now - last < self.ttl:
+                continue
+            report['expired'] += 1
+            report['bytes'] += size
+            if not dry_run:
+                self._remove(upload_id)
+                self.stats['expired'] += 1
+        return report
+
+    def get_stats(self) -> Dict:
+        """Session counters for this worker"""
+        return dict(self.stats)
+
+# Global upload sessions instance
+upload_sessions = UploadSessions()
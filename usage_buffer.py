@@ -0,0 +1,393 @@
+"""
+Write-behind usage logging for AIezzy.
+QuotaService.log_usage() records an event in memory and appends it to a small
+per-process log file instead of writing the database on the request path. A
+background thread flushes every USAGE_FLUSH_INTERVAL seconds (sooner once
+USAGE_FLUSH_MAX_EVENTS are waiting): UsageLog rows go in as one bulk insert and
+DailyUsage counters as one multi-row UPSERT per batch, so concurrent requests
+no longer contend for the same DailyUsage row.
+
+Crash safety: a worker holds a lock on its log for its whole life. Logs whose
+lock can be taken belong to dead processes and are replayed into the database
+by the next flusher thread to start, off the request path. Delivery is at-least-once - a crash between a commit and
+deleting the batch file replays that batch.
+
+A batch that fails while the database is reachable is retried event by event;
+an event that still fails USAGE_FLUSH_MAX_ATTEMPTS times is moved to
+dead-letter.jsonl so it can't hold up the events behind it. Guest events
+(user_id 0) only count toward the rollups - usage_logs.user_id references users.
+
+Quota reads add this process's unflushed counts (pending_usage()), so a user
+can't exceed a limit by racing the flush in the same worker.
+"""
+
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import date, datetime
+from typing import Dict, List, Optional
+from sqlalchemy import insert
+from config import get_config
+
+try:
+    import fcntl
+except ImportError:  # Windows - only this process's own leftovers are replayed
+    fcntl = None
+
+config = get_config()
+
+# resource_type -> DailyUsage counter column
+DAILY_COLUMNS = {'image': 'images_generated', 'video': 'videos_created', 'message': 'messages_sent'}
+
+DEAD_LETTER_FILE = 'dead-letter.jsonl'
+
+def check_usage_event(resource_type: str, count) -> None:
+    """Raise ValueError for an event the database would reject"""
+    if resource_type not in DAILY_COLUMNS:
+        raise ValueError(f"resource_type must be one of: {', '.join(DAILY_COLUMNS)}")
+    if not isinstance(count, int) or isinstance(count, bool) or count < 0:
+        raise ValueError('count must be a non-negative integer')
+
+class UsageBuffer:
+    """Buffers usage events and flushes them to UsageLog/DailyUsage in batches"""
+
+    def __init__(self, log_dir: str = None, flush_interval: float = None, max_pending: int = None):
+        self.log_dir = log_dir or config.USAGE_LOG_DIR
+        self.flush_interval = flush_interval or config.USAGE_FLUSH_INTERVAL
+        self.max_pending = max_pending or config.USAGE_FLUSH_MAX_EVENTS
+        self.app = None
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+        self._events: List[Dict] = []
+        self._log = None
+        self._batch_seq = 0
+        self._failed: List[tuple] = []  # (batch file, events) waiting for a retry
+        # (user_id, day, resource_type) -> count not yet committed
+        self._unflushed = Counter()
+        self.stats = {'buffered_events': 0, 'flushed_events': 0, 'flushes': 0, 'failed_flushes': 0,
+                      'replayed_events': 0, 'dead_lettered_events': 0, 'last_flush_ms': None}
+
+    @property
+    def enabled(self) -> bool:
+        """Buffering needs an app (for the flush thread's app context)"""
+        return config.USAGE_BUFFER_ENABLED and self.app is not None
+
+    def init_app(self, flask_app) -> None:
+        """Use flask_app's database; each process starts its flusher on first use (or prefork.init_worker)"""
+        self.app = flask_app
+        atexit.register(self.flush)
+
+    def _path(self, pid: int, suffix: str) -> str:
+        return os.path.join(self.log_dir, f"usage-{pid}{suffix}")
+
+    def start(self) -> None:
+        """Open this process's log and start its flusher (again after a fork); idempotent"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            os.makedirs(self.log_dir, exist_ok=True)
+            self._events, self._failed, self._unflushed = [], [], Counter()
+            self._lock_file = open(self._path(os.getpid(), '.lock'), 'a')
+            if fcntl is not None:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._pid = os.getpid()
+            # A dead process with our PID may have left events behind - the flusher replays them
+            leftovers = self._claim_pid_logs(self._pid)
+            self._log = open(self._path(self._pid, '.log'), 'a', encoding='utf-8')
+            threading.Thread(target=self._run, args=(leftovers,), name='usage-flusher', daemon=True).start()
+
+    def record(self, user_id: Optional[int], resource_type: str, count: int = 1, metadata: Dict = None) -> None:
+        """
+        Buffer one usage event
+
+        Args:
+            user_id: User ID (None/0 for guests - logged, but not counted in DailyUsage)
+            resource_type: 'image', 'video' or 'message'
+            count: Number of resources used
+            metadata: Additional metadata (stored as text)
+
+        Raises:
+            ValueError: Unknown resource_type or a count that isn't a non-negative int
+        """
+        check_usage_event(resource_type, count)
+        self.start()
+        event = {'user_id': user_id or 0, 'resource_type': resource_type, 'count': count,
+                 'metadata': str(metadata) if metadata else None,
+                 'day': date.today().isoformat(), 'at': time.time()}
+        line = json.dumps(event, separators=(',', ':')) + '\n'
+
+        with self._lock:
+            self._log.write(line)
+            self._log.flush()
+            if config.USAGE_LOG_FSYNC:
+                os.fsync(self._log.fileno())
+            self._events.append(event)
+            if event['user_id']:
+                self._unflushed[(event['user_id'], event['day'], resource_type)] += count
+            self.stats['buffered_events'] += 1
+            pending = len(self._events)
+
+        if pending >= self.max_pending:
+            self._wake.set()
+
+    def pending_usage(self, user_id: int, resource_type: str, start_date: date, end_date: date) -> int:
+        """Counts recorded by this process but not yet committed, for quota reads"""
+        if not user_id or self._pid != os.getpid():
+            return 0
+        start, end = start_date.isoformat(), end_date.isoformat()
+        with self._lock:
+            return sum(count for (uid, day, rtype), count in self._unflushed.items()
+                       if uid == user_id and rtype == resource_type and start <= day <= end)
+
+    def _run(self, leftovers: List[str]) -> None:
+        pid = os.getpid()
+        self._recover_pid(leftovers)
+        self._recover_orphans()
+        while self._pid == pid:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        Write buffered events to the database now
+
+        Returns:
+            int: Events committed
+        """
+        if self._pid != os.getpid():
+            return 0
+
+        with self._flush_lock:
+            with self._lock:
+                events, self._events = self._events, []
+                if events:
+                    # Rotate: new events go to a fresh log while this batch is written
+                    self._log.close()
+                    self._batch_seq += 1
+                    batch_path = self._path(self._pid, f'.{self._batch_seq}.flushing')
+                    os.replace(self._path(self._pid, '.log'), batch_path)
+                    self._log = open(self._path(self._pid, '.log'), 'a', encoding='utf-8')
+                    self._failed.append((batch_path, events))
+                batches, self._failed = self._failed, []
+
+            written = 0
+            for index, (batch_path, batch) in enumerate(batches):
+                start = time.perf_counter()
+                try:
+                    done, retry = self._write_batch(batch_path, batch)
+                except Exception as e:
+                    # Database unreachable - keep this and later batches for the next flush
+                    print(f"USAGE: Flush of {len(batch)} events failed, will retry: {e}")
+                    self.stats['failed_flushes'] += 1
+                    with self._lock:
+                        self._failed = batches[index:] + self._failed
+                    break
+
+                with self._lock:
+                    for event in done:
+                        if event['user_id']:
+                            key = (event['user_id'], event['day'], event['resource_type'])
+                            self._unflushed[key] -= event['count']
+                            if self._unflushed[key] <= 0:
+                                del self._unflushed[key]
+                    if retry:
+                        self._failed.append((batch_path, retry))
+                written += len(done)
+                self.stats['flushes'] += 1
+                self.stats['flushed_events'] += len(done)
+                self.stats['last_flush_ms'] = round((time.perf_counter() - start) * 1000, 1)
+            return written
+
+    def _write_batch(self, batch_path: str, events: List[Dict]) -> tuple:
+        """
+        Write a batch file's events, isolating events the database rejects
+
+        Returns:
+            tuple: (events done - committed or dead-lettered, events to retry later)
+
+        Raises:
+            Exception: The database is unreachable (nothing was written)
+        """
+        try:
+            self._write(events)
+            retry = []
+            done = events
+        except Exception as e:
+            if not self._database_reachable():
+                raise
+            print(f"USAGE: Batch of {len(events)} events rejected ({e}), writing events one by one")
+            done, retry = [], []
+            for event in events:
+                try:
+                    self._write([event])
+                    done.append(event)
+                except Exception as event_error:
+                    event['attempts'] = event.get('attempts', 0) + 1
+                    if event['attempts'] >= config.USAGE_FLUSH_MAX_ATTEMPTS:
+                        self._dead_letter(event, event_error)
+                        done.append(event)
+                    else:
+                        retry.append(event)
+
+        if retry:
+            # Only the rejected events stay in the batch file, with their attempt counts
+            temp_path = f"{batch_path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.writelines(json.dumps(event, separators=(',', ':')) + '\n' for event in retry)
+            os.replace(temp_path, batch_path)
+        else:
+            try:
+                os.remove(batch_path)
+            except OSError:
+                pass
+        return done, retry
+
+    def _database_reachable(self) -> bool:
+        from sqlalchemy import text
+        from models_v2 import db
+        try:
+            with self.app.app_context():
+                db.session.rollback()
+                db.session.execute(text('SELECT 1'))
+                db.session.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _dead_letter(self, event: Dict, error: Exception) -> None:
+        """Set aside an event the database keeps rejecting"""
+        print(f"USAGE: Giving up on event after {event['attempts']} attempts ({error}): {event}")
+        with open(os.path.join(self.log_dir, DEAD_LETTER_FILE), 'a', encoding='utf-8') as f:
+            f.write(json.dumps({**event, 'error': str(error)[:500]}, separators=(',', ':')) + '\n')
+        self.stats['dead_lettered_events'] += 1
+
+    def _write(self, events: List[Dict]) -> None:
+        """One transaction: bulk UsageLog insert, DailyUsage UPSERT per (user, day) and usage rollups"""
+        from models_v2 import db, UsageLog, DailyUsage, increment_counters
+        from analytics_service import analytics_service
+
+        daily = {}
+        for event in events:
+            column = DAILY_COLUMNS.get(event['resource_type'])
+            if event['user_id'] and column:
+                row = daily.setdefault((event['user_id'], event['day']), dict.fromkeys(DAILY_COLUMNS.values(), 0))
+                row[column] += event['count']
+
+        logged = [{
+            'user_id': event['user_id'],
+            'resource_type': event['resource_type'],
+            'resource_count': event['count'],
+            'resource_metadata': event['metadata'],
+            'created_at': datetime.utcfromtimestamp(event['at'])
+        } for event in events if event['user_id']]
+
+        with self.app.app_context():
+            try:
+                if logged:
+                    db.session.execute(insert(UsageLog), logged)
+
+                now = datetime.utcnow()
+                increment_counters(db.session, DailyUsage, [
+                    {'user_id': user_id, 'date': date.fromisoformat(day), 'updated_at': now, **counts}
+                    for (user_id, day), counts in daily.items()
+                ], keys=['user_id', 'date'], counters=list(DAILY_COLUMNS.values()), replace=['updated_at'])
+
+                analytics_service.record_usage([(event['user_id'], event['resource_type'], event['count'],
+                                                 datetime.utcfromtimestamp(event['at'])) for event in events])
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+    @staticmethod
+    def _read_events(path: str) -> List[Dict]:
+        """Events in a log file; a line cut short by a crash is skipped"""
+        events = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    pass
+        return events
+
+    def _replay(self, paths: List[str]) -> List[tuple]:
+        """Write leftover logs; returns (path, events) still to retry (left in their files)"""
+        leftovers = []
+        for path in sorted(paths):
+            events = self._read_events(path)
+            if not events:
+                os.remove(path)
+                continue
+            done, retry = self._write_batch(path, events)
+            self.stats['replayed_events'] += len(done)
+            print(f"USAGE: Replayed {len(done)} unflushed events from {os.path.basename(path)}")
+            if retry:
+                leftovers.append((path, retry))
+        return leftovers
+
+    def _claim_pid_logs(self, pid: int) -> List[str]:
+        """
+        Move logs left by a previous process with this PID out of the way (our lock is held)
+
+        Only renames - the .log name and batch numbers are about to be reused for new events.
+
+        Returns:
+            list: Paths the flusher thread replays
+        """
+        paths = []
+        for path in glob.glob(self._path(pid, '.log')) + glob.glob(self._path(pid, '.*.flushing')):
+            batch_path = self._path(pid, f'.{uuid.uuid4().hex[:8]}.flushing')
+            os.replace(path, batch_path)
+            paths.append(batch_path)
+        return paths
+
+    def _recover_pid(self, paths: List[str]) -> None:
+        """Replay logs claimed by _claim_pid_logs(); what fails is retried with our own batches"""
+        if not paths:
+            return
+        try:
+            leftovers = self._replay(paths)
+        except Exception as e:
+            print(f"USAGE: Could not replay leftover usage log, will retry: {e}")
+            leftovers = [(path, self._read_events(path)) for path in paths if os.path.exists(path)]
+        with self._lock:
+            self._failed.extend(leftovers)
+
+    def _recover_orphans(self) -> None:
+        """Replay logs of dead workers - a live worker always holds its lock"""
+        if fcntl is None:
+            return
+        for lock_path in glob.glob(os.path.join(self.log_dir, 'usage-*.lock')):
+            pid = os.path.basename(lock_path)[len('usage-'):-len('.lock')]
+            if pid == str(os.getpid()):
+                continue
+            try:
+                with open(lock_path, 'a') as lock_file:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    if not self._replay(glob.glob(self._path(pid, '.log')) + glob.glob(self._path(pid, '.*.flushing'))):
+                        os.remove(lock_path)  # Otherwise kept so the rest is retried next start
+            except BlockingIOError:
+                continue  # Owner is alive
+            except Exception as e:
+                print(f"USAGE: Could not replay usage log of pid {pid}: {e}")
+
+    def get_stats(self) -> Dict:
+        """Buffered/flushed counters for this worker"""
+        with self._lock:
+            return {**self.stats, 'pending_events': len(self._events) + sum(len(b) for _, b in self._failed),
+                    'enabled': self.enabled}
+
+# Global usage buffer instance
+usage_buffer = UsageBuffer()
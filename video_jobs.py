@@ -0,0 +1,376 @@
+"""
+Background video generation jobs for AIezzy.
+Video tools submit to FAL's queue API and return right away with a job ID.
+Completion is picked up by a poller thread (or FAL's webhook), the video is
+downloaded into VIDEOS_DIR, and the chat UI swaps its placeholder for the player.
+
+Jobs live in a SQLite file shared by every worker (VIDEO_JOBS_DB), so a job
+submitted by one worker can be polled, completed by a webhook or shown to the
+UI by another. State changes are conditional UPDATEs: only the caller that
+moves a job from queued/running to downloading fetches the video. Every
+worker with pending jobs runs a poller thread, but each tick is taken by one
+of them at a time (a lock file whose mtime records the last poll), so FAL is
+polled once per interval however many workers there are.
+
+The chat UI writes the finished player back into the saved conversation. Until
+it has, a conversation holds only the job's placeholder, so the retention
+sweeper keeps every job (and its video file) a conversation still references
+and purges the rest once they have been finished for FINISHED_JOB_TTL.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set
+import requests
+from config import get_config
+
+try:
+    import fcntl
+except ImportError:  # Windows - every worker polls
+    fcntl = None
+
+config = get_config()
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DOWNLOADING = 'downloading'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+PENDING_STATES = (QUEUED, RUNNING)
+
+# A download not finished after this long (its worker died) is claimed again
+DOWNLOAD_STALE_AFTER = 900
+
+# Finished jobs no conversation references are purged after this long
+FINISHED_JOB_TTL = 86400
+
+JOB_COLUMNS = ('id', 'request_id', 'status_url', 'response_url', 'model', 'kind', 'prompt', 'thread_id',
+               'status', 'video_url', 'local_path', 'error', 'created_at', 'updated_at')
+
+def extract_video_url(result) -> Optional[str]:
+    """Find the video URL in a FAL result (models return different structures)"""
+    if not result or not isinstance(result, dict):
+        return None
+    if 'video' in result and result['video']:
+        if isinstance(result['video'], dict) and 'url' in result['video']:
+            return result['video']['url']
+        if isinstance(result['video'], str):
+            return result['video']
+    elif 'url' in result:
+        return result['url']
+    elif 'output' in result:
+        return result['output']
+    return None
+
+class VideoJobManager:
+    """Tracks FAL queue requests from submission to downloaded video"""
+
+    def __init__(self, queue_url: str = None, db_path: str = None,
+                 poll_interval: int = None, job_timeout: int = None):
+        self.queue_url = (queue_url or config.FAL_QUEUE_URL).rstrip('/')
+        self.db_path = db_path or config.VIDEO_JOBS_DB
+        self.lock_path = f"{self.db_path}.poll.lock"
+        self.poll_interval = poll_interval or config.VIDEO_JOB_POLL_INTERVAL
+        self.job_timeout = job_timeout or config.VIDEO_JOB_TIMEOUT
+        self.webhook_secret = config.FAL_WEBHOOK_SECRET
+
+        # Callable(video_url) -> local path, registered by app.py
+        self.downloader: Optional[Callable[[str], str]] = None
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._initialized = False
+        self._poller = None
+
+    def set_downloader(self, downloader: Callable[[str], str]) -> None:
+        """Register the function that saves a finished video locally"""
+        self.downloader = downloader
+
+    @property
+    def webhook_url(self) -> Optional[str]:
+        """Public webhook URL passed to FAL, if webhooks are configured"""
+        if not self.webhook_secret:
+            return None
+        return f"{config.BASE_URL.rstrip('/')}/api/fal-webhook?token={self.webhook_secret}"
+
+    def _connection(self) -> sqlite3.Connection:
+        """One autocommit connection per thread (reopened after a fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=config.USER_DB_BUSY_TIMEOUT, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            if not self._initialized:
+                with self._lock:
+                    if not self._initialized:
+                        self._create_schema(conn)
+                        self._initialized = True
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _create_schema(self, conn: sqlite3.Connection) -> None:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS video_jobs (
+                id TEXT PRIMARY KEY,
+                request_id TEXT NOT NULL UNIQUE,
+                status_url TEXT NOT NULL,
+                response_url TEXT NOT NULL,
+                model TEXT,
+                kind TEXT,
+                prompt TEXT,
+                thread_id TEXT,
+                status TEXT NOT NULL,
+                video_url TEXT,
+                local_path TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_video_jobs_status ON video_jobs (status)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_video_jobs_thread ON video_jobs (thread_id)')
+
+    def submit(self, model: str, arguments: Dict, kind: str, prompt: str,
+               thread_id: str = None) -> Dict:
+        """
+        Submit a generation request to the FAL queue without waiting for it
+
+        Args:
+            model: FAL application ID, e.g. 'fal-ai/ltx-video'
+            arguments: Model input
+            kind: Tool name, e.g. 'video_text' or 'video_image'
+            prompt: User prompt (for display)
+            thread_id: Conversation thread the video belongs to
+
+        Returns:
+            dict: The new job record
+        """
+        params = {'fal_webhook': self.webhook_url} if self.webhook_url else None
+        response = requests.post(
+            f"{self.queue_url}/{model}",
+            json=arguments,
+            params=params,
+            headers={'Authorization': f"Key {os.getenv('FAL_KEY')}"},
+            timeout=30
+        )
+        response.raise_for_status()
+        data = response.json()
+
+        now = time.time()
+        job = {
+            'id': uuid.uuid4().hex[:16],
+            'request_id': data['request_id'],
+            'status_url': data.get('status_url') or f"{self.queue_url}/{model}/requests/{data['request_id']}/status",
+            'response_url': data.get('response_url') or f"{self.queue_url}/{model}/requests/{data['request_id']}",
+            'model': model,
+            'kind': kind,
+            'prompt': prompt,
+            'thread_id': thread_id,
+            'status': QUEUED,
+            'video_url': None,
+            'local_path': None,
+            'error': None,
+            'created_at': now,
+            'updated_at': now
+        }
+
+        conn = self._connection()
+        conn.execute(f"INSERT INTO video_jobs ({', '.join(JOB_COLUMNS)}) VALUES ({', '.join('?' * len(JOB_COLUMNS))})",
+                     tuple(job[column] for column in JOB_COLUMNS))
+
+        print(f"VIDEO_JOBS: Submitted {kind} job {job['id']} (FAL request {job['request_id']})")
+        self._ensure_poller()
+        return job
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """Current state of a job, whichever worker submitted or completed it"""
+        row = self._connection().execute('SELECT * FROM video_jobs WHERE id = ?', (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def jobs_for_thread(self, thread_id: str) -> List[Dict]:
+        """All jobs for a conversation thread, newest first"""
+        rows = self._connection().execute(
+            'SELECT * FROM video_jobs WHERE thread_id = ? ORDER BY created_at DESC', (thread_id,))
+        return [dict(row) for row in rows]
+
+    def handle_webhook(self, payload: Dict) -> bool:
+        """
+        Apply a FAL webhook callback
+
+        Returns:
+            bool: True if the request ID belongs to a known job
+        """
+        row = self._connection().execute('SELECT id FROM video_jobs WHERE request_id = ?',
+                                         (payload.get('request_id'),)).fetchone()
+        if row is None:
+            return False
+
+        if payload.get('status') == 'OK':
+            # Download off the request thread - FAL expects a quick 200
+            threading.Thread(target=self._complete, args=(row['id'], payload.get('payload')), daemon=True).start()
+        else:
+            self._transition(row['id'], PENDING_STATES, status=FAILED,
+                             error=payload.get('error') or 'Video generation failed')
+        return True
+
+    def _pending_jobs(self) -> List[Dict]:
+        """Jobs to poll: pending ones, plus downloads abandoned by a dead worker (moved back to running)"""
+        conn = self._connection()
+        conn.execute('UPDATE video_jobs SET status = ?, updated_at = ? WHERE status = ? AND updated_at < ?',
+                     (RUNNING, time.time(), DOWNLOADING, time.time() - DOWNLOAD_STALE_AFTER))
+        rows = conn.execute(f"SELECT * FROM video_jobs WHERE status IN ({', '.join('?' * len(PENDING_STATES))})",
+                            PENDING_STATES)
+        return [dict(row) for row in rows]
+
+    def poll_once(self) -> None:
+        """Check every pending job against the FAL queue once"""
+        headers = {'Authorization': f"Key {os.getenv('FAL_KEY')}"}
+        for job in self._pending_jobs():
+            if time.time() - job['created_at'] > self.job_timeout:
+                self._transition(job['id'], PENDING_STATES, status=FAILED, error='Video generation timed out')
+                continue
+            try:
+                response = requests.get(job['status_url'], headers=headers, timeout=15)
+                response.raise_for_status()
+                status = response.json().get('status')
+
+                if status == 'COMPLETED':
+                    result = requests.get(job['response_url'], headers=headers, timeout=30)
+                    if result.ok:
+                        self._complete(job['id'], result.json())
+                    else:
+                        self._transition(job['id'], PENDING_STATES, status=FAILED,
+                                         error=f"FAL returned {result.status_code}")
+                elif status == 'IN_PROGRESS' and job['status'] != RUNNING:
+                    self._transition(job['id'], (QUEUED,), status=RUNNING)
+            except Exception as e:
+                # Transient - try again on the next tick
+                print(f"VIDEO_JOBS: Poll failed for job {job['id']}: {e}")
+
+    def local_files(self, job_ids: Iterable[str]) -> Set[str]:
+        """Downloaded video paths of the given jobs"""
+        job_ids = list(job_ids)
+        paths = set()
+        for i in range(0, len(job_ids), 500):
+            batch = job_ids[i:i + 500]
+            rows = self._connection().execute(
+                f"SELECT local_path FROM video_jobs WHERE local_path IS NOT NULL AND id IN ({', '.join('?' * len(batch))})",
+                batch)
+            paths.update(row['local_path'] for row in rows)
+        return paths
+
+    def purge_finished(self, keep: Set[str], dry_run: bool = False) -> int:
+        """
+        Delete jobs finished more than FINISHED_JOB_TTL ago
+
+        Args:
+            keep: IDs of jobs a conversation still shows as a placeholder
+            dry_run: Only count them
+
+        Returns:
+            int: Jobs purged (or that would be)
+        """
+        conn = self._connection()
+        expired = [row['id'] for row in conn.execute('SELECT id FROM video_jobs WHERE status IN (?, ?) AND updated_at < ?',
+                                                     (COMPLETED, FAILED, time.time() - FINISHED_JOB_TTL))
+                   if row['id'] not in keep]
+        if not dry_run:
+            conn.executemany('DELETE FROM video_jobs WHERE id = ?', [(job_id,) for job_id in expired])
+        return len(expired)
+
+    def get_stats(self) -> Dict:
+        """Job counts by status"""
+        return dict(self._connection().execute('SELECT status, COUNT(*) FROM video_jobs GROUP BY status').fetchall())
+
+    def resume_pending(self) -> None:
+        """Restart polling for jobs left pending by a previous process"""
+        if self._has_pending():
+            self._ensure_poller()
+
+    def _has_pending(self) -> bool:
+        return self._connection().execute(
+            'SELECT 1 FROM video_jobs WHERE status IN (?, ?, ?) LIMIT 1', (*PENDING_STATES, DOWNLOADING)
+        ).fetchone() is not None
+
+    def _complete(self, job_id: str, result: Dict) -> None:
+        """Download the finished video and mark the job done (the caller that claims it wins)"""
+        if not self._transition(job_id, PENDING_STATES, status=DOWNLOADING):
+            return  # Another worker (or the webhook) already has it
+
+        video_url = extract_video_url(result)
+        if not video_url:
+            self._transition(job_id, (DOWNLOADING,), status=FAILED, error='No video in FAL result')
+            return
+
+        try:
+            local_path = self.downloader(video_url) if self.downloader else None
+            self._transition(job_id, (DOWNLOADING,), status=COMPLETED, video_url=video_url, local_path=local_path)
+            print(f"VIDEO_JOBS: Job {job_id} completed -> {local_path}")
+        except Exception as e:
+            # Fall back to the FAL-hosted URL, like the synchronous tools used to
+            print(f"VIDEO_JOBS: Download failed for job {job_id}: {e}")
+            self._transition(job_id, (DOWNLOADING,), status=COMPLETED, video_url=video_url)
+
+    def _transition(self, job_id: str, from_states: Sequence[str], **fields) -> bool:
+        """
+        Update a job only if it is still in one of from_states
+
+        Returns:
+            bool: True if this call made the change
+        """
+        fields['updated_at'] = time.time()
+        assignments = ', '.join(f"{column} = ?" for column in fields)
+        cursor = self._connection().execute(
+            f"UPDATE video_jobs SET {assignments} WHERE id = ? AND status IN ({', '.join('?' * len(from_states))})",
+            (*fields.values(), job_id, *from_states))
+        return cursor.rowcount == 1
+
+    def _ensure_poller(self) -> None:
+        """Start the background poller if it isn't running"""
+        with self._lock:
+            if self._poller and self._poller.is_alive():
+                return
+            self._poller = threading.Thread(target=self._poll_loop, name='video-job-poller', daemon=True)
+            self._poller.start()
+
+    def _poll_loop(self) -> None:
+        """Poll until no jobs are pending, then exit (restarted by the next submit)"""
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self._poll_if_due()
+                # Checked under the lock _ensure_poller takes: a job submitted after this
+                # check finds _poller cleared and starts a new thread
+                with self._lock:
+                    if not self._has_pending():
+                        self._poller = None
+                        return
+            except Exception as e:
+                print(f"VIDEO_JOBS: Poll loop error: {e}")
+
+    def _poll_if_due(self) -> bool:
+        """Poll unless another worker is polling or polled within the interval"""
+        with open(self.lock_path, 'a') as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return False
+                if time.time() - os.stat(self.lock_path).st_mtime < self.poll_interval * 0.9:
+                    return False
+            try:
+                self.poll_once()
+            finally:
+                os.utime(self.lock_path)
+        return True
+
+# Global video job manager instance
+video_jobs = VideoJobManager()
@@ -8,17 +8,32 @@ import json
 import secrets
 import requests
 from werkzeug.utils import secure_filename
-from app import app as langgraph_app, encode_image_to_content_block, set_recent_image_path, clear_thread_cache, clear_thread_context, reset_all_context, set_current_thread_id, set_document_context, update_document_latest, add_uploaded_file, get_latest_uploaded_file, get_unified_file_context
+from app import app as langgraph_app, encode_image_to_content_block, set_recent_image_path, clear_thread_cache, clear_thread_context, reset_all_context, set_current_thread_id, set_document_context, update_document_latest, add_uploaded_file, get_latest_uploaded_file, get_unified_file_context, render_video_job
+from video_jobs import video_jobs
 
 # Import authentication modules
 from models import UserManager
-from auth import login_required, admin_required, optional_auth, get_current_user, get_user_id, create_session, clear_session, get_client_ip, get_user_agent, rate_limit_check, validate_password_strength, sanitize_username, is_valid_email, init_auth
+from auth import login_required, admin_required, optional_auth, get_current_user, get_user_id, create_session, clear_session, invalidate_session, invalidate_user, get_client_ip, get_user_agent, rate_limit_check, validate_password_strength, sanitize_username, is_valid_email, init_auth
 
 # Enhanced user management imports
 from config import get_config
 from models_v2 import db, init_db
+from migrate_database import require_migrated_user_db
 from api_routes import api as api_v2
 from quota_service import quota_service
+from analytics_service import analytics_service
+from history_budget import history_budget
+from page_cache import page_cache
+from media_files import media_files
+from conversation_store import conversation_store, ConversationConflict
+from conversation_export import EXPORT_FORMATS, render_conversation, stream_zip
+from bounded_cache import BoundedCache, file_version, get_all_stats as get_cache_stats
+from compression import init_compression
+from rate_limit import init_rate_limiting, rate_limiter
+from usage_buffer import usage_buffer
+from retention import retention_sweeper
+from blob_store import blob_store
+from upload_sessions import upload_sessions, UploadNotFound, UploadOffsetMismatch, UploadChecksumMismatch, UploadBusy, UploadTooLarge, UploadQuotaExceeded
 
 # Initialize Flask app
 web_app = Flask(__name__)
@@ -58,6 +73,14 @@ os.makedirs(CONVERSATIONS_DIR, exist_ok=True)
 
 # Initialize enhanced database with SQLAlchemy
 init_db(web_app)
+# Users still in the pre-SQLAlchemy database would silently be unable to log in
+require_migrated_user_db(web_app)
+
+# Write usage logging behind the request path (batched, crash-safe append log)
+usage_buffer.init_app(web_app)
+
+# Expired uploads, generated files and upload rows are swept in the background
+retention_sweeper.init_app(web_app)
 
 # Initialize authentication
 init_auth(web_app)
@@ -68,6 +91,12 @@ user_manager = UserManager()
 # Register enhanced API routes
 web_app.register_blueprint(api_v2)
 
+# Compress large JSON/HTML responses (gzip/brotli, negotiated per request)
+init_compression(web_app)
+
+# Sliding-window rate limits on chat, upload and auth endpoints
+init_rate_limiting(web_app, get_current_user, get_client_ip)
+
 # ===== Security Headers for A+ Rating =====
 @web_app.after_request
 def add_security_headers(response):
@@ -109,7 +138,9 @@ def add_security_headers(response):
     response.headers['Permissions-Policy'] = 'geolocation=(), microphone=(), camera=()'
 
     # Cache-Control - Enable browser caching for static assets (Core Web Vitals optimization)
-    if request.path.endswith(('.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.webp')):
+    if response.cache_control.max_age is not None:
+        pass  # View set its own policy (e.g. prerendered landing pages with ETags)
+    elif request.path.endswith(('.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.webp')):
         response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'  # 1 year
     elif request.path.endswith(('.css', '.js')):
         response.headers['Cache-Control'] = 'public, max-age=2592000'  # 30 days
@@ -186,22 +217,20 @@ os.makedirs('feature_requests', exist_ok=True)
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp', 'heic', 'heif'}
 ALLOWED_DOCUMENT_EXTENSIONS = {'pdf', 'docx', 'doc', 'xlsx', 'xls', 'pptx', 'ppt', 'csv', 'txt', 'html', 'htm', 'png', 'jpg', 'jpeg', 'gif', 'webp', 'heic', 'heif'}
 
+# Per-worker state is held in bounded LRU caches (see bounded_cache.py) so RSS stays flat
 # Store recent images for editing reference
-recent_images = {}
+recent_images = BoundedCache('recent_images', ttl=config.THREAD_CONTEXT_TTL, sliding=True)
 # Store the most recent image per thread for editing context
-thread_image_context = {}
+thread_image_context = BoundedCache('thread_image_context', ttl=config.THREAD_CONTEXT_TTL, sliding=True)
 # Store document context per thread for operations (tracks both original upload and conversions)
 # Structure: {
 #   'original': {'path': '...', 'filename': '...', 'timestamp': ...},  # Never overwritten
 #   'latest': {'path': '...', 'filename': '...', 'timestamp': ...}     # Updated with each conversion
 # }
-thread_document_context = {}
-# Store shared conversations
-shared_conversations = {}
-# Store feature requests
-feature_requests = {}
-# Store user conversations persistently
-user_conversations = {}
+thread_document_context = BoundedCache('thread_document_context', ttl=config.THREAD_CONTEXT_TTL, sliding=True)
+# Shared conversations and feature requests, versioned by file so other workers' writes are seen
+shared_conversations = BoundedCache('shared_conversations')
+feature_requests = BoundedCache('feature_requests')
 
 # Conversations directory already created above with CONVERSATIONS_DIR
 
@@ -426,8 +455,7 @@ def chat():
         if (not history or len(history) == 0) and thread_id not in thread_image_context and not has_uploaded_files:
             clear_thread_context(thread_id)
             # Also clear web_app level context
-            if thread_id in thread_image_context:
-                del thread_image_context[thread_id]
+            thread_image_context.pop(thread_id, None)
             # ADDITIONAL FIX: Reset the global current thread ID to prevent cross-conversation contamination
             reset_all_context()
             print(f"NEW CONVERSATION FIX: Cleared all global context for fresh start")
@@ -439,7 +467,7 @@ def chat():
         # ENHANCED FIX: Also clear context when starting multi-step tasks to prevent contamination
         # BUT: Don't clear if we already have images/files in context (continuing a workflow)
         is_multi_step_start = any(keyword in message.lower() for keyword in ['create', 'combine', 'generate', 'make']) and len(message.split('.')) >= 2
-        has_existing_images = thread_id in thread_image_context and thread_image_context[thread_id]
+        has_existing_images = thread_image_context.get(thread_id)
         if is_multi_step_start and len(history) <= 1 and not has_existing_images and not has_uploaded_files:
             clear_thread_context(thread_id)
             reset_all_context()
@@ -484,21 +512,9 @@ def chat():
         if len(history) <= 4:  # If very short history, might be new conversation with residual context
             history_limit = 2  # Only keep last 2 messages to prevent context bleeding
         
-        for msg in history[-history_limit:]:
-            # Add image context information if present, but exclude image content to prevent bleeding
-            content = msg.get('content', '')
-
-            # CRITICAL FIX: Filter out any HTML img tags from history to prevent image bleeding
-            import re
-            content = re.sub(r'<img[^>]*>', '', content)
-
-            if msg.get('hasImage', False):
-                content = f"[Previous message included an image] {content}"
-
-            messages.append({
-                "role": msg.get('role', 'user'),
-                "content": content
-            })
+        # Token-budgeted: img tags stripped (prevents image bleeding), older messages
+        # compacted to a short summary that keeps file paths instead of full tool output
+        messages.extend(history_budget.build(history, history_limit))
 
         # DEBUG: Check what the unified context actually contains
         print(f"DEBUG_CONTEXT: About to check unified context for thread_id={thread_id}", flush=True)
@@ -601,14 +617,11 @@ def chat():
             is_manipulation = any(keyword in message.lower() for keyword in manipulation_keywords)
 
             # Check BOTH old web_app.py context AND new unified context from app.py
-            has_document_context = thread_id in thread_document_context
-            doc_context = None
+            doc_context = thread_document_context.get(thread_id)
+            has_document_context = doc_context is not None
 
-            if has_document_context:
-                # Use old context if available
-                doc_context = thread_document_context[thread_id]
-            else:
-                # Try unified context from app.py
+            if not has_document_context:
+                # No old context - try unified context from app.py
                 unified_context = get_unified_file_context(thread_id)
                 document_files = [f for f in unified_context.get('files', []) if f['category'] == 'document']
                 if document_files:
@@ -678,7 +691,8 @@ def chat():
         # Invoke the LangGraph app with recursion limit
         result = langgraph_app.invoke(
             {"messages": messages},
-            config={"configurable": {"thread_id": thread_id}, "recursion_limit": 50}
+            config={"configurable": {"thread_id": thread_id, "user_id": (get_current_user() or {}).get('id')},
+                    "recursion_limit": 50}
         )
         
         response_content = result["messages"][-1].content
@@ -787,13 +801,15 @@ def chat():
             document_path = os.path.join(DOCUMENTS_DIR, filename)
             if os.path.exists(document_path):
                 # Update only the 'latest' field, preserving 'original'
-                if thread_id in thread_document_context:
+                existing_context = thread_document_context.get(thread_id)
+                if existing_context is not None:
                     # Preserve original, update latest
-                    thread_document_context[thread_id]['latest'] = {
+                    existing_context['latest'] = {
                         'path': document_path,
                         'filename': filename,
                         'timestamp': time.time()
                     }
+                    thread_document_context.resize(thread_id)
                     print(f"DOCUMENT CONTEXT: Updated 'latest' for thread {thread_id}: {filename}", file=sys.stderr)
 
                     # ALSO update context in app.py for LangGraph check_available_assets tool
@@ -884,6 +900,9 @@ def chat():
         # DISABLED PROBLEMATIC FALLBACK: This was causing inappropriate image attachments
         # The agent should handle image operations correctly without fallback
         pass
+
+        # Generated files have no UploadedFile row - keep them for the requester's tier
+        retention_sweeper.record_owner(response_content)
         
         return jsonify({
             'response': response_content,
@@ -942,7 +961,7 @@ def analyze_image():
             filename = secure_filename(file.filename)
             unique_filename = f"{timestamp}_{i}_{filename}"
             file_path = os.path.join(web_app.config['UPLOAD_FOLDER'], unique_filename)
-            file.save(file_path)
+            blob_store.save_upload(file, file_path)
             saved_paths.append(file_path)
         
         thread_id = str(uuid.uuid4())
@@ -1010,7 +1029,8 @@ def analyze_image():
         # Invoke the LangGraph app - agent will decide what to do based on prompt and image count
         result = langgraph_app.invoke(
             {"messages": [user_msg]},
-            config={"configurable": {"thread_id": thread_id}, "recursion_limit": 50}
+            config={"configurable": {"thread_id": thread_id, "user_id": (get_current_user() or {}).get('id')},
+                    "recursion_limit": 50}
         )
         
         response_content = result["messages"][-1].content
@@ -1050,6 +1070,8 @@ def analyze_image():
         # The agent should handle image operations correctly without fallback
         pass
 
+        retention_sweeper.record_owner(response_content)
+
         return jsonify({
             'response': response_content,
             'thread_id': thread_id,
@@ -1063,11 +1085,12 @@ def analyze_image():
 
 @web_app.route('/assets/<filename>')
 def serve_asset(filename):
-    return send_from_directory(ASSETS_DIR, filename)
+    # QR/barcode tools write fixed or per-second names that can be regenerated - revalidate instead of immutable
+    return media_files.send(ASSETS_DIR, filename, immutable=False)
 
 @web_app.route('/uploads/<filename>')
 def serve_upload(filename):
-    return send_from_directory(web_app.config['UPLOAD_FOLDER'], filename)
+    return media_files.send(web_app.config['UPLOAD_FOLDER'], filename)
 
 @web_app.route('/logo.png')
 def serve_logo():
@@ -1085,7 +1108,34 @@ def serve_indexnow_key():
 
 @web_app.route('/videos/<filename>')
 def serve_video(filename):
-    return send_from_directory(VIDEOS_DIR, filename)
+    return media_files.send(VIDEOS_DIR, filename)
+
+# === Background Video Jobs ==================================================
+
+@web_app.route('/api/video-jobs/<job_id>')
+def get_video_job(job_id):
+    """Status of a queued video generation - polled by the chat UI placeholder"""
+    job = video_jobs.get_job(job_id)
+    if not job:
+        return jsonify({'error': 'Video job not found'}), 404
+
+    response = {'id': job['id'], 'status': job['status'], 'error': job['error']}
+    if job['status'] == 'completed':
+        response['html'] = render_video_job(job)
+        # Polled by the chat that queued it - the video is kept for that user's tier
+        retention_sweeper.record_owner(response['html'])
+    return jsonify(response)
+
+@web_app.route('/api/fal-webhook', methods=['POST'])
+def fal_webhook():
+    """Completion callback from the FAL queue (enabled by FAL_WEBHOOK_SECRET)"""
+    if not config.FAL_WEBHOOK_SECRET or not secrets.compare_digest(request.args.get('token', ''), config.FAL_WEBHOOK_SECRET):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    payload = request.get_json(silent=True) or {}
+    if not video_jobs.handle_webhook(payload):
+        return jsonify({'error': 'Unknown request'}), 404
+    return jsonify({'success': True})
 
 # === UNIFIED FILE UPLOAD (Agent-Driven - No Hardcoded Logic) ================
 
@@ -1113,7 +1163,7 @@ def upload_file_unified():
         timestamp = int(time.time() * 1000)
         unique_filename = f"{timestamp}_{filename}"
         file_path = os.path.join(web_app.config['UPLOAD_FOLDER'], unique_filename)
-        file.save(file_path)
+        blob_store.save_upload(file, file_path)
 
         file_size = os.path.getsize(file_path)
 
@@ -1158,12 +1208,129 @@ def upload_file_unified():
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+# === RESUMABLE CHUNKED UPLOADS (large files, flaky connections) ==============
+
+def upload_session_response(status, code=200):
+    """Session status as JSON plus tus-style Upload-Offset/Upload-Length headers"""
+    body = {'success': True, **status}
+    if status['complete']:
+        # Same shape as /api/upload-file once the file is in place
+        body.update({
+            'unique_filename': status['file']['unique_filename'],
+            'file_path': f"/uploads/{status['file']['unique_filename']}",
+            'category': status['file'].get('category'),
+            'message': f"File uploaded: {status['filename']}"
+        })
+    response = jsonify(body)
+    response.status_code = code
+    response.headers['Upload-Offset'] = str(status['offset'])
+    response.headers['Upload-Length'] = str(status['size'])
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@web_app.route('/api/uploads', methods=['POST'])
+@optional_auth
+def create_upload_session():
+    """Open a resumable upload: {filename, size, thread_id, sha256 (optional, whole file)}"""
+    data = request.get_json(silent=True) or {}
+    try:
+        status = upload_sessions.create(
+            filename=data.get('filename'),
+            size=data.get('size'),
+            thread_id=data.get('thread_id', 'default'),
+            user_id=(get_current_user() or {}).get('id'),
+            sha256=data.get('sha256'),
+            client_ip=get_client_ip()
+        )
+    except UploadQuotaExceeded as e:
+        return jsonify({'error': str(e)}), 429
+    except UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    response = upload_session_response(status, 201)
+    response.headers['Location'] = f"/api/uploads/{status['upload_id']}"
+    return response
+
+@web_app.route('/api/uploads/<upload_id>', methods=['GET'])
+@optional_auth
+def get_upload_session(upload_id):
+    """Offset to resume from (HEAD returns just the headers)"""
+    try:
+        return upload_session_response(upload_sessions.status(upload_id, (get_current_user() or {}).get('id')))
+    except UploadNotFound:
+        return jsonify({'error': 'Upload not found or expired'}), 404
+
+@web_app.route('/api/uploads/<upload_id>', methods=['PATCH', 'PUT'])
+@optional_auth
+def upload_session_chunk(upload_id):
+    """
+    Append the raw request body at Upload-Offset, streamed to disk
+
+    An optional Upload-Checksum header ('sha256 <base64 digest>') is verified
+    before the chunk counts; the chunk that completes the file also registers
+    it with the thread like /api/upload-file does. If registering fails the
+    response is a 500 and resending the last chunk retries it.
+    """
+    try:
+        offset = int(request.headers['Upload-Offset'])
+    except (KeyError, ValueError):
+        return jsonify({'error': 'Upload-Offset header is required'}), 400
+    if request.content_length is None:
+        return jsonify({'error': 'Content-Length header is required'}), 411
+
+    def register(session, file_path):
+        file_info = add_uploaded_file(
+            thread_id=session['thread_id'],
+            file_path=file_path,
+            filename=session['filename'],
+            file_size=session['size']
+        )
+        print(f"CHUNKED_UPLOAD: Stored '{session['filename']}' in context for thread {session['thread_id']}", flush=True)
+        return {'category': file_info['category']}
+
+    try:
+        status = upload_sessions.write_chunk(upload_id, (get_current_user() or {}).get('id'), offset, request.stream, request.content_length,
+                                             checksum=request.headers.get('Upload-Checksum'), on_complete=register)
+        return upload_session_response(status)
+    except UploadNotFound:
+        return jsonify({'error': 'Upload not found or expired'}), 404
+    except UploadOffsetMismatch as e:
+        # Client resumes from the offset we actually have
+        response = jsonify({'error': 'Offset mismatch', 'offset': e.current_offset})
+        response.status_code = 409
+        response.headers['Upload-Offset'] = str(e.current_offset)
+        return response
+    except UploadBusy:
+        return jsonify({'error': 'Another chunk for this upload is still being written'}), 409
+    except UploadChecksumMismatch as e:
+        return jsonify({'error': str(e)}), 460  # tus "Checksum Mismatch"
+    except UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"ERROR in chunked upload {upload_id}: {e}", flush=True)
+        return jsonify({'error': str(e)}), 500
+
+@web_app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+@optional_auth
+def delete_upload_session(upload_id):
+    """Abandon an upload and free its bytes"""
+    try:
+        upload_sessions.abort(upload_id, (get_current_user() or {}).get('id'))
+    except UploadNotFound:
+        return jsonify({'error': 'Upload not found or expired'}), 404
+    return jsonify({'success': True})
+
 # === DOCUMENT PROCESSING ENDPOINTS ==========================================
 
 @web_app.route('/documents/<filename>')
 def serve_document(filename):
     """Serve converted document files"""
-    return send_from_directory(DOCUMENTS_DIR, filename)
+    # Converted outputs can be regenerated under the same name - revalidate instead of immutable
+    return media_files.send(DOCUMENTS_DIR, filename, immutable=False)
 
 @web_app.route('/api/upload-document', methods=['POST'])
 @optional_auth
@@ -1194,7 +1361,7 @@ def upload_document():
 
         # Save to documents directory for permanent storage
         file_path = os.path.join(DOCUMENTS_DIR, unique_filename)
-        file.save(file_path)
+        blob_store.save_upload(file, file_path)
 
         # Get file info
         file_size = os.path.getsize(file_path)
@@ -1279,7 +1446,7 @@ def upload_documents():
 
             # Save to documents directory
             file_path = os.path.join(DOCUMENTS_DIR, unique_filename)
-            file.save(file_path)
+            blob_store.save_upload(file, file_path)
 
             # Get file info
             file_size = os.path.getsize(file_path)
@@ -1352,7 +1519,7 @@ def upload_permanent_file():
 
         # Save file to permanent storage
         file_path = os.path.join(PERMANENT_FILES_DIR, stored_filename)
-        file.save(file_path)
+        blob_store.save_upload(file, file_path)
 
         # Get file info
         file_size = os.path.getsize(file_path)
@@ -1408,8 +1575,7 @@ def clear_context():
         
         if thread_id:
             clear_thread_context(thread_id)
-            if thread_id in thread_image_context:
-                del thread_image_context[thread_id]
+            thread_image_context.pop(thread_id, None)
         
         return jsonify({'success': True})
     except Exception as e:
@@ -1559,6 +1725,7 @@ def api_logout():
         
         if session_token:
             user_manager.logout_user(session_token)
+            invalidate_session(session_token)
         
         # Clear session
         clear_session()
@@ -1609,6 +1776,8 @@ def api_update_profile():
         
         # Update profile
         result = user_manager.update_user_profile(user_id, **update_data)
+        if result.get('success'):
+            invalidate_user(user_id)
         
         return jsonify(result)
         
@@ -1684,7 +1853,7 @@ def share_conversation():
             json.dump(shared_conversation, f, indent=2)
         
         # Also store in memory for quick access
-        shared_conversations[share_id] = shared_conversation
+        shared_conversations.set(share_id, shared_conversation, version=file_version(shared_file_path))
         
         # Get the base URL (works for both localhost and production)
         base_url = request.host_url.rstrip('/')
@@ -1703,16 +1872,15 @@ def share_conversation():
 def view_shared_conversation(share_id):
     """View a shared conversation"""
     try:
-        # Try to load from memory first
-        shared_conversation = shared_conversations.get(share_id)
-        
-        # If not in memory, try to load from file
-        if not shared_conversation:
-            shared_file_path = os.path.join('shared', f'{share_id}.json')
-            if os.path.exists(shared_file_path):
+        # Memory copy is only used while the file is unchanged
+        shared_file_path = os.path.join('shared', f'{share_id}.json')
+        version = file_version(shared_file_path)
+        shared_conversation = None
+        if version is not None:
+            def load_shared():
                 with open(shared_file_path, 'r') as f:
-                    shared_conversation = json.load(f)
-                    shared_conversations[share_id] = shared_conversation
+                    return json.load(f)
+            shared_conversation = shared_conversations.get_or_load(share_id, load_shared, version=version)
         
         if not shared_conversation:
             return render_template('shared_not_found.html'), 404
@@ -1751,92 +1919,99 @@ def save_conversation():
         if not conversation_id or not conversation_data:
             return jsonify({'error': 'Missing conversation_id or conversation_data'}), 400
         
-        # Create user-specific conversation directory
-        user_conv_dir = os.path.join(CONVERSATIONS_DIR, user_id)
-        os.makedirs(user_conv_dir, exist_ok=True)
+        enhanced_conversation = conversation_store.save(user_id, conversation_id, conversation_data)
         
-        # Save conversation to file
-        conv_file_path = os.path.join(user_conv_dir, f'{conversation_id}.json')
+        return jsonify({
+            'success': True, 
+            'message': 'Conversation saved successfully',
+            'saved_at': enhanced_conversation['saved_at'],
+            'version': enhanced_conversation['version']
+        })
         
-        # Add server-side metadata
-        enhanced_conversation = {
-            **conversation_data,
-            'saved_at': time.time(),
-            'user_id': user_id,
-            'server_saved': True
-        }
+    except Exception as e:
+        print(f"Error saving conversation: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@web_app.route('/api/save-conversation-delta', methods=['POST'])
+@optional_auth
+def save_conversation_delta():
+    """Save only the messages added or changed since the client's last acknowledged version"""
+    try:
+        data = request.get_json() or {}
+        conversation_id = data.get('conversation_id')
+        base_version = data.get('base_version')
+        user_id = get_user_id()  # Get authenticated user ID
         
-        with open(conv_file_path, 'w', encoding='utf-8') as f:
-            json.dump(enhanced_conversation, f, indent=2, ensure_ascii=False)
+        if not conversation_id or not isinstance(base_version, int):
+            return jsonify({'error': 'Missing conversation_id or base_version'}), 400
         
-        # Also store in memory for quick access
-        if user_id not in user_conversations:
-            user_conversations[user_id] = {}
-        user_conversations[user_id][conversation_id] = enhanced_conversation
+        result = conversation_store.append(user_id, conversation_id, base_version,
+                                           set_fields=data.get('set'), arrays=data.get('arrays'))
         
         return jsonify({
-            'success': True, 
-            'message': 'Conversation saved successfully',
-            'saved_at': enhanced_conversation['saved_at']
+            'success': True,
+            'version': result['version'],
+            'messageCount': result['message_count']
         })
         
+    except ConversationConflict as e:
+        # Another tab/device saved first - the client merges the current version and retries
+        return jsonify({'error': 'Conversation was modified', 'current_version': e.current_version}), 409
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        print(f"Error saving conversation: {e}")
+        print(f"Error saving conversation delta: {e}")
         return jsonify({'error': str(e)}), 500
 
 @web_app.route('/api/load-conversations')
 @optional_auth
 def load_conversations():
-    """Load all conversations for a user from server-side storage"""
+    """List a page of the user's conversations, most recent first (?limit=, ?cursor=)"""
     try:
         user_id = get_user_id()  # Get authenticated user ID
         
-        # Load from memory first
-        if user_id in user_conversations:
-            conversations = user_conversations[user_id]
-        else:
-            conversations = {}
-            
-        # Load from files if not in memory
-        user_conv_dir = os.path.join(CONVERSATIONS_DIR, user_id)
-        if os.path.exists(user_conv_dir):
-            for filename in os.listdir(user_conv_dir):
-                if filename.endswith('.json'):
-                    conv_id = filename[:-5]  # Remove .json extension
-                    if conv_id not in conversations:
-                        conv_file_path = os.path.join(user_conv_dir, filename)
-                        try:
-                            with open(conv_file_path, 'r', encoding='utf-8') as f:
-                                conversation = json.load(f)
-                                conversations[conv_id] = conversation
-                        except Exception as e:
-                            print(f"Error loading conversation {filename}: {e}")
-            
-            # Store in memory for next time
-            user_conversations[user_id] = conversations
-        
-        # Sort conversations by lastUpdated or saved_at
-        sorted_conversations = []
-        for conv_id, conv_data in conversations.items():
-            sorted_conversations.append({
-                'id': conv_id,
-                'title': conv_data.get('title', 'Untitled Chat'),
-                'lastUpdated': conv_data.get('lastUpdated', conv_data.get('saved_at', 0)),
-                'messageCount': len(conv_data.get('messages', [])),
-                'server_saved': conv_data.get('server_saved', False)
-            })
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+        cursor = request.args.get('cursor')
         
-        sorted_conversations.sort(key=lambda x: x['lastUpdated'], reverse=True)
+        # Metadata comes from the index - conversation bodies aren't read here
+        conversations, next_cursor = conversation_store.list(user_id, limit=limit, cursor=cursor)
         
         return jsonify({
             'success': True,
-            'conversations': sorted_conversations[:50]  # Limit to 50 recent conversations
+            'conversations': conversations,
+            'next_cursor': next_cursor
         })
         
     except Exception as e:
         print(f"Error loading conversations: {e}")
         return jsonify({'error': str(e)}), 500
 
+@web_app.route('/api/search-conversations')
+@optional_auth
+def search_conversations():
+    """Full-text search over the user's conversation titles and messages (?q=, ?limit=, ?offset=)"""
+    try:
+        user_id = get_user_id()  # Get authenticated user ID
+        query = request.args.get('q', '').strip()
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        
+        if not query:
+            return jsonify({'error': 'Missing search query'}), 400
+        
+        results, has_more = conversation_store.search(user_id, query, limit=limit, offset=offset)
+        
+        return jsonify({
+            'success': True,
+            'query': query,
+            'results': results,
+            'next_offset': offset + limit if has_more else None
+        })
+        
+    except Exception as e:
+        print(f"Error searching conversations: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @web_app.route('/api/get-conversation/<conversation_id>')
 @optional_auth
 def get_conversation(conversation_id):
@@ -1844,22 +2019,9 @@ def get_conversation(conversation_id):
     try:
         user_id = get_user_id()  # Get authenticated user ID
         
-        # Check memory first
-        if user_id in user_conversations and conversation_id in user_conversations[user_id]:
-            conversation = user_conversations[user_id][conversation_id]
-        else:
-            # Load from file
-            conv_file_path = os.path.join(CONVERSATIONS_DIR, user_id, f'{conversation_id}.json')
-            if os.path.exists(conv_file_path):
-                with open(conv_file_path, 'r', encoding='utf-8') as f:
-                    conversation = json.load(f)
-                
-                # Store in memory
-                if user_id not in user_conversations:
-                    user_conversations[user_id] = {}
-                user_conversations[user_id][conversation_id] = conversation
-            else:
-                return jsonify({'error': 'Conversation not found'}), 404
+        conversation = conversation_store.get(user_id, conversation_id)
+        if conversation is None:
+            return jsonify({'error': 'Conversation not found'}), 404
         
         return jsonify({
             'success': True,
@@ -1877,14 +2039,7 @@ def delete_conversation(conversation_id):
     try:
         user_id = get_user_id()  # Get authenticated user ID
         
-        # Remove from memory
-        if user_id in user_conversations and conversation_id in user_conversations[user_id]:
-            del user_conversations[user_id][conversation_id]
-        
-        # Remove file
-        conv_file_path = os.path.join(CONVERSATIONS_DIR, user_id, f'{conversation_id}.json')
-        if os.path.exists(conv_file_path):
-            os.remove(conv_file_path)
+        if conversation_store.delete(user_id, conversation_id):
             return jsonify({'success': True, 'message': 'Conversation deleted'})
         else:
             return jsonify({'error': 'Conversation not found'}), 404
@@ -1902,80 +2057,14 @@ def export_conversation(conversation_id):
         export_format = request.args.get('format', 'json').lower()
         
         # Get conversation data
-        conv_file_path = os.path.join(CONVERSATIONS_DIR, user_id, f'{conversation_id}.json')
-        if not os.path.exists(conv_file_path):
+        conversation = conversation_store.get(user_id, conversation_id)
+        if conversation is None:
             return jsonify({'error': 'Conversation not found'}), 404
         
-        with open(conv_file_path, 'r', encoding='utf-8') as f:
-            conversation = json.load(f)
-        
-        if export_format == 'json':
-            # Return raw JSON
-            return jsonify(conversation)
-        
-        elif export_format == 'markdown':
-            # Convert to Markdown format
-            markdown_content = f"# {conversation.get('title', 'Conversation')}\n\n"
-            markdown_content += f"*Exported on {time.strftime('%B %d, %Y at %I:%M %p')}*\n\n"
-            markdown_content += "---\n\n"
-            
-            for message in conversation.get('messages', []):
-                if message.get('isUser'):
-                    markdown_content += f"**You:** {message['content']}\n\n"
-                else:
-                    # Clean up HTML for markdown
-                    import re
-                    content = message['content']
-                    # Convert HTML images to markdown
-                    content = re.sub(r'<img[^>]+src="([^"]+)"[^>]*>', r'![Image](\1)', content)
-                    # Remove other HTML tags
-                    content = re.sub(r'<[^>]+>', '', content)
-                    markdown_content += f"**AIezzy:** {content}\n\n"
-            
-            return markdown_content, 200, {'Content-Type': 'text/markdown'}
-        
-        elif export_format == 'html':
-            # Convert to HTML format
-            html_content = f"""
-<!DOCTYPE html>
-<html>
-<head>
-    <title>{conversation.get('title', 'Conversation')}</title>
-    <style>
-        body {{ font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif; max-width: 800px; margin: 0 auto; padding: 20px; }}
-        .message {{ margin: 20px 0; padding: 15px; border-radius: 8px; }}
-        .user {{ background: #f0f9ff; border-left: 4px solid #0ea5e9; }}
-        .assistant {{ background: #f9fafb; border-left: 4px solid #6b7280; }}
-        .timestamp {{ color: #6b7280; font-size: 12px; margin-top: 5px; }}
-        img {{ max-width: 100%; height: auto; border-radius: 4px; }}
-    </style>
-</head>
-<body>
-    <h1>{conversation.get('title', 'Conversation')}</h1>
-    <p><em>Exported on {time.strftime('%B %d, %Y at %I:%M %p')}</em></p>
-    <hr>
-"""
-            
-            for message in conversation.get('messages', []):
-                css_class = 'user' if message.get('isUser') else 'assistant'
-                sender = 'You' if message.get('isUser') else 'AIezzy'
-                
-                html_content += f"""
-    <div class="message {css_class}">
-        <strong>{sender}:</strong>
-        <div>{message['content']}</div>
-        {f'<div class="timestamp">{message.get("timestamp", "")}</div>' if message.get('timestamp') else ''}
-    </div>
-"""
-            
-            html_content += """
-</body>
-</html>
-"""
-            return html_content, 200, {'Content-Type': 'text/html'}
-        
-        else:
+        if export_format not in EXPORT_FORMATS:
             return jsonify({'error': 'Invalid format. Use json, markdown, or html'}), 400
+        
+        return render_conversation(conversation, export_format), 200, {'Content-Type': EXPORT_FORMATS[export_format][1]}
             
     except Exception as e:
         print(f"Error exporting conversation: {e}")
@@ -1984,63 +2073,26 @@ def export_conversation(conversation_id):
 @web_app.route('/api/export-all-conversations')
 @login_required
 def export_all_conversations():
-    """Export all conversations as a ZIP file"""
+    """Export all conversations as a ZIP file, streamed as it is built"""
     try:
         user_id = get_user_id()  # Get authenticated user ID
         export_format = request.args.get('format', 'json').lower()
         
-        import zipfile
-        from io import BytesIO
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'error': 'Invalid format. Use json, markdown, or html'}), 400
+        
+        from flask import Response, stream_with_context
         
-        # Create ZIP file in memory
-        zip_buffer = BytesIO()
+        # Conversations are loaded, rendered and compressed one at a time
+        archive = stream_zip(conversation_store.iter_conversations(user_id), export_format)
         
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            user_conv_dir = os.path.join(CONVERSATIONS_DIR, user_id)
-            
-            if os.path.exists(user_conv_dir):
-                for filename in os.listdir(user_conv_dir):
-                    if filename.endswith('.json'):
-                        conv_id = filename[:-5]  # Remove .json extension
-                        
-                        # Get conversation in requested format
-                        if export_format == 'json':
-                            file_path = os.path.join(user_conv_dir, filename)
-                            with open(file_path, 'r', encoding='utf-8') as f:
-                                content = f.read()
-                            zip_file.writestr(f"{conv_id}.json", content)
-                        
-                        else:
-                            # For markdown/html, we need to call the export function
-                            with open(os.path.join(user_conv_dir, filename), 'r', encoding='utf-8') as f:
-                                conversation = json.load(f)
-                            
-                            title = conversation.get('title', 'Conversation').replace('/', '_')
-                            safe_filename = f"{title}_{conv_id}"
-                            
-                            if export_format == 'markdown':
-                                # Generate markdown content
-                                markdown_content = f"# {conversation.get('title', 'Conversation')}\n\n"
-                                for message in conversation.get('messages', []):
-                                    if message.get('isUser'):
-                                        markdown_content += f"**You:** {message['content']}\n\n"
-                                    else:
-                                        import re
-                                        content = message['content']
-                                        content = re.sub(r'<img[^>]+src="([^"]+)"[^>]*>', r'![Image](\1)', content)
-                                        content = re.sub(r'<[^>]+>', '', content)
-                                        markdown_content += f"**AIezzy:** {content}\n\n"
-                                
-                                zip_file.writestr(f"{safe_filename}.md", markdown_content)
-        
-        zip_buffer.seek(0)
-        
-        from flask import send_file
-        return send_file(
-            BytesIO(zip_buffer.read()),
+        return Response(
+            stream_with_context(archive),
             mimetype='application/zip',
-            as_attachment=True,
-            download_name=f'aiezzy_conversations_{user_id}_{int(time.time())}.zip'
+            headers={
+                'Content-Disposition': f'attachment; filename=aiezzy_conversations_{user_id}_{int(time.time())}.zip',
+                'Cache-Control': 'no-cache'
+            }
         )
         
     except Exception as e:
@@ -2113,7 +2165,7 @@ def submit_feature_request():
             json.dump(feature_request, f, indent=2)
         
         # Also store in memory for quick access
-        feature_requests[request_id] = feature_request
+        feature_requests.set(request_id, feature_request, version=file_version(feature_file_path))
         
         return jsonify({
             'success': True,
@@ -2183,7 +2235,7 @@ def vote_feature_request(request_id):
             json.dump(feature_request, f, indent=2)
         
         # Update memory cache
-        feature_requests[request_id] = feature_request
+        feature_requests.set(request_id, feature_request, version=file_version(feature_file_path))
         
         return jsonify({
             'success': True,
@@ -2218,114 +2270,34 @@ def api_admin_dashboard():
         return jsonify({'error': 'Admin access required'}), 401
 
     try:
-        conn = user_manager.db.get_connection()
-
-        # Get total users
-        total_users_result = conn.execute('SELECT COUNT(*) FROM users').fetchone()
-        total_users = total_users_result[0] if total_users_result else 0
-
-        # Get new users today
+        # Total users and active sessions
         from datetime import datetime, timedelta
-        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        new_users_result = conn.execute(
-            'SELECT COUNT(*) FROM users WHERE created_at >= ?',
-            (today.isoformat(),)
-        ).fetchone()
-        new_users_today = new_users_result[0] if new_users_result else 0
-
-        # Get active sessions
-        active_sessions_result = conn.execute(
-            'SELECT COUNT(*) FROM user_sessions WHERE is_active = TRUE'
-        ).fetchone()
-        active_sessions = active_sessions_result[0] if active_sessions_result else 0
-
-        # Count images and videos generated today
-        images_today = 0
-        videos_today = 0
+        counts = user_manager.get_dashboard_counts()
 
-        try:
-            import os
-            from pathlib import Path
-
-            assets_dir = Path('assets')
-            videos_dir = Path('videos')
-
-            if assets_dir.exists():
-                today_ts = today.timestamp()
-                for file in assets_dir.iterdir():
-                    if file.is_file() and file.stat().st_mtime >= today_ts:
-                        images_today += 1
-
-            if videos_dir.exists():
-                today_ts = today.timestamp()
-                for file in videos_dir.iterdir():
-                    if file.is_file() and file.stat().st_mtime >= today_ts:
-                        videos_today += 1
-        except Exception as file_error:
-            print(f"Error counting files: {file_error}")
+        # New users, images and videos today - the UTC day's rollup, as in api_routes
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        usage_today = analytics_service.get_series(today, today + timedelta(days=1), 'day')['totals']
 
         # Get recent users (last 10)
         try:
-            recent_users = conn.execute('''
-                SELECT
-                    id, username, email,
-                    CASE
-                        WHEN is_admin THEN 'enterprise'
-                        ELSE 'free'
-                    END as tier,
-                    is_active, created_at, last_login
-                FROM users
-                ORDER BY created_at DESC
-                LIMIT 10
-            ''').fetchall()
-
-            users_list = [{
-                'id': u[0],
-                'username': u[1],
-                'email': u[2],
-                'tier': u[3],
-                'is_active': bool(u[4]),
-                'created_at': u[5],
-                'last_login': u[6]
-            } for u in recent_users]
+            users_list = user_manager.get_recent_users(limit=10)
         except Exception as users_error:
             print(f"Error loading users: {users_error}")
             users_list = []
 
         # Get top users by activity (last 7 days)
         try:
-            top_usage = conn.execute('''
-                SELECT
-                    u.username,
-                    COUNT(DISTINCT CASE WHEN ua.activity_type = 'image_generated' THEN ua.id END) as images,
-                    COUNT(DISTINCT CASE WHEN ua.activity_type = 'video_generated' THEN ua.id END) as videos,
-                    COUNT(DISTINCT CASE WHEN ua.activity_type = 'message_sent' THEN ua.id END) as messages
-                FROM users u
-                LEFT JOIN user_activity ua ON u.id = ua.user_id
-                    AND ua.created_at >= datetime('now', '-7 days')
-                GROUP BY u.id, u.username
-                HAVING (images + videos + messages) > 0
-                ORDER BY (images + videos + messages) DESC
-                LIMIT 5
-            ''').fetchall()
-
-            usage_list = [{
-                'username': u[0],
-                'images': u[1],
-                'videos': u[2],
-                'messages': u[3]
-            } for u in top_usage]
+            usage_list = user_manager.get_top_activity(days=7, limit=5)
         except Exception as usage_error:
             print(f"Error loading usage stats: {usage_error}")
             usage_list = []
 
         return jsonify({
             'stats': {
-                'total_users': total_users,
-                'new_users_today': new_users_today,
-                'active_sessions': active_sessions,
-                'images_today': images_today,
-                'videos_today': videos_today
+                **counts,
+                'new_users_today': usage_today['signups'],
+                'images_today': usage_today['images'],
+                'videos_today': usage_today['videos']
             },
             'users': users_list,
             'usage': usage_list
@@ -2343,18 +2315,9 @@ def admin_users():
 
     try:
         admin_key = request.args.get('key', '')
-        conn = user_manager.db.get_connection()
 
         # Get all users with stats
-        users = conn.execute('''
-            SELECT
-                u.id, u.username, u.email, u.full_name, u.is_active, u.is_admin,
-                u.created_at, u.last_login,
-                (SELECT COUNT(*) FROM user_activity WHERE user_id = u.id) as activity_count,
-                (SELECT COUNT(*) FROM user_sessions WHERE user_id = u.id AND is_active = TRUE) as active_sessions
-            FROM users u
-            ORDER BY u.created_at DESC
-        ''').fetchall()
+        users = user_manager.list_users_with_stats()
 
         # Get conversation counts for each user
         user_data = []
@@ -2365,11 +2328,10 @@ def admin_users():
                 conversation_count = len([f for f in os.listdir(conv_dir) if f.endswith('.json')])
 
             user_data.append({
-                **dict(user),
+                **user,
                 'conversation_count': conversation_count
             })
 
-        conn.close()
         return render_template('admin_users.html', users=user_data, admin_key=admin_key)
 
     except Exception as e:
@@ -2383,11 +2345,9 @@ def admin_analytics():
 
     try:
         admin_key = request.args.get('key', '')
-        conn = user_manager.db.get_connection()
 
-        # Get analytics data
-        total_users = conn.execute('SELECT COUNT(*) as count FROM users').fetchone()['count']
-        active_users = conn.execute('SELECT COUNT(*) as count FROM users WHERE last_login > date("now", "-7 days")').fetchone()['count']
+        # Get analytics data: user totals, recent activity and activity by type
+        activity = user_manager.get_activity_summary(active_days=7, recent_limit=50)
         total_conversations = 0
         total_images = len([f for f in os.listdir(ASSETS_DIR) if os.path.isfile(os.path.join(ASSETS_DIR, f))]) if os.path.exists(ASSETS_DIR) else 0
         total_videos = len([f for f in os.listdir(VIDEOS_DIR) if os.path.isfile(os.path.join(VIDEOS_DIR, f))]) if os.path.exists(VIDEOS_DIR) else 0
@@ -2399,33 +2359,14 @@ def admin_analytics():
                 if os.path.isdir(user_path):
                     total_conversations += len([f for f in os.listdir(user_path) if f.endswith('.json')])
 
-        # Get recent activity
-        recent_activity = conn.execute('''
-            SELECT ua.*, u.username, u.email
-            FROM user_activity ua
-            JOIN users u ON ua.user_id = u.id
-            ORDER BY ua.created_at DESC
-            LIMIT 50
-        ''').fetchall()
-
-        # Get activity by type
-        activity_by_type = conn.execute('''
-            SELECT activity_type, COUNT(*) as count
-            FROM user_activity
-            GROUP BY activity_type
-            ORDER BY count DESC
-        ''').fetchall()
-
-        conn.close()
-
         analytics_data = {
-            'total_users': total_users,
-            'active_users': active_users,
+            'total_users': activity['total_users'],
+            'active_users': activity['active_users'],
             'total_conversations': total_conversations,
             'total_images': total_images,
             'total_videos': total_videos,
-            'recent_activity': [dict(row) for row in recent_activity],
-            'activity_by_type': [dict(row) for row in activity_by_type]
+            'recent_activity': activity['recent_activity'],
+            'activity_by_type': activity['activity_by_type']
         }
 
         return render_template('admin_analytics.html', analytics=analytics_data, admin_key=admin_key)
@@ -2763,6 +2704,8 @@ def api_delete_files():
                 if os.path.exists(full_path) and os.path.isfile(full_path):
                     os.remove(full_path)
                     deleted_count += 1
+                    if file_type == 'conversation':
+                        conversation_store.unindex_path(file_path)
                 else:
                     errors.append(f"File not found: {file_path}")
 
@@ -2947,6 +2890,48 @@ def api_download_category(category):
         traceback.print_exc()
         return jsonify({'error': f'Failed to create {category} backup: {str(e)}'}), 500
 
+@web_app.route('/admin/api/cache-stats')
+def api_get_cache_stats():
+    """Hit rates and memory use of this worker's in-memory caches"""
+    if not require_admin_auth():
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    return jsonify({
+        'success': True,
+        'worker_pid': os.getpid(),
+        'caches': get_cache_stats(),
+        'user_db_pool': db.engine.pool.status(),
+        'rate_limits': rate_limiter.get_stats(),
+        'usage_buffer': usage_buffer.get_stats(),
+        'blob_store': blob_store.get_stats(),
+        'upload_sessions': upload_sessions.get_stats()
+    })
+
+@web_app.route('/admin/api/retention')
+def api_get_retention():
+    """Retention policies, sweep counters and the last sweep's report"""
+    if not require_admin_auth():
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    return jsonify({'success': True, 'worker_pid': os.getpid(), **retention_sweeper.get_stats()})
+
+@web_app.route('/admin/api/retention/sweep', methods=['POST'])
+def api_retention_sweep():
+    """Run a retention sweep now; ?dry_run=1 only reports what would be deleted"""
+    if not require_admin_auth():
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    dry_run = request.args.get('dry_run', '').lower() in ('1', 'true', 'yes')
+    try:
+        report = retention_sweeper.sweep(dry_run=dry_run)
+    except Exception as e:
+        print(f"[ADMIN] Retention sweep failed: {e}")
+        return jsonify({'error': f'Sweep failed: {str(e)}'}), 500
+
+    if report is None:
+        return jsonify({'error': 'A sweep is already running in another worker'}), 409
+    return jsonify({'success': True, 'report': report})
+
 @web_app.route('/admin/api/stats')
 def api_get_stats():
     """Get file statistics for dashboard"""
@@ -3033,12 +3018,9 @@ def view_conversation(user_id, conversation_id):
         return "Admin access required", 401
     
     try:
-        conv_file_path = os.path.join(CONVERSATIONS_DIR, user_id, f'{conversation_id}.json')
-        if not os.path.exists(conv_file_path):
-            return f"Conversation not found: {conv_file_path}", 404
-        
-        with open(conv_file_path, 'r', encoding='utf-8') as f:
-            conversation_data = json.load(f)
+        conversation_data = conversation_store.get(user_id, conversation_id)
+        if conversation_data is None:
+            return f"Conversation not found: {user_id}/{conversation_id}", 404
         
         return render_template('admin_conversation_view.html', 
                              conversation=conversation_data, 
@@ -3148,7 +3130,7 @@ def sitemap_dynamic():
 def ai_image_generator_page():
     """SEO-optimized landing page for AI image generation"""
     try:
-        return render_template('landing/ai_image_generator.html')
+        return page_cache.serve('landing/ai_image_generator.html')
     except:
         return redirect('/')
 
@@ -3156,7 +3138,7 @@ def ai_image_generator_page():
 def text_to_video_page():
     """SEO-optimized landing page for text-to-video"""
     try:
-        return render_template('landing/text_to_video.html')
+        return page_cache.serve('landing/text_to_video.html')
     except:
         return redirect('/')
 
@@ -3169,7 +3151,7 @@ def image_to_video_page():
 def pdf_converter_page():
     """SEO-optimized landing page for PDF conversion"""
     try:
-        return render_template('landing/pdf_converter.html')
+        return page_cache.serve('landing/pdf_converter.html')
     except:
         return redirect('/')
 
@@ -3177,7 +3159,7 @@ def pdf_converter_page():
 def word_to_pdf_page():
     """SEO-optimized landing page for Word to PDF conversion - 201K searches/month"""
     try:
-        return render_template('landing/word-to-pdf.html')
+        return page_cache.serve('landing/word-to-pdf.html')
     except:
         return redirect('/')
 
@@ -3185,7 +3167,7 @@ def word_to_pdf_page():
 def pdf_to_word_page():
     """SEO-optimized landing page for PDF to Word conversion - 135K searches/month"""
     try:
-        return render_template('landing/pdf-to-word.html')
+        return page_cache.serve('landing/pdf-to-word.html')
     except:
         return redirect('/')
 
@@ -3193,7 +3175,7 @@ def pdf_to_word_page():
 def excel_to_pdf_page():
     """SEO-optimized landing page for Excel to PDF conversion - 90.5K searches/month"""
     try:
-        return render_template('landing/excel-to-pdf.html')
+        return page_cache.serve('landing/excel-to-pdf.html')
     except:
         return redirect('/')
 
@@ -3201,7 +3183,7 @@ def excel_to_pdf_page():
 def pdf_to_excel_page():
     """SEO-optimized landing page for PDF to Excel conversion - 74K searches/month"""
     try:
-        return render_template('landing/pdf-to-excel.html')
+        return page_cache.serve('landing/pdf-to-excel.html')
     except:
         return redirect('/')
 
@@ -3209,7 +3191,7 @@ def pdf_to_excel_page():
 def jpg_to_pdf_page():
     """SEO-optimized landing page for JPG to PDF conversion - 60.5K searches/month"""
     try:
-        return render_template('landing/jpg-to-pdf.html')
+        return page_cache.serve('landing/jpg-to-pdf.html')
     except:
         return redirect('/')
 
@@ -3217,7 +3199,7 @@ def jpg_to_pdf_page():
 def pdf_to_jpg_page():
     """SEO-optimized landing page for PDF to JPG conversion - 49.5K searches/month"""
     try:
-        return render_template('landing/pdf-to-jpg.html')
+        return page_cache.serve('landing/pdf-to-jpg.html')
     except:
         return redirect('/')
 
@@ -3225,7 +3207,7 @@ def pdf_to_jpg_page():
 def png_to_pdf_page():
     """SEO-optimized landing page for PNG to PDF conversion - 40.5K searches/month"""
     try:
-        return render_template('landing/png-to-pdf.html')
+        return page_cache.serve('landing/png-to-pdf.html')
     except:
         return redirect('/')
 
@@ -3233,7 +3215,7 @@ def png_to_pdf_page():
 def pdf_to_png_page():
     """SEO-optimized landing page for PDF to PNG conversion - 33.1K searches/month"""
     try:
-        return render_template('landing/pdf-to-png.html')
+        return page_cache.serve('landing/pdf-to-png.html')
     except:
         return redirect('/')
 
@@ -3241,7 +3223,7 @@ def pdf_to_png_page():
 def ppt_to_pdf_page():
     """SEO-optimized landing page for PowerPoint to PDF conversion - 27.1K searches/month"""
     try:
-        return render_template('landing/ppt-to-pdf.html')
+        return page_cache.serve('landing/ppt-to-pdf.html')
     except:
         return redirect('/')
 
@@ -3249,7 +3231,7 @@ def ppt_to_pdf_page():
 def pdf_to_ppt_page():
     """SEO-optimized landing page for PDF to PowerPoint conversion - 22.2K searches/month"""
     try:
-        return render_template('landing/pdf-to-ppt.html')
+        return page_cache.serve('landing/pdf-to-ppt.html')
     except:
         return redirect('/')
 
@@ -3257,7 +3239,7 @@ def pdf_to_ppt_page():
 def docx_to_pdf_page():
     """SEO-optimized landing page for DOCX to PDF conversion - 45K searches/month"""
     try:
-        return render_template('landing/docx-to-pdf.html')
+        return page_cache.serve('landing/docx-to-pdf.html')
     except:
         return redirect('/')
 
@@ -3265,7 +3247,7 @@ def docx_to_pdf_page():
 def pdf_to_text_page():
     """SEO-optimized landing page for PDF to Text conversion - 40K searches/month"""
     try:
-        return render_template('landing/pdf-to-text.html')
+        return page_cache.serve('landing/pdf-to-text.html')
     except:
         return redirect('/')
 
@@ -3273,7 +3255,7 @@ def pdf_to_text_page():
 def compress_pdf_page():
     """SEO-optimized landing page for PDF compression - 35K searches/month"""
     try:
-        return render_template('landing/compress-pdf.html')
+        return page_cache.serve('landing/compress-pdf.html')
     except:
         return redirect('/')
 
@@ -3281,7 +3263,7 @@ def compress_pdf_page():
 def merge_pdf_page():
     """SEO-optimized landing page for PDF merging - 30K searches/month"""
     try:
-        return render_template('landing/merge-pdf.html')
+        return page_cache.serve('landing/merge-pdf.html')
     except:
         return redirect('/')
 
@@ -3289,7 +3271,7 @@ def merge_pdf_page():
 def split_pdf_page():
     """SEO-optimized landing page for PDF splitting - 25K searches/month"""
     try:
-        return render_template('landing/split-pdf.html')
+        return page_cache.serve('landing/split-pdf.html')
     except:
         return redirect('/')
 
@@ -3297,7 +3279,7 @@ def split_pdf_page():
 def rotate_pdf_page():
     """SEO-optimized landing page for PDF rotation - 18K searches/month"""
     try:
-        return render_template('landing/rotate-pdf.html')
+        return page_cache.serve('landing/rotate-pdf.html')
     except:
         return redirect('/')
 
@@ -3305,7 +3287,7 @@ def rotate_pdf_page():
 def pdf_to_csv_page():
     """SEO-optimized landing page for PDF to CSV conversion - 15K searches/month"""
     try:
-        return render_template('landing/pdf-to-csv.html')
+        return page_cache.serve('landing/pdf-to-csv.html')
     except:
         return redirect('/')
 
@@ -3313,7 +3295,7 @@ def pdf_to_csv_page():
 def csv_to_pdf_page():
     """SEO-optimized landing page for CSV to PDF conversion - 12K searches/month"""
     try:
-        return render_template('landing/csv-to-pdf.html')
+        return page_cache.serve('landing/csv-to-pdf.html')
     except:
         return redirect('/')
 
@@ -3321,7 +3303,7 @@ def csv_to_pdf_page():
 def html_to_pdf_page():
     """SEO-optimized landing page for HTML to PDF conversion - 10K searches/month"""
     try:
-        return render_template('landing/html-to-pdf.html')
+        return page_cache.serve('landing/html-to-pdf.html')
     except:
         return redirect('/')
 
@@ -3329,7 +3311,7 @@ def html_to_pdf_page():
 def pdf_to_html_page():
     """SEO-optimized landing page for PDF to HTML conversion - 8K searches/month"""
     try:
-        return render_template('landing/pdf-to-html.html')
+        return page_cache.serve('landing/pdf-to-html.html')
     except:
         return redirect('/')
 
@@ -3338,7 +3320,7 @@ def pdf_to_html_page():
 def resize_image_page():
     """SEO-optimized landing page for image resizing - 500K searches/month"""
     try:
-        return render_template('landing/resize-image.html')
+        return page_cache.serve('landing/resize-image.html')
     except:
         return redirect('/')
 
@@ -3346,7 +3328,7 @@ def resize_image_page():
 def compress_image_page():
     """SEO-optimized landing page for image compression - 300K searches/month"""
     try:
-        return render_template('landing/compress-image.html')
+        return page_cache.serve('landing/compress-image.html')
     except:
         return redirect('/')
 
@@ -3354,7 +3336,7 @@ def compress_image_page():
 def jpeg_to_png_page():
     """SEO-optimized landing page for JPEG to PNG conversion - 200K searches/month"""
     try:
-        return render_template('landing/jpeg-to-png.html')
+        return page_cache.serve('landing/jpeg-to-png.html')
     except:
         return redirect('/')
 
@@ -3362,7 +3344,7 @@ def jpeg_to_png_page():
 def png_to_jpeg_page():
     """SEO-optimized landing page for PNG to JPEG conversion - 150K searches/month"""
     try:
-        return render_template('landing/png-to-jpeg.html')
+        return page_cache.serve('landing/png-to-jpeg.html')
     except:
         return redirect('/')
 
@@ -3370,7 +3352,7 @@ def png_to_jpeg_page():
 def webp_to_png_page():
     """SEO-optimized landing page for WEBP to PNG conversion - 60K searches/month"""
     try:
-        return render_template('landing/webp-to-png.html')
+        return page_cache.serve('landing/webp-to-png.html')
     except:
         return redirect('/')
 
@@ -3378,7 +3360,7 @@ def webp_to_png_page():
 def webp_to_jpeg_page():
     """SEO-optimized landing page for WEBP to JPEG conversion - 50K searches/month"""
     try:
-        return render_template('landing/webp-to-jpeg.html')
+        return page_cache.serve('landing/webp-to-jpeg.html')
     except:
         return redirect('/')
 
@@ -3386,7 +3368,7 @@ def webp_to_jpeg_page():
 def heic_to_jpeg_page():
     """SEO-optimized landing page for HEIC to JPEG conversion - 40K searches/month"""
     try:
-        return render_template('landing/heic-to-jpeg.html')
+        return page_cache.serve('landing/heic-to-jpeg.html')
     except:
         return redirect('/')
 
@@ -3394,7 +3376,7 @@ def heic_to_jpeg_page():
 def gif_to_png_page():
     """SEO-optimized landing page for GIF to PNG conversion - 25K searches/month"""
     try:
-        return render_template('landing/gif-to-png.html')
+        return page_cache.serve('landing/gif-to-png.html')
     except:
         return redirect('/')
 
@@ -3403,7 +3385,7 @@ def gif_to_png_page():
 def qr_code_generator_page():
     """SEO-optimized landing page for QR code generator - 300K searches/month"""
     try:
-        return render_template('landing/qr-code-generator.html')
+        return page_cache.serve('landing/qr-code-generator.html')
     except:
         return redirect('/')
 
@@ -3411,7 +3393,7 @@ def qr_code_generator_page():
 def word_counter_page():
     """SEO-optimized landing page for word counter - 200K searches/month"""
     try:
-        return render_template('landing/word-counter.html')
+        return page_cache.serve('landing/word-counter.html')
     except:
         return redirect('/')
 
@@ -3419,7 +3401,7 @@ def word_counter_page():
 def video_to_gif_page():
     """SEO-optimized landing page for video to GIF converter - 200K searches/month"""
     try:
-        return render_template('landing/video-to-gif.html')
+        return page_cache.serve('landing/video-to-gif.html')
     except:
         return redirect('/')
 
@@ -3427,7 +3409,7 @@ def video_to_gif_page():
 def mp4_to_mp3_page():
     """SEO-optimized landing page for MP4 to MP3 converter - 150K searches/month"""
     try:
-        return render_template('landing/mp4-to-mp3.html')
+        return page_cache.serve('landing/mp4-to-mp3.html')
     except:
         return redirect('/')
 
@@ -3435,7 +3417,7 @@ def mp4_to_mp3_page():
 def case_converter_page():
     """SEO-optimized landing page for case converter - 100K searches/month"""
     try:
-        return render_template('landing/case-converter.html')
+        return page_cache.serve('landing/case-converter.html')
     except:
         return redirect('/')
 
@@ -3443,7 +3425,7 @@ def case_converter_page():
 def barcode_generator_page():
     """SEO-optimized landing page for barcode generator - 100K searches/month"""
     try:
-        return render_template('landing/barcode-generator.html')
+        return page_cache.serve('landing/barcode-generator.html')
     except:
         return redirect('/')
 
@@ -3451,7 +3433,7 @@ def barcode_generator_page():
 def audio_converter_page():
     """SEO-optimized landing page for audio converter - 100K searches/month"""
     try:
-        return render_template('landing/audio-converter.html')
+        return page_cache.serve('landing/audio-converter.html')
     except:
         return redirect('/')
 
@@ -3459,7 +3441,7 @@ def audio_converter_page():
 def compress_video_page():
     """SEO-optimized landing page for video compressor - 80K searches/month"""
     try:
-        return render_template('landing/compress-video.html')
+        return page_cache.serve('landing/compress-video.html')
     except:
         return redirect('/')
 
@@ -3467,7 +3449,7 @@ def compress_video_page():
 def compress_audio_page():
     """SEO-optimized landing page for audio compressor - 80K searches/month"""
     try:
-        return render_template('landing/compress-audio.html')
+        return page_cache.serve('landing/compress-audio.html')
     except:
         return redirect('/')
 
@@ -3475,7 +3457,7 @@ def compress_audio_page():
 def text_formatter_page():
     """SEO-optimized landing page for text formatter - 80K searches/month"""
     try:
-        return render_template('landing/text-formatter.html')
+        return page_cache.serve('landing/text-formatter.html')
     except:
         return redirect('/')
 
@@ -3483,7 +3465,7 @@ def text_formatter_page():
 def lorem_ipsum_generator_page():
     """SEO-optimized landing page for Lorem Ipsum generator - 50K searches/month"""
     try:
-        return render_template('landing/lorem-ipsum-generator.html')
+        return page_cache.serve('landing/lorem-ipsum-generator.html')
     except:
         return redirect('/')
 
@@ -3491,7 +3473,7 @@ def lorem_ipsum_generator_page():
 def password_generator_page():
     """SEO-optimized landing page for password generator - 40K searches/month"""
     try:
-        return render_template('landing/password-generator.html')
+        return page_cache.serve('landing/password-generator.html')
     except:
         return redirect('/')
 
@@ -3499,7 +3481,7 @@ def password_generator_page():
 def trim_audio_page():
     """SEO-optimized landing page for audio trimmer - 40K searches/month"""
     try:
-        return render_template('landing/trim-audio.html')
+        return page_cache.serve('landing/trim-audio.html')
     except:
         return redirect('/')
 
@@ -3507,7 +3489,7 @@ def trim_audio_page():
 def trim_video_page():
     """SEO-optimized landing page for video trimmer - 40K searches/month"""
     try:
-        return render_template('landing/trim-video.html')
+        return page_cache.serve('landing/trim-video.html')
     except:
         return redirect('/')
 
@@ -3515,7 +3497,7 @@ def trim_video_page():
 def change_video_speed_page():
     """SEO-optimized landing page for video speed changer - 30K searches/month"""
     try:
-        return render_template('landing/change-video-speed.html')
+        return page_cache.serve('landing/change-video-speed.html')
     except:
         return redirect('/')
 
@@ -3533,7 +3515,7 @@ def ai_image_editor_page():
 def chatgpt_alternative_page():
     """SEO-optimized landing page for ChatGPT alternative - 90.5K searches/month"""
     try:
-        return render_template('landing/chatgpt-alternative.html')
+        return page_cache.serve('landing/chatgpt-alternative.html')
     except:
         return redirect('/')
 
@@ -3586,13 +3568,15 @@ def serve_permanent_file(short_path):
         if short_id in db:
             file_info = db[short_id]
 
-            # Increment view counter
-            file_info['views'] = file_info.get('views', 0) + 1
-            save_permanent_files_db(db)
+            # Increment view counter - once per full view, not per range chunk or revalidation
+            range_header = request.headers.get('Range', '')
+            if not request.if_none_match and (not range_header or range_header.startswith('bytes=0-')):
+                file_info['views'] = file_info.get('views', 0) + 1
+                save_permanent_files_db(db)
 
             # Serve the file
             filename = file_info['filename']
-            return send_from_directory(PERMANENT_FILES_DIR, filename)
+            return media_files.send(PERMANENT_FILES_DIR, filename)
 
         # If not a permanent file, return 404
         from werkzeug.exceptions import NotFound
@@ -3607,6 +3591,10 @@ def serve_permanent_file(short_path):
 # ==============================================================================
 
 if __name__ == '__main__':
+    # Per-process clients/threads (gunicorn does this in its post_fork hook)
+    import prefork
+    prefork.init_worker(web_app)
+
     # Submit key pages to IndexNow for instant indexing on startup
     print("Submitting key pages to IndexNow for instant search engine indexing...")
     submit_key_pages_to_indexnow()